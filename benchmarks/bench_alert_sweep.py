@@ -0,0 +1,110 @@
+"""One alert sweep over 100k synthetic alerts.
+
+Old path: read every alert row, look up a price per row and delete each fired
+alert with its own connection and commit.
+New path: the ticker-indexed alert engine. One batched quote per
+QUOTE_BATCH_SIZE tickers, a bisect per ticker and one delete transaction.
+
+Quotes come from an in-memory table. Upstream calls are counted rather than
+timed, so the wall times below exclude network latency.
+
+    python benchmarks/bench_alert_sweep.py
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())  # keep databases out of the repository
+import bot
+
+ALERTS = 100_000
+TICKERS = 500
+FIRED_SHARE = 0.01  # alerts whose target is at or below the current price
+LEGACY_DB = "legacy.db"
+
+
+def synthetic_alerts():
+    rng = random.Random(7)
+    tickers = [f"T{i:03d}" for i in range(TICKERS)]
+    prices = {ticker: 100.0 for ticker in tickers}
+    alerts = []
+    for i in range(ALERTS):
+        ticker = tickers[i % TICKERS]
+        fired = rng.random() < FIRED_SHARE
+        target = rng.uniform(50, 100) if fired else rng.uniform(100.01, 200)
+        alerts.append((f"user{i}", ticker, target))
+    return prices, alerts
+
+
+def create_alerts_table(conn, alerts):
+    conn.execute("CREATE TABLE IF NOT EXISTS alerts (user_id TEXT, ticker TEXT, target_price REAL, PRIMARY KEY (user_id, ticker))")
+    conn.executemany("INSERT INTO alerts VALUES (?, ?, ?)", alerts)
+    conn.commit()
+
+
+def old_sweep(prices):
+    """check_alerts before the alert index, minus the network."""
+    conn = sqlite3.connect(LEGACY_DB)
+    rows = conn.execute("SELECT user_id, ticker, target_price FROM alerts").fetchall()
+    conn.close()
+
+    lookups = fired = 0
+    for user_id, ticker, target_price in rows:
+        price = prices[ticker]  # get_stock_price_value per row
+        lookups += 1
+        if price >= target_price:
+            conn = sqlite3.connect(LEGACY_DB)  # remove_alert per fired alert
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM alerts WHERE user_id = ? AND ticker = ?", (user_id, ticker))
+            if cursor.fetchone():
+                cursor.execute("DELETE FROM alerts WHERE user_id = ? AND ticker = ?", (user_id, ticker))
+                conn.commit()
+            conn.close()
+            fired += 1
+    return lookups, fired
+
+
+def new_sweep(prices):
+    tickers = bot.get_alert_tickers()
+    lookups = 0
+    fired = []
+    for start in range(0, len(tickers), bot.QUOTE_BATCH_SIZE):
+        chunk = tickers[start:start + bot.QUOTE_BATCH_SIZE]
+        chunk_prices = {ticker: prices[ticker] for ticker in chunk}  # poll_quote_chunk
+        lookups += 1
+        for ticker, price in chunk_prices.items():
+            fired.extend((user_id, ticker, created_at) for user_id, _, created_at in bot.pop_triggered_alerts(ticker, price))
+    bot.db_write(bot.delete_alerts, fired)
+    return lookups, len(fired)
+
+
+def main():
+    prices, alerts = synthetic_alerts()
+    legacy = sqlite3.connect(LEGACY_DB)
+    create_alerts_table(legacy, alerts)
+    legacy.close()
+    bot.migrate_databases()
+    with bot.db_transaction() as cursor:
+        cursor.executemany("INSERT INTO alerts (user_id, ticker, target_price) VALUES (?, ?, ?)", alerts)
+
+    started = time.perf_counter()
+    bot.load_alert_index()
+    load_seconds = time.perf_counter() - started
+
+    print(f"{ALERTS:,} alerts on {TICKERS} tickers, {FIRED_SHARE:.0%} triggered")
+    print(f"{'path':<20}{'upstream calls':>16}{'fired':>8}{'sweep':>10}")
+    for name, sweep in (("per-row (old)", old_sweep), ("alert index (new)", new_sweep)):
+        started = time.perf_counter()
+        lookups, fired = sweep(prices)
+        print(f"{name:<20}{lookups:>16,}{fired:>8,}{time.perf_counter() - started:>9.3f}s")
+    print(f"index built from the table once at startup in {load_seconds:.3f}s")
+    remaining = bot.get_db().execute("SELECT COUNT(*) FROM alerts").fetchone()[0]
+    print(f"{remaining:,} alerts left in the table after the new sweep")
+
+
+if __name__ == "__main__":
+    main()
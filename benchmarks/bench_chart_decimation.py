@@ -0,0 +1,78 @@
+"""Chart render time versus point count, before and after decimation.
+
+Old path: every bar plotted, with point markers on the price line.
+New path: render_stock_chart as shipped (LTTB on the close, min/max buckets
+for the indicators, capped at CHART_WIDTH_PX points; markers only for short
+series).
+
+    python benchmarks/bench_chart_decimation.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())  # keep databases out of the repository
+import bot
+
+POINT_COUNTS = (250, 1000, 2500, 5000, 10000, 15000)
+REPEAT = 5
+
+
+def synthetic_history(bars):
+    """A chart frame like fetch_chart_history returns, from the indicator engine."""
+    rng = np.random.default_rng(5)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    start = np.datetime64("1985-01-02")
+    columns = {
+        "date": np.arange(start, start + bars).astype("datetime64[D]"),
+        "open": close, "high": close, "low": close, "close": close,
+        "volume": np.full(bars, 1e6),
+    }
+    indicators = bot.extend_indicators(columns)
+    return pd.DataFrame({
+        "date": pd.to_datetime(indicators["date"]),
+        "close": indicators["close"],
+        "SMA_50": indicators["sma_50"],
+        "SMA_200": indicators["sma_200"],
+        "EMA_20": indicators["ema_20"],
+        "RSI_14": indicators["rsi_14"],
+    })
+
+
+def render_time(history):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        bot.render_stock_chart("BENCH", "max", history)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def undecimated(history, max_points=None):
+    """Every bar of every series, as the chart plotted before decimation."""
+    dates = history["date"].to_numpy()
+    return {name: (dates, history[name].to_numpy(dtype="float64")) for name in ("close",) + bot.CHART_INDICATORS}
+
+
+def main():
+    bot.render_stock_chart("BENCH", "max", synthetic_history(300))  # warm up matplotlib
+
+    decimate, marker_max = bot.decimate_chart_history, bot.CHART_MARKER_MAX_POINTS
+    print(f"best of {REPEAT} renders, decimation cap {bot.CHART_WIDTH_PX} points")
+    print(f"{'bars':>8}{'before':>12}{'after':>12}{'speedup':>10}")
+    for bars in POINT_COUNTS:
+        history = synthetic_history(bars)
+        bot.decimate_chart_history, bot.CHART_MARKER_MAX_POINTS = undecimated, float("inf")
+        before = render_time(history)
+        bot.decimate_chart_history, bot.CHART_MARKER_MAX_POINTS = decimate, marker_max
+        after = render_time(history)
+        print(f"{bars:>8}{before * 1e3:>10.0f}ms{after * 1e3:>10.0f}ms{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
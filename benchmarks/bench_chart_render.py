@@ -0,0 +1,102 @@
+"""20 concurrent `!chart X 10y` requests: inline rendering versus the render process pool.
+
+History comes from a stub (synthetic 10-year frames shaped like
+fetch_chart_history's output), so only rendering is measured. Every request
+uses a different ticker, so the chart cache never answers.
+Old path: each chart rendered on the event loop thread, one after another.
+New path: get_stock_chart, which renders through
+run_blocking("render", render_stock_chart, ...).
+Alongside throughput, a ticker task measures how long the event loop stalls.
+
+    python benchmarks/bench_chart_render.py [render workers]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())  # keep databases out of the repository
+import bot
+
+REQUESTS = 20
+BARS = 2520  # ten years of daily bars
+
+
+def synthetic_history(seed):
+    """A chart frame like fetch_chart_history returns, from the indicator engine."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, BARS)))
+    start = np.datetime64("2015-01-02")
+    columns = {
+        "date": np.arange(start, start + BARS).astype("datetime64[D]"),
+        "open": close, "high": close, "low": close, "close": close,
+        "volume": np.full(BARS, 1e6),
+    }
+    indicators = bot.extend_indicators(columns)
+    return pd.DataFrame({
+        "date": pd.to_datetime(indicators["date"]),
+        "close": indicators["close"],
+        "SMA_50": indicators["sma_50"],
+        "SMA_200": indicators["sma_200"],
+        "EMA_20": indicators["ema_20"],
+        "RSI_14": indicators["rsi_14"],
+    })
+
+
+async def measure(requests):
+    """Run the requests while a 10 ms ticker records the longest event-loop stall."""
+    stalls = []
+
+    async def ticker():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            stalls.append(time.perf_counter() - started - 0.01)
+
+    watcher = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    charts = await requests()
+    elapsed = time.perf_counter() - started
+    watcher.cancel()
+    assert all(png.startswith(b"\x89PNG") for png in charts)
+    return elapsed, max(stalls)
+
+
+async def main():
+    if len(sys.argv) > 1:
+        bot.EXECUTOR_LIMITS["render"] = int(sys.argv[1])
+    histories = {f"T{i:02d}": synthetic_history(i) for i in range(REQUESTS + 1)}
+    bot.fetch_chart_history = lambda ticker, period: histories[ticker]  # stubbed history source
+
+    async def inline():
+        charts = []
+        for ticker in list(histories)[1:]:
+            charts.append(bot.render_stock_chart(ticker, "10y", histories[ticker]))
+            await asyncio.sleep(0)
+        return charts
+
+    async def pooled():
+        results = await asyncio.gather(*(bot.get_stock_chart(ticker, "10y") for ticker in list(histories)[1:]))
+        return [png for png, _ in results]
+
+    # warm up: import matplotlib here and start every spawned worker (each imports bot)
+    bot.render_stock_chart("T00", "10y", histories["T00"])
+    workers = bot.EXECUTOR_LIMITS["render"]
+    await asyncio.gather(*(bot.run_blocking("render", bot.render_stock_chart, "T00", "10y", histories["T00"]) for _ in range(workers)))
+
+    print(f"{REQUESTS} concurrent 10y chart requests ({BARS} bars each), {workers} render workers, {os.cpu_count()} CPUs")
+    print(f"{'path':<36}{'total':>10}{'charts/s':>10}{'max loop stall':>16}")
+    for name, requests in (("inline on the event loop (old)", inline), ("render process pool (new)", pooled)):
+        elapsed, stall = await measure(requests)
+        print(f"{name:<36}{elapsed:>9.2f}s{REQUESTS / elapsed:>10.1f}{stall * 1e3:>14.0f}ms")
+    bot.get_render_executor().shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
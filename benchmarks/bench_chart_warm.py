@@ -0,0 +1,94 @@
+"""Warm `!chart AAPL 10y`: served from the history store with no network calls.
+
+yahooquery's Ticker is replaced by a stub that counts every call and returns
+30 years of synthetic daily bars. The first request fills the history store
+(one full download); after that, the chart path must not touch the network.
+Measured: fetch_chart_history (store + indicator cache) and get_stock_chart,
+both with the rendered chart cached and after clearing that cache, so the
+chart is rendered again from stored bars.
+
+    python benchmarks/bench_chart_warm.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())  # keep databases and the history store out of the repository
+import bot
+
+BARS = 7560  # thirty years of daily bars
+REPEAT = 200
+ticker_calls = 0
+
+
+class CountingTicker:
+    """Stands in for yahooquery.Ticker; counts every construction and history call."""
+
+    def __init__(self, symbols, **kwargs):
+        global ticker_calls
+        ticker_calls += 1
+        self.symbols = symbols.split()
+
+    def history(self, **kwargs):
+        global ticker_calls
+        ticker_calls += 1
+        rng = np.random.default_rng(11)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, BARS)))
+        dates = pd.bdate_range(end="2026-10-16", periods=BARS).date
+        index = pd.MultiIndex.from_product([self.symbols, dates], names=["symbol", "date"])
+        return pd.DataFrame({"open": close, "high": close, "low": close, "close": close, "volume": 1e6}, index=index)
+
+
+def per_call(func):
+    return min(timeit.repeat(func, number=REPEAT, repeat=3)) / REPEAT
+
+
+async def timed(coroutine):
+    started = time.perf_counter()
+    png, error = await coroutine
+    assert error is None and png.startswith(b"\x89PNG"), error
+    return time.perf_counter() - started
+
+
+async def main():
+    bot.Ticker = CountingTicker
+    bot.quotes_can_change = lambda now=None: False  # market closed: stored bars stay fresh until the next settle
+
+    calls = ticker_calls
+    cold = await timed(bot.get_stock_chart("AAPL", "10y"))
+    rows = [("cold: full download + render (spawns a worker)", f"{cold * 1e3:>10.0f}ms", ticker_calls - calls)]
+    await bot.run_blocking("render", bot.render_stock_chart, "AAPL", "10y", bot.fetch_chart_history("AAPL", "10y"))  # start both workers
+
+    calls = ticker_calls
+    store = per_call(lambda: bot.fetch_chart_history("AAPL", "10y"))
+    rows.append(("warm fetch_chart_history (store + indicators)", f"{store * 1e6:>10.0f}µs", ticker_calls - calls))
+
+    calls = ticker_calls
+    cached = min([await timed(bot.get_stock_chart("AAPL", "10y")) for _ in range(REPEAT)])
+    rows.append(("warm get_stock_chart, chart cached", f"{cached * 1e6:>10.0f}µs", ticker_calls - calls))
+
+    calls = ticker_calls
+    rendered = []
+    for _ in range(5):
+        bot.chart_cache.clear()
+        rendered.append(await timed(bot.get_stock_chart("AAPL", "10y")))
+    rows.append(("warm get_stock_chart, rendered again", f"{min(rendered) * 1e3:>10.0f}ms", ticker_calls - calls))
+    bot.get_render_executor().shutdown()
+
+    print(f"!chart AAPL 10y over {BARS} stored daily bars")
+    print(f"{'path':<48}{'time':>12}{'Ticker calls':>14}")
+    for name, elapsed, calls in rows:
+        print(f"{name:<48}{elapsed}{calls:>14}")
+    warm_calls = sum(calls for _, _, calls in rows[1:])
+    assert warm_calls == 0, f"warm path made {warm_calls} Ticker calls"
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""SQLite ops/sec: a new connection per call versus the pooled connection manager.
+
+Old path: sqlite3.connect / execute / commit / close per helper call, default
+journal and synchronous settings.
+New path: get_db() and db_transaction() on this thread's long-lived WAL
+connection.
+
+    python benchmarks/bench_db_connections.py
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())  # keep databases out of the repository
+import bot
+
+USERS = 1000
+READS = 20_000
+WRITES = 2_000
+LEGACY_DB = "legacy.db"
+
+
+def old_read(user_id):
+    conn = sqlite3.connect(LEGACY_DB)
+    cursor = conn.cursor()
+    cursor.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
+    result = cursor.fetchone()
+    conn.close()
+    return result[0]
+
+
+def old_write(user_id):
+    conn = sqlite3.connect(LEGACY_DB)
+    cursor = conn.cursor()
+    cursor.execute("UPDATE users SET balance = balance - 1 WHERE user_id = ?", (user_id,))
+    conn.commit()
+    conn.close()
+
+
+def new_read(user_id):
+    cursor = bot.get_db().cursor()
+    cursor.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
+    return cursor.fetchone()[0]
+
+
+def new_write(user_id):
+    with bot.db_transaction() as cursor:
+        cursor.execute("UPDATE users SET balance = balance - 1 WHERE user_id = ?", (user_id,))
+
+
+def ops_per_second(func, count):
+    started = time.perf_counter()
+    for i in range(count):
+        func(f"user{i % USERS}")
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    rows = [(f"user{i}", 10000.0) for i in range(USERS)]
+    legacy = sqlite3.connect(LEGACY_DB)
+    legacy.execute("CREATE TABLE users (user_id TEXT PRIMARY KEY, balance REAL DEFAULT 10000.00)")
+    legacy.executemany("INSERT INTO users VALUES (?, ?)", rows)
+    legacy.commit()
+    legacy.close()
+    bot.migrate_databases()
+    with bot.db_transaction() as cursor:
+        cursor.executemany("INSERT INTO users (user_id, balance) VALUES (?, ?)", rows)
+
+    print(f"{'path':<28}{'reads/s':>12}{'writes/s':>12}")
+    for name, read, write in (("connect per call (old)", old_read, old_write), ("pooled WAL (new)", new_read, new_write)):
+        print(f"{name:<28}{ops_per_second(read, READS):>12,.0f}{ops_per_second(write, WRITES):>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
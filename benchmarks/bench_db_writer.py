@@ -0,0 +1,74 @@
+"""Throughput of 1,000 concurrent trades: one commit per trade versus the group-committing writer.
+
+Old path: every trade runs apply_buy in its own db_transaction on a "db"
+executor thread.
+New path: every trade is a db_write_async job, and jobs that arrive
+together share a commit.
+
+    python benchmarks/bench_db_writer.py          # the bot's synchronous=NORMAL
+    python benchmarks/bench_db_writer.py FULL     # every commit waits for fsync
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())  # keep databases out of the repository
+import bot
+
+TRADES = 1000
+SYNCHRONOUS = sys.argv[1].upper() if len(sys.argv) > 1 else "NORMAL"
+
+
+def open_db_connection(path, _open=bot.open_db_connection):
+    conn = _open(path)
+    conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+    return conn
+
+
+bot.open_db_connection = open_db_connection
+
+
+def commit_per_trade(user_id, ticker, quantity, price):
+    with bot.db_transaction() as cursor:
+        return bot.apply_buy(cursor, user_id, ticker, quantity, price)
+
+
+async def old_trade(user_id):
+    return await bot.run_blocking("db", commit_per_trade, user_id, "AAPL", 1, 150.0)
+
+
+async def new_trade(user_id):
+    return await bot.db_write_async(bot.apply_buy, user_id, "AAPL", 1, 150.0)
+
+
+async def measure(trade, prefix):
+    latencies = []
+
+    async def timed(user_id):
+        started = time.perf_counter()
+        await trade(user_id)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(f"{prefix}{i}") for i in range(TRADES)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return TRADES / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+
+async def main():
+    bot.migrate_databases()
+    print(f"{TRADES:,} concurrent buys, one per user, synchronous={SYNCHRONOUS}")
+    print(f"{'path':<28}{'trades/s':>10}{'p50':>10}{'p99':>10}")
+    for name, trade, prefix in (("commit per trade (old)", old_trade, "old"), ("group commit (new)", new_trade, "new")):
+        rate, p50, p99 = await measure(trade, prefix)
+        print(f"{name:<28}{rate:>10,.0f}{p50 * 1000:>8.1f}ms{p99 * 1000:>8.1f}ms")
+    trades = bot.get_db().execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+    print(f"{trades:,} trades recorded")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+"""Dispatch overhead per message: the old if/elif startswith chain versus the COMMANDS table.
+
+Every handler (and bot.process_commands) is replaced by a no-op, so only the
+routing cost is measured: the time from on_message to the handler call.
+Old path: the chain on_message used before the router, reproduced with its
+tests in their original order.
+New path: bot.on_message (one dict lookup, then dispatch_command with its
+argument schema, concurrency limit and timing).
+
+    python benchmarks/bench_dispatch.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())  # keep databases out of the repository
+import bot
+
+MESSAGES = 50000
+TRAFFIC = (
+    ("plain chat", "just chatting about stocks"),
+    ("!help", "!help"),
+    ("!sell TSLA 5", "!sell TSLA 5"),
+    ("!refresh_recommendations", "!refresh_recommendations"),  # last test in the old chain
+    ("unknown command", "!stats"),  # falls through to bot.process_commands
+)
+
+
+async def handled(*args):
+    pass
+
+
+async def old_on_message(message):
+    """The old routing: the same preamble, then one test per command until one matches."""
+    if message.author == bot.bot.user:
+        return
+    content = message.content.lower()
+    if not content.startswith(bot.bot.command_prefix) and content != "ping":
+        return
+    user_id = str(message.author.id)
+    bot.log_user_interaction(user_id)
+
+    if message.content.lower() == "ping":
+        await handled("ping")
+    elif message.content.startswith("!price"):
+        await handled("!price", message.content.split())
+    elif content == "!news":
+        await handled("!news")
+    elif message.content.startswith("!buy"):
+        await handled("!buy", message.content.split())
+    elif message.content.lower() == "!sellall":
+        await handled("!sellall")
+    elif message.content.startswith("!sell"):
+        parts = message.content.split()
+        await handled("!sell", parts[1].upper(), int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else None)
+    elif message.content.lower() == "!balance":
+        await handled("!balance")
+    elif message.content.lower() == "!history":
+        await handled("!history")
+    elif message.content.lower() == "!pnl":
+        await handled("!pnl")
+    elif message.content.startswith("!deposit"):
+        await handled("!deposit", message.content.split())
+    elif message.content.startswith("!withdraw"):
+        await handled("!withdraw", message.content.split())
+    elif message.content.lower() == "!leaderboard":
+        await handled("!leaderboard")
+    elif message.content.startswith("!compare"):
+        await handled("!compare", message.content.split())
+    elif message.content.startswith("!watchlist"):
+        await handled("!watchlist", message.content.split())
+    elif message.content.lower() == "!portfolio":
+        await handled("!portfolio")
+    elif message.content.lower() == "!reset":
+        await handled("!reset")
+    elif message.content.startswith("!alert"):
+        await handled("!alert", message.content.split())
+    elif content.startswith("!recommend"):
+        await handled("!recommend")
+    elif content.startswith("!screen"):
+        await handled("!screen", content.split())
+    elif content.startswith("!trend"):
+        await handled("!trend", content.split())
+    elif content.startswith("!sentiment"):
+        await handled("!sentiment", content.split())
+    elif content.startswith("!portfolio_analysis"):
+        await handled("!portfolio_analysis")
+    elif content.startswith("!chart"):
+        await handled("!chart", content.split())
+    elif message.content.lower() == "!download_portfolio":
+        await handled("!download_portfolio")
+    elif message.content.lower() == "!help":
+        await handled("!help")
+    elif content == "!metrics":
+        await handled("!metrics", user_id != bot.ADMIN_ID)
+    elif content == "!refresh_recommendations":
+        await handled("!refresh_recommendations", user_id != bot.ADMIN_ID)
+    else:
+        await bot.bot.process_commands(message)
+
+
+async def per_message(on_message, content):
+    message = SimpleNamespace(content=content, author=SimpleNamespace(id=int(bot.ADMIN_ID)), channel=None)
+    started = time.perf_counter()
+    for _ in range(MESSAGES):
+        await on_message(message)
+    return (time.perf_counter() - started) / MESSAGES
+
+
+async def main():
+    for spec in bot.COMMANDS.values():
+        spec["handler"] = handled
+    bot.bot.process_commands = handled
+
+    print(f"routing cost per message, mean of {MESSAGES} messages (handlers are no-ops)")
+    print(f"{'traffic':<28}{'if/elif (old)':>16}{'COMMANDS (new)':>16}")
+    for name, content in TRAFFIC:
+        old, new = await per_message(old_on_message, content), await per_message(bot.on_message, content)
+        print(f"{name:<28}{old * 1e6:>14.2f}µs{new * 1e6:>14.2f}µs")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
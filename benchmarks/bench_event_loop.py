@@ -0,0 +1,68 @@
+"""Event-loop latency while 50 slow market-data fetches are in flight.
+
+Old path: handlers call the blocking fetch directly on the loop.
+New path: handlers go through run_blocking("market", ...).
+
+    python benchmarks/bench_event_loop.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())  # keep databases out of the repository
+import bot
+
+FETCHES = 50
+FETCH_SECONDS = 0.1  # a slow Yahoo response
+PROBE_INTERVAL = 0.01
+
+
+def slow_fetch(ticker):
+    time.sleep(FETCH_SECONDS)
+    return 100.0
+
+
+async def measure(handler):
+    """Run FETCHES handlers concurrently while a probe task records how late each loop wakeup is."""
+    lags = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            expected = time.perf_counter() + PROBE_INTERVAL
+            await asyncio.sleep(PROBE_INTERVAL)
+            lags.append(time.perf_counter() - expected)
+
+    probe_task = asyncio.create_task(probe())
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+    started = time.perf_counter()
+    await asyncio.gather(*(handler(f"T{i}") for i in range(FETCHES)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe_task
+    lags.sort()
+    return elapsed, statistics.median(lags), lags[int(len(lags) * 0.99) - 1], lags[-1]
+
+
+async def inline_handler(ticker):
+    return slow_fetch(ticker)
+
+
+async def executor_handler(ticker):
+    return await bot.run_blocking("market", slow_fetch, ticker)
+
+
+async def main():
+    print(f"{FETCHES} fetches of {FETCH_SECONDS * 1000:.0f} ms, loop probed every {PROBE_INTERVAL * 1000:.0f} ms")
+    print(f"{'path':<22}{'wall':>9}{'lag p50':>11}{'lag p99':>11}{'lag max':>11}")
+    for name, handler in (("on the loop (old)", inline_handler), ("run_blocking (new)", executor_handler)):
+        elapsed, p50, p99, worst = await measure(handler)
+        print(f"{name:<22}{elapsed:>8.2f}s{p50 * 1000:>9.1f}ms{p99 * 1000:>9.1f}ms{worst * 1000:>9.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""Indicators over 10 years of daily bars: pandas rolling/ewm versus the NumPy engine.
+
+Old path: the pandas code the chart used (SMA 50/200, EMA 20, RSI 14), and
+the same set extended to every indicator the engine produces.
+New path: extend_indicators cold (every bar) and incremental (one new bar
+appended to a cached result).
+
+    python benchmarks/bench_indicators.py
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())  # keep databases out of the repository
+import bot
+
+BARS = 2520  # ten years of daily bars
+REPEAT = 200
+
+
+def synthetic_columns(bars):
+    rng = np.random.default_rng(3)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    spread = close * rng.uniform(0.001, 0.03, bars)
+    return {
+        "date": np.arange(np.datetime64("2015-01-02"), np.datetime64("2015-01-02") + bars).astype("datetime64[D]"),
+        "open": close, "high": close + spread, "low": close - spread, "close": close,
+        "volume": rng.uniform(1e6, 5e6, bars),
+    }
+
+
+def pandas_chart_indicators(columns):
+    """The four indicators render_stock_chart computed with pandas before the engine."""
+    history = pd.DataFrame({"close": columns["close"]})
+    history["SMA_50"] = history["close"].rolling(window=50, min_periods=1).mean()
+    history["SMA_200"] = history["close"].rolling(window=200, min_periods=1).mean()
+    history["EMA_20"] = history["close"].ewm(span=20, adjust=False).mean()
+    delta = history["close"].diff()
+    avg_gain = delta.where(delta > 0, 0).rolling(window=14, min_periods=1).mean()
+    avg_loss = (-delta.where(delta < 0, 0)).rolling(window=14, min_periods=1).mean()
+    history["RSI_14"] = 100 - (100 / (1 + avg_gain / avg_loss))
+    return history
+
+
+def pandas_all_indicators(columns):
+    """Every indicator the engine produces, in pandas."""
+    history = pandas_chart_indicators(columns)
+    close, high, low = history["close"], pd.Series(columns["high"]), pd.Series(columns["low"])
+    history["EMA_12"] = close.ewm(span=12, adjust=False).mean()
+    history["EMA_26"] = close.ewm(span=26, adjust=False).mean()
+    history["MACD"] = history["EMA_12"] - history["EMA_26"]
+    history["MACD_signal"] = history["MACD"].ewm(span=9, adjust=False).mean()
+    history["BB_mid"] = close.rolling(window=20, min_periods=1).mean()
+    band = 2 * close.rolling(window=20).std()
+    history["BB_upper"], history["BB_lower"] = history["BB_mid"] + band, history["BB_mid"] - band
+    previous_close = close.shift()
+    true_range = pd.concat([high - low, (high - previous_close).abs(), (low - previous_close).abs()], axis=1).max(axis=1)
+    history["ATR_14"] = true_range.ewm(alpha=1 / 14, adjust=False).mean()
+    return history
+
+
+def per_call(func):
+    return min(timeit.repeat(func, number=REPEAT, repeat=3)) / REPEAT
+
+
+def main():
+    columns = synthetic_columns(BARS)
+    cached = bot.extend_indicators({name: values[:-1] for name, values in columns.items()})
+
+    full = bot.extend_indicators(columns)
+    reference = pandas_all_indicators(columns)
+    worst = max(np.nanmax(np.abs(full[name] - reference[column].to_numpy()))
+                for name, column in (("sma_50", "SMA_50"), ("ema_20", "EMA_20"), ("rsi_14", "RSI_14"), ("bb_upper", "BB_upper"), ("atr_14", "ATR_14")))
+
+    print(f"{BARS} daily bars (10 years), best of 3 x {REPEAT} runs")
+    print(f"{'path':<40}{'per call':>12}")
+    for name, func in (
+        ("pandas, chart set (old)", lambda: pandas_chart_indicators(columns)),
+        ("pandas, every indicator", lambda: pandas_all_indicators(columns)),
+        ("extend_indicators, cold (new)", lambda: bot.extend_indicators(columns)),
+        ("extend_indicators, one new bar (new)", lambda: bot.extend_indicators(columns, cached)),
+    ):
+        print(f"{name:<40}{per_call(func) * 1e6:>10.0f}µs")
+    print(f"largest difference from pandas: {worst:.1e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Cached quotes for 50 tickers: one Redis round trip per key versus one pipelined round trip.
+
+Runs against fakeredis over TCP, directly and through a proxy that adds a
+network delay to every hop.
+Old path: r.get / r.setex (as SET EX) on "stock_price:<ticker>" (the price only), one
+call per ticker.
+New path: read_cached_quotes / cache_quotes, pipelined HGETALL / HSET +
+EXPIRE on the full quote hash "stock_quote:<ticker>".
+
+    python benchmarks/bench_redis_quotes.py [one-way delay in ms, default 0.25]
+"""
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import fakeredis
+import redis
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp())  # keep databases out of the repository
+import bot
+
+TICKERS = [f"T{i:02d}" for i in range(50)]
+REPEAT = 20
+PAYLOAD = {
+    "regularMarketPrice": 123.4, "regularMarketPreviousClose": 120.0, "regularMarketChangePercent": 2.83,
+    "longName": "Example Corp", "currency": "USD", "marketState": "REGULAR", "regularMarketTime": "2026-10-16 16:00:00",
+}
+
+
+class NoDelayFakeServer(fakeredis.TcpFakeServer):
+    """fakeredis over TCP, without Nagle delays on pipelined replies."""
+
+    def get_request(self):
+        conn, addr = super().get_request()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn, addr
+
+
+def start_server():
+    server = NoDelayFakeServer(("127.0.0.1", 0), server_type="redis")
+    server.daemon_threads = True  # open client connections must not keep the script alive
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+
+def start_delay_proxy(target_port, one_way):
+    """Forward TCP to target_port, sleeping `one_way` seconds before passing on each chunk."""
+    listener = socket.create_server(("127.0.0.1", 0))
+
+    def pump(source, destination):
+        while data := source.recv(65536):
+            time.sleep(one_way)
+            destination.sendall(data)
+
+    def accept():
+        while True:
+            client, _ = listener.accept()
+            upstream = socket.create_connection(("127.0.0.1", target_port))
+            for sock in (client, upstream):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=pump, args=(client, upstream), daemon=True).start()
+            threading.Thread(target=pump, args=(upstream, client), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    return listener.getsockname()[1]
+
+
+def per_batch(func):
+    func()  # warm up the connection pool
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    return (time.perf_counter() - started) / REPEAT
+
+
+def old_write():
+    for ticker in TICKERS:
+        bot.r.set(f"stock_price:{ticker}", PAYLOAD["regularMarketPrice"], ex=bot.CACHE_EXPIRY)  # the old setex, one round trip
+
+
+def old_read():
+    return [float(bot.r.get(f"stock_price:{ticker}")) for ticker in TICKERS]
+
+
+def new_write():
+    now = time.time()
+    bot.cache_quotes({ticker: (PAYLOAD, now) for ticker in TICKERS})
+
+
+def new_read():
+    quotes = bot.read_cached_quotes(TICKERS)
+    assert len(quotes) == len(TICKERS)
+    return quotes
+
+
+def main():
+    one_way = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.00025
+    port = start_server()
+    routes = (("loopback", port), (f"{2 * one_way * 1e3:g} ms RTT", start_delay_proxy(port, one_way)))
+
+    print(f"{len(TICKERS)} tickers per batch, mean of {REPEAT} batches")
+    print(f"{'network':<14}{'operation':<10}{'per-key (old)':>16}{'pipelined (new)':>18}")
+    for network, route in routes:
+        bot.r = redis.Redis(port=route, decode_responses=True)
+        write_old, write_new = per_batch(old_write), per_batch(new_write)
+        read_old, read_new = per_batch(old_read), per_batch(new_read)
+        print(f"{network:<14}{'write':<10}{write_old * 1e3:>14.1f}ms{write_new * 1e3:>16.1f}ms")
+        print(f"{network:<14}{'read':<10}{read_old * 1e3:>14.1f}ms{read_new * 1e3:>16.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,43 @@ import discord
 import os
 import requests
 import asyncio
+import bisect
+import contextvars
+import heapq
+import hashlib
+import io
 from dotenv import load_dotenv
 import random
+import re
+import queue
+import socket
 import sqlite3
+import sys
+from contextlib import contextmanager
 from yahooquery import Ticker
 from textblob import TextBlob
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import pandas as pd
 import numpy as np
 import matplotlib.dates as mdates
 from matplotlib.ticker import MaxNLocator
 import plotly.graph_objects as go
 import logging
+import math
 import time
 import redis
 import json
 import schedule
 import warnings
 import pytz
-from datetime import datetime
+import functools
+import itertools
+import multiprocessing
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
 from discord.ext import commands
 
 ADMIN_ID = "537099554986917889"
@@ -34,8 +52,16 @@ intents.message_content = True # allow message content access
 intents.members = True  # allow server member access
 intents.guilds = True   # allow guild list access
 
-# ✅ Create bot instance with `commands.Bot`
-bot = commands.Bot(command_prefix="!", intents=intents)
+# 🔹 Sharding: run N processes with the same SHARD_COUNT and disjoint SHARD_IDS (e.g. "0,1" and "2,3");
+# they share the price cache, alert state and leadership through Redis
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv("SHARD_IDS", "").split(",") if shard_id.strip()] or None
+
+# ✅ Create bot instance with `commands.Bot` (`AutoShardedBot` when sharded)
+if SHARD_COUNT > 1:
+    bot = commands.AutoShardedBot(command_prefix="!", intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents)
 
 HELP_MESSAGE = """
 📚 **Stock Bot Help Menu**
@@ -77,6 +103,7 @@ HELP_MESSAGE = """
 📰 **Financial News & Recommendations**
 - `!news` – Get the latest financial headlines (Updated daily at 08:00 AM ET).
 - `!recommend` – Get stock recommendations based on recent trends & sentiment.
+- `!screen gainers|losers|volume` – Screen the Nasdaq-100 for today's top movers or unusual volume.
 
 ---
 
@@ -117,8 +144,32 @@ NY_TZ = pytz.timezone("America/New_York")
 
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
-CACHE_EXPIRY = 300  # 5 minutes (seconds)
+CACHE_EXPIRY = 300  # 5 minutes (seconds) while the regular session is open
 MIN_FETCH_INTERVAL = 30  # minimum refetch interval per ticker (seconds)
+PRICE_STALE_MAX = 900  # expired prices are still served (flagged with their age) this long past expiry (seconds)
+PRICE_CACHE_SIZE = 4096  # tickers kept in the in-process price LRU
+PRICE_LATENCY_SAMPLES = 1000  # recent price lookups kept for the p99 in !metrics
+QUOTE_BATCH_SIZE = 50  # symbols per multi-symbol Yahoo request
+TICK_POLL_MIN_INTERVAL = 15  # fastest quote poll for alerted/watched tickers (seconds)
+TICK_POLL_IDLE_INTERVAL = 60  # poll interval when nothing is alerted or watched (seconds)
+TICK_POLL_REQUESTS_PER_MINUTE = 4  # upstream request budget for the tick poller
+TICK_QUEUE_SIZE = 1000  # pending ticks before the poller waits for the consumer
+NEWS_API_TIMEOUT = 10  # NewsAPI request timeout (seconds)
+YAHOO_REQUESTS_PER_MINUTE = 60  # shared outbound budget for every yahooquery call
+YAHOO_BURST = 10  # requests that may go out back to back after an idle period
+YAHOO_BACKOFF_INITIAL = 30  # pause after the first 429 (seconds), doubled on repeats
+YAHOO_BACKOFF_MAX = 600
+
+# Concurrency limits per kind of blocking work
+EXECUTOR_LIMITS = {
+    "market": 8,  # Yahoo Finance requests
+    "news": 4,  # NewsAPI requests
+    "db": 8,  # SQLite reads/writes
+    "background": 2,  # precompute jobs (kept small so they never hold every worker)
+    "cluster": 2,  # leader lease and shard bookkeeping (never queued behind slow jobs)
+    "render": 2,  # chart rendering (process pool)
+}
+IO_WORKERS = sum(limit for kind, limit in EXECUTOR_LIMITS.items() if kind != "render")
 
 # Configure logging and create logger
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
@@ -131,16 +182,289 @@ except redis.ConnectionError:
     logger.warning("Redis connection failed. Falling back to in-memory caching.")
     r = None  # use in-memory caching if Redis is unavailable
 
-# cache store (in-memory fallback)
-price_cache = {}
-last_fetch_time = {}  # last network fetch time per ticker
+# cache store: bounded in-process LRU in front of Redis
+price_cache = OrderedDict()  # ticker -> (price, fetched_at, expires_at, quote payload), most recently used last
+last_fetch_time = OrderedDict()  # last network fetch time per ticker, bounded like price_cache
+price_cache_lock = threading.Lock()
+price_revalidating = set()  # tickers with a background refresh in flight
+price_cache_stats = {"l1_hits": 0, "redis_hits": 0, "stale": 0, "misses": 0}
+price_lookup_seconds = deque(maxlen=PRICE_LATENCY_SAMPLES)
+
+# 🔹 Executor layer: blocking I/O runs in a thread pool, CPU-heavy rendering in a process pool
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="stocksage-io")
+render_executor = None  # created on first use
+revalidate_executor = ThreadPoolExecutor(max_workers=EXECUTOR_LIMITS["background"], thread_name_prefix="stocksage-revalidate")
+executor_semaphores = {}  # kind -> asyncio.Semaphore
+
+def get_render_executor():
+    """Create the chart rendering process pool on first use."""
+    global render_executor
+    if render_executor is None:
+        # spawn instead of fork: the parent already runs the gateway and I/O threads
+        render_executor = ProcessPoolExecutor(
+            max_workers=EXECUTOR_LIMITS["render"],
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return render_executor
+
+async def run_blocking(kind, func, *args, **kwargs):
+    """Run a blocking call off the event loop, bounded by the limit for its kind."""
+    semaphore = executor_semaphores.get(kind)
+    if semaphore is None:
+        semaphore = executor_semaphores[kind] = asyncio.Semaphore(EXECUTOR_LIMITS[kind])
+
+    loop = asyncio.get_running_loop()
+    if kind == "render":
+        executor, call = get_render_executor(), functools.partial(func, *args, **kwargs)
+    else:
+        # carry context variables (e.g. the Yahoo priority class) into the worker thread
+        executor, call = io_executor, functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    async with semaphore:
+        return await loop.run_in_executor(executor, call)
+
+# 🔹 Single-flight registry: concurrent identical upstream calls share one request
+inflight_lock = threading.Lock()
+inflight_calls = {}  # key -> Future of the running call
+
+def single_flight(key, func, *args, **kwargs):
+    """Run func once for all concurrent callers with the same key and share its result."""
+    with inflight_lock:
+        future = inflight_calls.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = inflight_calls[key] = Future()
+
+    if not is_leader:
+        return future.result()  # wait for the leader (re-raises its exception)
+
+    try:
+        result = func(*args, **kwargs)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with inflight_lock:
+            inflight_calls.pop(key, None)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
-# Initialize portfolio database
-with sqlite3.connect("portfolio.db") as conn:
-    cursor = conn.cursor()
+# 🔹 Yahoo rate limiter: every yahooquery call takes a token from one shared bucket;
+# waiting calls are served by priority class, then in arrival order
+YAHOO_PRIORITIES = {"interactive": 0, "alerts": 1, "background": 2}
+yahoo_priority = contextvars.ContextVar("yahoo_priority", default="interactive")
+yahoo_condition = threading.Condition()
+yahoo_waiters = []  # heap of (priority, sequence)
+yahoo_sequence = itertools.count()
+yahoo_bucket = {"tokens": float(YAHOO_BURST), "refilled_at": time.monotonic(), "backoff": 0, "backoff_until": 0.0}
+yahoo_stats = {
+    priority_class: {"waiting": 0, "requests": 0, "wait_seconds": 0.0, "max_wait": 0.0}
+    for priority_class in YAHOO_PRIORITIES
+}
+yahoo_stats_throttled = {"count": 0}
+
+class YahooRateLimitError(Exception):
+    """Yahoo answered with HTTP 429 (Too Many Requests)."""
+
+def acquire_yahoo_token(priority_class, cost=1):
+    """Block until this call may go out: it must lead the queue, the bucket must hold `cost` tokens and no 429 pause may be running."""
+    cost = min(cost, YAHOO_BURST)  # a bigger batch could never be admitted
+    entry = (YAHOO_PRIORITIES[priority_class], next(yahoo_sequence))
+    started = time.monotonic()
+    with yahoo_condition:
+        heapq.heappush(yahoo_waiters, entry)
+        yahoo_stats[priority_class]["waiting"] += 1
+        while True:
+            now = time.monotonic()
+            elapsed = now - yahoo_bucket["refilled_at"]
+            yahoo_bucket["tokens"] = min(YAHOO_BURST, yahoo_bucket["tokens"] + elapsed * YAHOO_REQUESTS_PER_MINUTE / 60)
+            yahoo_bucket["refilled_at"] = now
+            if yahoo_waiters[0] != entry:
+                yahoo_condition.wait()  # woken when the head leaves
+                continue
+            if now >= yahoo_bucket["backoff_until"] and yahoo_bucket["tokens"] >= cost:
+                break
+            refill_delay = (cost - yahoo_bucket["tokens"]) * 60 / YAHOO_REQUESTS_PER_MINUTE
+            yahoo_condition.wait(timeout=max(yahoo_bucket["backoff_until"] - now, refill_delay, 0.01))
+
+        heapq.heappop(yahoo_waiters)
+        yahoo_bucket["tokens"] -= cost
+        waited = time.monotonic() - started
+        stats = yahoo_stats[priority_class]
+        stats["waiting"] -= 1
+        stats["requests"] += 1
+        stats["wait_seconds"] += waited
+        stats["max_wait"] = max(stats["max_wait"], waited)
+        yahoo_condition.notify_all()  # the next waiter becomes head
+
+def is_rate_limited(value):
+    """True for a 429 error or payload (yahooquery reports some errors as strings)."""
+    if isinstance(value, dict):
+        return any(isinstance(item, str) and is_rate_limited(item) for item in value.values())
+    if isinstance(value, (str, Exception)):
+        text = str(value)
+        return "429" in text or "Too Many Requests" in text
+    return False
+
+def record_yahoo_outcome(rate_limited):
+    """Start or extend the 429 pause, or clear it after a successful call."""
+    with yahoo_condition:
+        if not rate_limited:
+            yahoo_bucket["backoff"] = 0
+            return
+        backoff = min(max(yahoo_bucket["backoff"] * 2, YAHOO_BACKOFF_INITIAL), YAHOO_BACKOFF_MAX)
+        yahoo_bucket.update(backoff=backoff, backoff_until=time.monotonic() + backoff, tokens=0.0)
+        yahoo_stats_throttled["count"] += 1
+    logger.warning(f"Yahoo rate limit hit; pausing all Yahoo calls for {backoff}s.")
+
+def yahoo_request(func, *args, yahoo_cost=1, **kwargs):
+    """Run one Yahoo call under the shared limiter at the current priority class (multi-symbol calls cost more)."""
+    acquire_yahoo_token(yahoo_priority.get(), yahoo_cost)
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        if is_rate_limited(e):
+            record_yahoo_outcome(True)
+            raise YahooRateLimitError(str(e)) from e
+        raise
+    rate_limited = is_rate_limited(result)
+    record_yahoo_outcome(rate_limited)
+    if rate_limited:
+        raise YahooRateLimitError(f"Yahoo returned 429 for {func}")
+    return result
+
+# 🔹 SQLite connection manager: one long-lived connection per database per thread
+PORTFOLIO_DB = "portfolio.db"
+STATS_DB = "bot_stats.db"
+DB_BUSY_TIMEOUT = 5  # seconds to wait for a locked database
+DB_MMAP_SIZE = 256 * 1024 * 1024  # bytes of each database file mapped into memory
+DB_STATEMENT_CACHE_SIZE = 256  # prepared statements kept per connection
+DB_WRITE_BATCH_WINDOW = 0.005  # seconds the writer waits to group jobs into one commit
+DB_WRITE_BATCH_MAX = 256  # write jobs per commit
+
+db_local = threading.local()
+
+def open_db_connection(path):
+    """Open a connection in autocommit mode with WAL and tuned pragmas."""
+    conn = sqlite3.connect(
+        path,
+        timeout=DB_BUSY_TIMEOUT,
+        isolation_level=None,  # transactions are explicit via db_transaction()
+        cached_statements=DB_STATEMENT_CACHE_SIZE,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    return conn
+
+def get_db(path=PORTFOLIO_DB):
+    """Return this thread's long-lived connection to a database."""
+    connections = getattr(db_local, "connections", None)
+    if connections is None:
+        connections = db_local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = open_db_connection(path)
+    return conn
+
+@contextmanager
+def db_transaction(path=PORTFOLIO_DB):
+    """Yield a cursor inside one write transaction; nested calls join the outer transaction."""
+    conn = get_db(path)
+    depths = getattr(db_local, "depths", None)
+    if depths is None:
+        depths = db_local.depths = {}
+
+    depth = depths.get(path, 0)
+    depths[path] = depth + 1
+    try:
+        if depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn.cursor()
+        except BaseException:
+            if depth == 0:
+                conn.execute("ROLLBACK")
+            raise
+        if depth == 0:
+            conn.execute("COMMIT")
+    finally:
+        depths[path] = depth
+
+# 🔹 Database writer: one thread per database owns all writes and group-commits them
+db_writer_queues = {}  # path -> queue.Queue of (job, args, future)
+db_writer_lock = threading.Lock()
+
+def get_db_writer(path):
+    """Return the job queue of a database's writer thread, starting it on first use."""
+    with db_writer_lock:
+        jobs = db_writer_queues.get(path)
+        if jobs is None:
+            jobs = db_writer_queues[path] = queue.Queue()
+            threading.Thread(target=run_db_writer, args=(path, jobs), name=f"stocksage-writer-{path}", daemon=True).start()
+    return jobs
+
+def run_db_writer(path, jobs):
+    """Writer loop: every job queued within DB_WRITE_BATCH_WINDOW shares one commit."""
+    while True:
+        batch = [jobs.get()]
+        deadline = time.monotonic() + DB_WRITE_BATCH_WINDOW
+        while len(batch) < DB_WRITE_BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(jobs.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        outcomes = []
+        try:
+            with db_transaction(path) as cursor:
+                for job, args, future in batch:
+                    # a savepoint per job keeps one failing job from undoing the rest of the batch
+                    cursor.execute("SAVEPOINT write_job")
+                    try:
+                        outcomes.append((future, job(cursor, *args), None))
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO write_job")
+                        outcomes.append((future, None, e))
+                    cursor.execute("RELEASE write_job")
+        except Exception as e:
+            logger.warning(f"Write batch of {len(batch)} jobs failed on {path}: {e}")
+            outcomes = [(future, None, e) for _, _, future in batch]
+
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+def submit_write(job, *args, path=PORTFOLIO_DB):
+    """Queue job(cursor, *args) on the database writer and return a Future of its result."""
+    future = Future()
+    get_db_writer(path).put((job, args, future))
+    return future
+
+def db_write(job, *args, path=PORTFOLIO_DB):
+    """Run a write job on the database writer and wait for its result."""
+    return submit_write(job, *args, path=path).result()
+
+async def db_write_async(job, *args, path=PORTFOLIO_DB):
+    """Await a write job without tying up an executor thread."""
+    return await asyncio.wrap_future(submit_write(job, *args, path=path))
+
+def execute_write(cursor, sql, params=()):
+    """Write job for a single statement; returns the affected row count."""
+    cursor.execute(sql, params)
+    return cursor.rowcount
+
+# 🔹 Schema migrations: each database records the highest version applied in schema_version
+def create_portfolio_tables(cursor):
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS trades (
         user_id TEXT,
@@ -172,11 +496,45 @@ with sqlite3.connect("portfolio.db") as conn:
             PRIMARY KEY (user_id, ticker)
         )
     """)
-    conn.commit()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS positions (
+            user_id TEXT,
+            ticker TEXT,
+            net_qty INTEGER,
+            total_cost REAL,  -- average-cost basis of the open quantity
+            PRIMARY KEY (user_id, ticker)
+        )
+    """)
 
-# Initialize bot stats database
-with sqlite3.connect("bot_stats.db") as conn:
-    cursor = conn.cursor()
+def backfill_positions(cursor):
+    """Build positions once for databases created before the table existed."""
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM positions)")
+    if not cursor.fetchone()[0]:
+        positions = compute_positions_from_trades(cursor)
+        cursor.executemany(
+            "INSERT INTO positions (user_id, ticker, net_qty, total_cost) VALUES (?, ?, ?, ?)",
+            [(user_id, ticker, net_qty, total_cost) for (user_id, ticker), (net_qty, total_cost) in positions.items()],
+        )
+
+def create_portfolio_indexes(cursor):
+    # trade history: WHERE user_id = ? ORDER BY timestamp DESC
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_user_timestamp ON trades (user_id, timestamp)")
+    # leaderboard: ORDER BY balance DESC LIMIT 10 (covering)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_balance ON users (balance, user_id)")
+    # tick poller: SELECT DISTINCT ticker FROM watchlist (covering)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_watchlist_ticker ON watchlist (ticker)")
+
+def create_sentiment_cache(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS sentiment_cache (
+        text_hash TEXT PRIMARY KEY,  -- sha256 of the exact text scored
+        polarity REAL,
+        scored_at REAL  -- unix time, for SENTIMENT_CACHE_TTL
+    )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sentiment_cache_scored_at ON sentiment_cache (scored_at)")
+
+def create_stats_tables(cursor):
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS stats (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -193,7 +551,44 @@ with sqlite3.connect("bot_stats.db") as conn:
         user_id TEXT PRIMARY KEY
     );
     """)
-    conn.commit()
+
+def add_alert_created_at(cursor):
+    # identifies one alert instance: a re-set alert at the same target is a new alert
+    cursor.execute("ALTER TABLE alerts ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+
+# Append only: never edit or reorder a migration that has shipped
+MIGRATIONS = {
+    PORTFOLIO_DB: [
+        (1, "create portfolio tables", create_portfolio_tables),
+        (2, "backfill positions from trades", backfill_positions),
+        (3, "add portfolio indexes", create_portfolio_indexes),
+        (4, "stamp alerts with their creation time", add_alert_created_at),
+    ],
+    STATS_DB: [
+        (1, "create stats tables", create_stats_tables),
+        (2, "create sentiment cache", create_sentiment_cache),
+    ],
+}
+
+def get_schema_version(cursor):
+    cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    return cursor.fetchone()[0] or 0
+
+def migrate_database(path):
+    """Apply pending migrations to a database, each in its own transaction."""
+    for version, description, migration in MIGRATIONS[path]:
+        with db_transaction(path) as cursor:
+            # re-read under the write lock so concurrent starts never apply a migration twice
+            if get_schema_version(cursor) >= version:
+                continue
+            migration(cursor)
+            cursor.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+        logger.info(f"Migrated {path} to version {version}: {description}")
+
+def migrate_databases():
+    for path in MIGRATIONS:
+        migrate_database(path)
 
 # Load environment variables
 load_dotenv()
@@ -208,42 +603,144 @@ def validate_env_variables():
     if missing:
         raise EnvironmentError(f"Missing required environment variables: {', '.join(missing)}")
 
+# 🔹 NYSE session calendar (New York time): regularMarketPrice only moves during the regular session,
+# so quote TTLs, alert sweeps and history refreshes stretch to the next open while the market is shut
+MARKET_PRE_OPEN = (4, 0)
+MARKET_OPEN = (9, 30)
+MARKET_CLOSE = (16, 0)
+MARKET_EARLY_CLOSE = (13, 0)  # Jul 3, the day after Thanksgiving, Dec 24
+MARKET_POST_HOURS = 4  # post-market runs this long after the close
+QUOTE_SETTLE_SECONDS = 900  # keep refreshing after the close until the official closing prints land
+
+def nth_weekday(year, month, weekday, n):
+    """The n-th given weekday (Mon=0) of a month; n=-1 is the last one."""
+    if n < 0:
+        last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        return last - timedelta(days=(last.weekday() - weekday) % 7)
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+@functools.lru_cache(maxsize=None)
+def nyse_holidays(year):
+    """Full-day NYSE closures for a year, on their observed dates."""
+    def observed(day):
+        if day.weekday() == 5:
+            return day - timedelta(days=1)
+        if day.weekday() == 6:
+            return day + timedelta(days=1)
+        return day
+
+    # Good Friday: two days before Easter Sunday (anonymous Gregorian algorithm)
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    g = (b - (b + 8) // 25 + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    good_friday = date(year, month, day + 1) - timedelta(days=2)
+
+    holidays = {
+        observed(date(year, 1, 1)),  # a Saturday New Year lands on Dec 31 of the prior year, which NYSE keeps open
+        nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        good_friday,
+        nth_weekday(year, 5, 0, -1),  # Memorial Day
+        observed(date(year, 7, 4)),
+        nth_weekday(year, 9, 0, 1),  # Labor Day
+        nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        observed(date(year, 12, 25)),
+    }
+    if year >= 2022:
+        holidays.add(observed(date(year, 6, 19)))  # Juneteenth
+    return frozenset(holidays)
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in nyse_holidays(day.year)
+
+def is_early_close(day):
+    early = (date(day.year, 7, 3), nth_weekday(day.year, 11, 3, 4) + timedelta(days=1), date(day.year, 12, 24))
+    return day in early and is_trading_day(day)
+
+@functools.lru_cache(maxsize=64)
+def market_session_bounds(day):
+    """(pre-market open, regular open, regular close, post-market close) for a trading day, as aware datetimes."""
+    close = MARKET_EARLY_CLOSE if is_early_close(day) else MARKET_CLOSE
+    post = (close[0] + MARKET_POST_HOURS, close[1])
+    return tuple(NY_TZ.localize(datetime(day.year, day.month, day.day, *hour_minute)) for hour_minute in (MARKET_PRE_OPEN, MARKET_OPEN, close, post))
+
+def get_market_session(now=None):
+    """"pre", "regular", "post" or "closed" at a unix time (default: now)."""
+    moment = datetime.fromtimestamp(time.time() if now is None else now, NY_TZ)
+    if not is_trading_day(moment.date()):
+        return "closed"
+    pre_open, regular_open, regular_close, post_close = market_session_bounds(moment.date())
+    if moment < pre_open or moment >= post_close:
+        return "closed"
+    if moment < regular_open:
+        return "pre"
+    return "regular" if moment < regular_close else "post"
+
+def quotes_can_change(now=None):
+    """True during the regular session and for QUOTE_SETTLE_SECONDS after its close."""
+    moment = datetime.fromtimestamp(time.time() if now is None else now, NY_TZ)
+    if not is_trading_day(moment.date()):
+        return False
+    _, regular_open, regular_close, _ = market_session_bounds(moment.date())
+    return regular_open <= moment < regular_close + timedelta(seconds=QUOTE_SETTLE_SECONDS)
+
+def next_regular_open(now=None):
+    """Unix time of the next regular-session open after `now`."""
+    now = time.time() if now is None else now
+    moment = datetime.fromtimestamp(now, NY_TZ)
+    for offset in range(15):  # the longest closure is a few days
+        day = moment.date() + timedelta(days=offset)
+        if is_trading_day(day):
+            regular_open = market_session_bounds(day)[1]
+            if regular_open > moment:
+                return regular_open.timestamp()
+    return now + 24 * 3600
+
+def last_quote_settle(now=None):
+    """Unix time the most recent session's closing prices settled (0 if none in the last two weeks)."""
+    moment = datetime.fromtimestamp(time.time() if now is None else now, NY_TZ)
+    for offset in range(15):
+        day = moment.date() - timedelta(days=offset)
+        if is_trading_day(day):
+            settled = market_session_bounds(day)[2] + timedelta(seconds=QUOTE_SETTLE_SECONDS)
+            if settled <= moment:
+                return settled.timestamp()
+    return 0.0
+
+def price_expires_at(fetched_at):
+    """A quote expires after CACHE_EXPIRY while the market moves, otherwise at the next regular open."""
+    if quotes_can_change(fetched_at):
+        return fetched_at + CACHE_EXPIRY
+    return next_regular_open(fetched_at)
+
 # ✅ Stock price lookup
-# Fetch company name directly from Yahoo Finance
-def get_stock_price(ticker):
-    try:
-        stock = Ticker(ticker, max_retries=1, retry_pause=0.25, timeout=5)
-        data = stock.quote_type.get(ticker, {})
-        price_data = get_price_data(ticker, stock)
-    except Exception as e:
-        logger.warning(f"Price fetch failed for {ticker}: {e}")
-        return "⚠️ Unable to fetch stock data right now (rate limit or network issue). Please try again in a minute."
+def get_stock_price(ticker, quote, age=None):
+    """Format the !price reply from a cached Yahoo price payload; age is set when the quote is stale."""
+    company_name = quote.get("longName") or quote.get("shortName") or ticker
+    current_price = quote["regularMarketPrice"]
+    previous_close = quote.get("regularMarketPreviousClose")
 
-    if price_data is None:
-        return f"⚠️ Unable to fetch stock data for {ticker}. Please check the ticker symbol."
-
-    company_name = data.get("longName", ticker)  # get company name
-    current_price = price_data.get("regularMarketPrice", "N/A")
-    previous_close = price_data.get("regularMarketPreviousClose", "N/A")
-
+    response = f"📈 **{company_name} ({ticker})**\n💰 **Current Price:** ${current_price:.2f}\n"
     # calculate absolute and percentage change
-    if isinstance(current_price, (int, float)) and isinstance(previous_close, (int, float)):
+    if isinstance(previous_close, (int, float)):
         change = current_price - previous_close
         change_percent = (change / previous_close * 100) if previous_close else 0.0
         change_symbol = "🔺" if change >= 0 else "🔻"
-    else:
-        change, change_percent, change_symbol = "N/A", "N/A", ""
-
-    return (
-        f"📈 **{company_name} ({ticker})**\n"
-        f"💰 **Current Price:** ${current_price:.2f}\n"
-        f"{change_symbol} **Change (Prev Close):** {change:+.2f} ({change_percent:.2f}%)\n"
-    )
+        response += f"{change_symbol} **Change (Prev Close):** {change:+.2f} ({change_percent:.2f}%)\n"
+    if age is not None:
+        response += f"⏳ *(last known price, {format_price_age(age)} old; refreshing)*\n"
+    return response
 
 def get_price_data(ticker, stock=None):
     """Safely extract ticker data from the price payload."""
     stock_obj = stock or Ticker(ticker, max_retries=1, retry_pause=0.25, timeout=5)
-    price_payload = getattr(stock_obj, "price", {})
+    price_payload = yahoo_request(getattr, stock_obj, "price", {})
     if not isinstance(price_payload, dict):
         return None
     data = price_payload.get(ticker)
@@ -252,52 +749,293 @@ def get_price_data(ticker, stock=None):
     return data
 
 def get_stock_price_value(ticker):
-    # Check cached price first
-    cached_price = get_cached_stock_price(ticker)
-    if cached_price is not None:
-        return cached_price
+    price, _ = get_stock_price_quote(ticker)
+    return price
 
-    # Enforce per-ticker cooldown
-    now = time.time()
-    last_fetch = last_fetch_time.get(ticker)
-    if last_fetch and now - last_fetch < MIN_FETCH_INTERVAL:
-        return cached_price  # return None when cache is unavailable
+def get_stock_price_quote(ticker):
+    """Return (price, age in seconds if the price is stale else None)."""
+    quote, age = get_stock_quote(ticker)
+    return (quote["regularMarketPrice"] if quote is not None else None), age
 
+def get_stock_quote(ticker):
+    """Return (price payload, age in seconds if stale else None); a stale quote is served while one background refresh runs."""
+    started = time.perf_counter()
     try:
-        data = get_price_data(ticker)
-    except Exception as e:
-        logger.warning(f"Price fetch failed for {ticker}: {e}")
-        return None
+        now = time.time()
+        entry = get_price_entries([ticker]).get(ticker)
+        if entry is not None:
+            if now < entry[2]:
+                return entry[3], None
+            revalidate_price(ticker)
+            return entry[3], now - entry[1]
+
+        # Enforce per-ticker cooldown (nothing cached to serve)
+        if in_fetch_cooldown(ticker, now):
+            return None, None
+
+        try:
+            # concurrent lookups for the same ticker share one upstream request
+            quote = single_flight(f"quote:{ticker}", fetch_stock_quote, ticker)
+        except Exception as e:
+            logger.warning(f"Price fetch failed for {ticker}: {e}")
+            return None, None
+        return quote, None
+    finally:
+        record_price_lookup(time.perf_counter() - started)
 
-    current_price = data.get("regularMarketPrice")
+def fetch_stock_quote(ticker):
+    """Fetch the latest price payload from Yahoo and store it in the cache (None if it has no price)."""
+    data = get_price_data(ticker)
+    current_price = data.get("regularMarketPrice") if data else None
 
     # Store in cache
     if isinstance(current_price, (int, float)):
-        update_stock_price_cache(ticker, current_price)
-        last_fetch_time[ticker] = time.time()
+        cache_quotes({ticker: (data, time.time())})
     else:
-        last_fetch_time[ticker] = time.time()
+        data = None
+    record_fetch_time(ticker, time.time())
+
+    return data
+
+def get_price_data_batch(tickers):
+    """Fetch price payloads for several symbols in a single Yahoo request."""
+    stock = Ticker(" ".join(tickers), max_retries=1, retry_pause=0.25, timeout=5)
+    price_payload = yahoo_request(getattr, stock, "price", {})
+    if not isinstance(price_payload, dict):
+        return {}
+    return {ticker: data for ticker, data in price_payload.items() if isinstance(data, dict)}
+
+def get_stock_prices(tickers):
+    """Return {ticker: price} for many symbols, batching cache misses into chunked requests."""
+    started = time.perf_counter()
+    prices = {}
+    missing = []
+    stale = {}  # ticker -> expired price, served if the refetch fails
+    now = time.time()
+
+    tickers = list(dict.fromkeys(tickers))  # de-duplicate, keep order
+    entries = get_price_entries(tickers)  # one pipelined Redis read for everything not fresh in memory
+    for ticker in tickers:
+        entry = entries.get(ticker)
+        if entry is not None:
+            if now < entry[2]:
+                prices[ticker] = entry[0]
+                continue
+            stale[ticker] = entry[0]
+
+        # Enforce per-ticker cooldown
+        if in_fetch_cooldown(ticker, now):
+            prices[ticker] = stale.get(ticker)
+            continue
 
-    return current_price
+        missing.append(ticker)
+
+    for start in range(0, len(missing), QUOTE_BATCH_SIZE):
+        chunk = missing[start:start + QUOTE_BATCH_SIZE]
+        try:
+            payloads = single_flight(f"quote_batch:{' '.join(chunk)}", get_price_data_batch, chunk)
+        except Exception as e:
+            logger.warning(f"Batch price fetch failed for {', '.join(chunk)}: {e}")
+            prices.update({ticker: stale.get(ticker) for ticker in chunk})
+            continue
+
+        fetched_at = time.time()
+        fetched = {}
+        for ticker in chunk:
+            current_price = payloads.get(ticker, {}).get("regularMarketPrice")
+            if isinstance(current_price, (int, float)):
+                fetched[ticker] = (payloads[ticker], fetched_at)
+            else:
+                current_price = stale.get(ticker)
+            record_fetch_time(ticker, fetched_at)
+            prices[ticker] = current_price
+        cache_quotes(fetched)  # one pipelined Redis write per chunk
+
+    record_price_lookup(time.perf_counter() - started)
+    return prices
+
+def insert_user_record(cursor, user_id):
+    """Create the default balance row for a user inside a write job."""
+    cursor.execute(
+        "INSERT OR IGNORE INTO users (user_id, balance) VALUES (?, ?)",
+        (user_id, 10000.00),
+    )
+
+def read_balance(cursor, user_id):
+    """Read a user's balance inside a write job."""
+    cursor.execute(BALANCE_SQL, (user_id,))
+    return cursor.fetchone()[0]
 
 def ensure_user_record(user_id):
     """Ensure a default balance row exists for the user."""
-    with sqlite3.connect("portfolio.db") as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT OR IGNORE INTO users (user_id, balance) VALUES (?, ?)",
-            (user_id, 10000.00),
-        )
-        conn.commit()
+    db_write(insert_user_record, user_id)
 
 # ✅ Retrieve user balance
 def get_balance(user_id):
-    ensure_user_record(user_id)
-    with sqlite3.connect("portfolio.db") as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
-        result = cursor.fetchone()
-        return result[0] if result else 10000.00
+    cursor = get_db().cursor()
+    cursor.execute(BALANCE_SQL, (user_id,))
+    result = cursor.fetchone()
+    if result is None:
+        ensure_user_record(user_id)  # first visit: create the default row
+        return 10000.00
+    return result[0]
+
+def record_trade(cursor, user_id, ticker, quantity, price, trade_type):
+    """Insert a trade into the ledger and update the materialized position in the same transaction."""
+    cursor.execute("INSERT INTO trades (user_id, ticker, quantity, price, trade_type) VALUES (?, ?, ?, ?, ?)",
+                   (user_id, ticker, quantity, price, trade_type))
+
+    if trade_type == "buy":
+        cursor.execute("""
+            INSERT INTO positions (user_id, ticker, net_qty, total_cost) VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id, ticker) DO UPDATE SET
+                net_qty = net_qty + excluded.net_qty,
+                total_cost = total_cost + excluded.total_cost
+        """, (user_id, ticker, quantity, quantity * price))
+    else:
+        # sells keep the average cost: release the sold fraction of the cost basis
+        cursor.execute("""
+            UPDATE positions
+            SET total_cost = CASE WHEN net_qty > ? THEN total_cost * (net_qty - ?) / net_qty ELSE 0 END,
+                net_qty = net_qty - ?
+            WHERE user_id = ? AND ticker = ?
+        """, (quantity, quantity, quantity, user_id, ticker))
+        cursor.execute("DELETE FROM positions WHERE user_id = ? AND ticker = ? AND net_qty <= 0", (user_id, ticker))
+
+def compute_positions_from_trades(cursor):
+    """Replay the trades ledger into {(user_id, ticker): (net_qty, total_cost)}."""
+    positions = {}
+    cursor.execute("SELECT user_id, ticker, quantity, price, trade_type FROM trades ORDER BY rowid")
+    for user_id, ticker, quantity, price, trade_type in cursor.fetchall():
+        net_qty, total_cost = positions.get((user_id, ticker), (0, 0.0))
+        if trade_type == "buy":
+            net_qty += quantity
+            total_cost += quantity * price
+        else:
+            total_cost = total_cost * (net_qty - quantity) / net_qty if net_qty > quantity else 0.0
+            net_qty -= quantity
+
+        if net_qty > 0:
+            positions[(user_id, ticker)] = (net_qty, total_cost)
+        else:
+            positions.pop((user_id, ticker), None)
+    return positions
+
+def rebuild_positions():
+    """Recompute the positions table from the trades ledger."""
+    with db_transaction() as cursor:
+        positions = compute_positions_from_trades(cursor)
+        cursor.execute("DELETE FROM positions")
+        cursor.executemany(
+            "INSERT INTO positions (user_id, ticker, net_qty, total_cost) VALUES (?, ?, ?, ?)",
+            [(user_id, ticker, net_qty, total_cost) for (user_id, ticker), (net_qty, total_cost) in positions.items()],
+        )
+    logger.info(f"Rebuilt {len(positions)} positions from the trades ledger.")
+    return len(positions)
+
+def verify_positions():
+    """Compare the positions table with the ledger and return mismatched rows."""
+    cursor = get_db().cursor()
+    expected = compute_positions_from_trades(cursor)
+    cursor.execute("SELECT user_id, ticker, net_qty, total_cost FROM positions WHERE net_qty > 0")
+    actual = {(user_id, ticker): (net_qty, total_cost) for user_id, ticker, net_qty, total_cost in cursor.fetchall()}
+
+    mismatches = []
+    for key in sorted(expected.keys() | actual.keys()):
+        want, have = expected.get(key), actual.get(key)
+        if want is None or have is None or want[0] != have[0] or abs(want[1] - have[1]) > 1e-6:
+            mismatches.append((*key, want, have))
+    return mismatches
+
+# SQL of the hot paths, shared by the functions that run it and check_query_plans
+HOLDINGS_SQL = "SELECT ticker, net_qty, total_cost FROM positions WHERE user_id = ? AND net_qty > 0"
+TRADE_HISTORY_SQL = "SELECT ticker, quantity, price, trade_type, timestamp FROM trades WHERE user_id = ? ORDER BY timestamp DESC"
+LEADERBOARD_SQL = "SELECT user_id, balance, (balance - 10000) / 10000 * 100 AS profit_pct FROM users ORDER BY balance DESC LIMIT 10"
+BALANCE_SQL = "SELECT balance FROM users WHERE user_id = ?"
+LIST_ALERTS_SQL = "SELECT ticker, target_price FROM alerts WHERE user_id = ?"
+DELETE_ALERT_SQL = "DELETE FROM alerts WHERE user_id = ? AND ticker = ? AND created_at = ?"
+WATCHED_TICKERS_SQL = "SELECT DISTINCT ticker FROM watchlist"
+ALL_ALERTS_SQL = "SELECT user_id, ticker, target_price, created_at FROM alerts"
+
+# Hot queries that must stay index-backed: name -> (database, sql, sample params)
+HOT_QUERIES = {
+    "get_user_holdings": (PORTFOLIO_DB, HOLDINGS_SQL, ("0",)),
+    "get_trade_history": (PORTFOLIO_DB, TRADE_HISTORY_SQL, ("0",)),
+    "get_leaderboard": (PORTFOLIO_DB, LEADERBOARD_SQL, ()),
+    "get_balance": (PORTFOLIO_DB, BALANCE_SQL, ("0",)),
+    "list_alerts": (PORTFOLIO_DB, LIST_ALERTS_SQL, ("0",)),
+    "delete_alerts": (PORTFOLIO_DB, DELETE_ALERT_SQL, ("0", "AAPL", 0.0)),
+    "get_watched_tickers": (PORTFOLIO_DB, WATCHED_TICKERS_SQL, ()),
+    "get_all_alerts": (PORTFOLIO_DB, ALL_ALERTS_SQL, ()),
+}
+# full scans that are the point of the query: name -> table it may scan
+# (get_all_alerts loads every alert into the in-memory index once per leader start, never per tick)
+EXPECTED_SCANS = {"get_all_alerts": "alerts"}
+
+def check_query_plans():
+    """Run EXPLAIN QUERY PLAN on the hot queries and return [(name, detail)] for full table scans."""
+    scans = []
+    for name, (path, sql, params) in HOT_QUERIES.items():
+        cursor = get_db(path).cursor()
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        for row in cursor.fetchall():
+            detail = row[-1]
+            # "SCAN t USING [COVERING] INDEX ..." walks an index; a bare "SCAN t" reads every row
+            if detail.startswith("SCAN") and "USING" not in detail and detail != f"SCAN {EXPECTED_SCANS.get(name)}":
+                scans.append((name, detail))
+    return scans
+
+def apply_buy(cursor, user_id, ticker, quantity, price):
+    """Write job: debit cash and record a buy; returns the new balance, or None if funds are short."""
+    insert_user_record(cursor, user_id)
+    balance = read_balance(cursor, user_id)
+    total_cost = quantity * price
+    if balance < total_cost:
+        return None
+
+    cursor.execute("UPDATE users SET balance = balance - ? WHERE user_id = ?", (total_cost, user_id))
+    record_trade(cursor, user_id, ticker, quantity, price, "buy")
+    return balance - total_cost
+
+def apply_sell(cursor, user_id, ticker, quantity, price):
+    """Write job: record a sell and credit cash; returns (owned_quantity, new_balance or None if short)."""
+    insert_user_record(cursor, user_id)
+    cursor.execute("SELECT net_qty FROM positions WHERE user_id = ? AND ticker = ?", (user_id, ticker))
+    row = cursor.fetchone()
+    owned_quantity = row[0] if row else 0
+    if owned_quantity < quantity:
+        return owned_quantity, None
+
+    cursor.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (quantity * price, user_id))
+    record_trade(cursor, user_id, ticker, quantity, price, "sell")
+    return owned_quantity, read_balance(cursor, user_id)
+
+def apply_sell_all(cursor, user_id, prices):
+    """Write job: sell every priced position; returns ([(ticker, quantity, price)], new_balance)."""
+    insert_user_record(cursor, user_id)
+    cursor.execute("SELECT ticker, net_qty FROM positions WHERE user_id = ? AND net_qty > 0", (user_id,))
+
+    sold = []
+    total_sale_value = 0
+    for ticker, owned_quantity in cursor.fetchall():
+        current_price = prices.get(ticker)
+        if current_price is None:
+            continue
+        total_sale_value += owned_quantity * current_price
+        record_trade(cursor, user_id, ticker, owned_quantity, current_price, "sell")
+        sold.append((ticker, owned_quantity, current_price))
+
+    cursor.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (total_sale_value, user_id))
+    return sold, read_balance(cursor, user_id)
+
+def apply_cash_change(cursor, user_id, amount):
+    """Write job: add amount to the balance; returns the new balance, or None if it would go negative."""
+    insert_user_record(cursor, user_id)
+    balance = read_balance(cursor, user_id)
+    if balance + amount < 0:
+        return None
+    cursor.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (amount, user_id))
+    return balance + amount
 
 # ✅ Buy stock
 def buy_stock(user_id, ticker, quantity):
@@ -306,130 +1044,77 @@ def buy_stock(user_id, ticker, quantity):
     if not isinstance(quantity, int) or quantity <= 0:
         return "⚠️ Quantity must be a positive integer."
     
-    current_price = get_stock_price_value(ticker)  # use the hardened price fetch helper
+    current_price, price_age = get_stock_price_quote(ticker)  # use the hardened price fetch helper
 
     if current_price is None:  # if ticker/price is invalid
         return f"⚠️ Unable to fetch stock data for {ticker}. Please check the ticker symbol."
 
-    total_cost = float(quantity) * float(current_price)
-    balance = get_balance(user_id)
+    # balance check, debit and trade share one transaction on the writer
+    new_balance = db_write(apply_buy, user_id, ticker, quantity, float(current_price))
 
-    if balance < total_cost:
+    if new_balance is None:
         return "⚠️ Insufficient funds."
-
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
-
-    ensure_user_record(user_id)
-    cursor.execute("UPDATE users SET balance = balance - ? WHERE user_id = ?", (total_cost, user_id))
-
-    cursor.execute("INSERT INTO trades (user_id, ticker, quantity, price, trade_type) VALUES (?, ?, ?, ?, 'buy')",
-                   (user_id, ticker, quantity, current_price))
-
-    conn.commit()
-    conn.close()
 
     # detailed log entry
-    logger.info(f"User {user_id} bought {quantity} shares of {ticker} at ${current_price:.2f}. New balance: ${balance - total_cost:.2f}")
+    logger.info(f"User {user_id} bought {quantity} shares of {ticker} at ${current_price:.2f}. New balance: ${new_balance:.2f}")
 
-    return f"✅ Bought {quantity} shares of {ticker} at ${current_price:.2f} each. 💰 New Balance: ${balance - total_cost:.2f}"
+    stale_note = f" ⏳ *(price {format_price_age(price_age)} old)*" if price_age is not None else ""
+    return f"✅ Bought {quantity} shares of {ticker} at ${current_price:.2f} each.{stale_note} 💰 New Balance: ${new_balance:.2f}"
 
 # ✅ Sell stock
 def sell_stock(user_id, ticker, quantity):
-    ensure_user_record(user_id)
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
+    cursor = get_db().cursor()
 
-    try:
-        # Check net owned shares (buys - sells)
-        cursor.execute("""
-            SELECT 
-                COALESCE((SELECT SUM(quantity) FROM trades WHERE user_id = ? AND ticker = ? AND trade_type = 'buy'), 0) -
-                COALESCE((SELECT SUM(quantity) FROM trades WHERE user_id = ? AND ticker = ? AND trade_type = 'sell'), 0)
-        """, (user_id, ticker, user_id, ticker))
-
-        owned_quantity = cursor.fetchone()[0]
-
-        if owned_quantity < quantity:
-            return f"⚠️ You only own {owned_quantity} shares of {ticker}. Cannot sell {quantity} shares."
-
-        current_price = get_stock_price_value(ticker)
+    # Check net owned shares (materialized position)
+    cursor.execute("SELECT net_qty FROM positions WHERE user_id = ? AND ticker = ?", (user_id, ticker))
+    row = cursor.fetchone()
+    owned_quantity = row[0] if row else 0
 
-        if current_price is None:
-            return f"⚠️ Unable to fetch stock data for {ticker}. Please check the ticker symbol."
+    if owned_quantity < quantity:
+        return f"⚠️ You only own {owned_quantity} shares of {ticker}. Cannot sell {quantity} shares."
 
-        total_sale = quantity * current_price
+    current_price, price_age = get_stock_price_quote(ticker)
 
-        # Update cash balance
-        cursor.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (total_sale, user_id))
+    if current_price is None:
+        return f"⚠️ Unable to fetch stock data for {ticker}. Please check the ticker symbol."
 
-        # Insert sell trade record
-        cursor.execute("INSERT INTO trades (user_id, ticker, quantity, price, trade_type) VALUES (?, ?, ?, ?, 'sell')",
-                    (user_id, ticker, quantity, current_price))
+    # re-checked on the writer in case another sell landed first
+    owned_quantity, new_balance = db_write(apply_sell, user_id, ticker, quantity, current_price)
 
-        conn.commit()
+    if new_balance is None:
+        return f"⚠️ You only own {owned_quantity} shares of {ticker}. Cannot sell {quantity} shares."
 
-        return f"✅ Sold {quantity} shares of {ticker} at ${current_price:.2f}. 💰 New Balance: ${get_balance(user_id):.2f}"
-
-    finally:
-        conn.close()  # 🚀 always close DB connection via finally
+    stale_note = f" ⏳ *(price {format_price_age(price_age)} old)*" if price_age is not None else ""
+    return f"✅ Sold {quantity} shares of {ticker} at ${current_price:.2f}.{stale_note} 💰 New Balance: ${new_balance:.2f}"
 
 def sell_all_stocks(user_id):
-    ensure_user_record(user_id)
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
+    cursor = get_db().cursor()
 
     # Get all currently held stocks and quantities
-    cursor.execute("""
-        SELECT ticker, 
-               COALESCE(SUM(CASE WHEN trade_type = 'buy' THEN quantity ELSE 0 END), 0) -
-               COALESCE(SUM(CASE WHEN trade_type = 'sell' THEN quantity ELSE 0 END), 0) AS owned_quantity
-        FROM trades 
-        WHERE user_id = ?
-        GROUP BY ticker
-        HAVING owned_quantity > 0
-    """, (user_id,))
+    cursor.execute("SELECT ticker, net_qty FROM positions WHERE user_id = ? AND net_qty > 0", (user_id,))
     
     holdings = cursor.fetchall()
 
     if not holdings:
-        conn.close()
         return "⚠️ You do not own any stocks to sell."
 
-    total_sale_value = 0
-    messages = ["📢 **All Stocks Sold:**"]
-
-    for ticker, owned_quantity in holdings:
-        current_price = get_stock_price_value(ticker)
-        if current_price is None:
-            continue
-
-        total_sale_value += owned_quantity * current_price
-
-        # **Record sell trade**
-        cursor.execute("INSERT INTO trades (user_id, ticker, quantity, price, trade_type) VALUES (?, ?, ?, ?, 'sell')",
-                       (user_id, ticker, owned_quantity, current_price))
+    prices = get_stock_prices([ticker for ticker, _ in holdings])
+    sold, new_balance = db_write(apply_sell_all, user_id, prices)
 
+    messages = ["📢 **All Stocks Sold:**"]
+    for ticker, owned_quantity, current_price in sold:
         messages.append(f"✅ Sold {owned_quantity} shares of {ticker} at ${current_price:.2f}.")
 
-    # **Update cash balance**
-    cursor.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (total_sale_value, user_id))
-    conn.commit()
-    conn.close()
-
-    messages.append(f"💰 **New Balance: ${get_balance(user_id):.2f}**")
+    messages.append(f"💰 **New Balance: ${new_balance:.2f}**")
     return "\n".join(messages)
 
 # ✅ Trade history lookup
 def get_trade_history(user_id):
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
+    cursor = get_db().cursor()
 
-    cursor.execute("SELECT ticker, quantity, price, trade_type, timestamp FROM trades WHERE user_id = ? ORDER BY timestamp DESC", (user_id,))
+    cursor.execute(TRADE_HISTORY_SQL, (user_id,))
     trades = cursor.fetchall()
 
-    conn.close()
-
     if not trades:
         return "⚠️ No trade history found."
 
@@ -449,12 +1134,13 @@ def get_pnl(user_id):
 
     total_pnl = 0
     portfolio_summary = ["📈 **Portfolio Performance**"]
+    prices = get_stock_prices([item["ticker"] for item in holdings])
 
     for item in holdings:
         ticker = item["ticker"]
         quantity = item["net_qty"]
         total_cost = item["cost_basis"]
-        current_price = get_stock_price_value(ticker)
+        current_price = prices.get(ticker)
         if not isinstance(current_price, (int, float)):
             continue
 
@@ -473,39 +1159,24 @@ def deposit_funds(user_id, amount):
     if amount <= 0:
         return "⚠️ Deposit amount must be greater than zero."
     
-    ensure_user_record(user_id)
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (amount, user_id))
-    conn.commit()
-    conn.close()
+    new_balance = db_write(apply_cash_change, user_id, amount)
     
-    return f"✅ Deposited ${amount:.2f}. New balance: ${get_balance(user_id):.2f}"
+    return f"✅ Deposited ${amount:.2f}. New balance: ${new_balance:.2f}"
 
 def withdraw_funds(user_id, amount):
-    balance = get_balance(user_id)
     if amount <= 0:
         return "⚠️ Withdrawal amount must be greater than zero."
-    if amount > balance:
+    
+    new_balance = db_write(apply_cash_change, user_id, -amount)
+    if new_balance is None:
         return "⚠️ Insufficient funds."
     
-    ensure_user_record(user_id)
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
-    cursor.execute("UPDATE users SET balance = balance - ? WHERE user_id = ?", (amount, user_id))
-    conn.commit()
-    conn.close()
-    
-    return f"✅ Withdrawn ${amount:.2f}. New balance: ${get_balance(user_id):.2f}"
+    return f"✅ Withdrawn ${amount:.2f}. New balance: ${new_balance:.2f}"
 
 def get_leaderboard():
-    with sqlite3.connect("portfolio.db") as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT user_id, balance, (balance - 10000) / 10000 * 100 AS profit_pct
-            FROM users ORDER BY balance DESC LIMIT 10
-        """)
-        rankings = cursor.fetchall()
+    cursor = get_db().cursor()
+    cursor.execute(LEADERBOARD_SQL)
+    rankings = cursor.fetchall()
 
     if not rankings:
         return "⚠️ No investment data available."
@@ -517,16 +1188,13 @@ def get_leaderboard():
     return "\n".join(leaderboard)
 
 def compare_users(user1, user2):
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
+    cursor = get_db().cursor()
 
-    cursor.execute("SELECT balance FROM users WHERE user_id = ?", (user1,))
+    cursor.execute(BALANCE_SQL, (user1,))
     balance1 = cursor.fetchone()
     
-    cursor.execute("SELECT balance FROM users WHERE user_id = ?", (user2,))
+    cursor.execute(BALANCE_SQL, (user2,))
     balance2 = cursor.fetchone()
-    
-    conn.close()
 
     if not balance1 or not balance2:
         return "⚠️ One or both users have no investment data."
@@ -541,43 +1209,19 @@ def compare_users(user1, user2):
     )
 
 def get_user_holdings(user_id):
-    """Compute current holdings from full trade history."""
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        SELECT ticker,
-               SUM(CASE WHEN trade_type = 'buy' THEN quantity ELSE 0 END) AS buy_qty,
-               SUM(CASE WHEN trade_type = 'buy' THEN quantity * price ELSE 0 END) AS buy_cost,
-               SUM(CASE WHEN trade_type = 'sell' THEN quantity ELSE 0 END) AS sell_qty,
-               SUM(CASE WHEN trade_type = 'sell' THEN quantity * price ELSE 0 END) AS sell_value
-        FROM trades
-        WHERE user_id = ?
-        GROUP BY ticker
-        """,
-        (user_id,),
-    )
+    """Read current holdings from the materialized positions table."""
+    cursor = get_db().cursor()
+    cursor.execute(HOLDINGS_SQL, (user_id,))
     rows = cursor.fetchall()
-    conn.close()
 
     holdings = []
-    for ticker, buy_qty, buy_cost, sell_qty, sell_value in rows:
-        buy_qty = buy_qty or 0
-        buy_cost = buy_cost or 0.0
-        sell_qty = sell_qty or 0
-        net_qty = buy_qty - sell_qty
-        if net_qty <= 0:
-            continue
-        avg_buy_price = buy_cost / buy_qty if buy_qty else 0.0
-        cost_basis = avg_buy_price * net_qty
+    for ticker, net_qty, total_cost in rows:
         holdings.append(
             {
                 "ticker": ticker,
-                "buy_qty": buy_qty,
-                "buy_cost": buy_cost,
                 "net_qty": net_qty,
-                "avg_buy_price": avg_buy_price,
-                "cost_basis": cost_basis,
+                "avg_buy_price": total_cost / net_qty,
+                "cost_basis": total_cost,
             }
         )
 
@@ -591,12 +1235,13 @@ def get_portfolio(user_id):
 
     portfolio_summary = ["📊 **Your Portfolio Holdings**"]
     total_pnl = 0
+    prices = get_stock_prices([item["ticker"] for item in holdings])
 
     for item in holdings:
         ticker = item["ticker"]
         total_quantity = item["net_qty"]
         total_cost = item["cost_basis"]
-        current_price = get_stock_price_value(ticker)
+        current_price = prices.get(ticker)
         if current_price is None:
             continue
 
@@ -616,253 +1261,986 @@ def get_portfolio(user_id):
 
     return "\n".join(portfolio_summary)
 
-def reset_portfolio(user_id):
-    ensure_user_record(user_id)
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
+def apply_reset(cursor, user_id):
+    """Write job: wipe a user's trades, positions, alerts and watchlist and restore the starting cash."""
+    insert_user_record(cursor, user_id)
 
     # Delete trade history and holdings
     cursor.execute("DELETE FROM trades WHERE user_id = ?", (user_id,))
+    cursor.execute("DELETE FROM positions WHERE user_id = ?", (user_id,))
     cursor.execute("DELETE FROM alerts WHERE user_id = ?", (user_id,))
     cursor.execute("DELETE FROM watchlist WHERE user_id = ?", (user_id,))
     cursor.execute("UPDATE users SET balance = 10000 WHERE user_id = ?", (user_id,))
 
-    conn.commit()
-    conn.close()
+def reset_portfolio(user_id):
+    db_write(apply_reset, user_id)
+    unindex_user_alerts(user_id)
     return "✅ Your investment portfolio has been reset to the initial state."
 
 def add_to_watchlist(user_id, ticker):
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
-
-    cursor.execute("INSERT OR IGNORE INTO watchlist (user_id, ticker) VALUES (?, ?)", (user_id, ticker.upper()))
-    conn.commit()
-    conn.close()
+    db_write(execute_write, "INSERT OR IGNORE INTO watchlist (user_id, ticker) VALUES (?, ?)", (user_id, ticker.upper()))
 
     return f"✅ {ticker.upper()} added to your watchlist!"
 
 def remove_from_watchlist(user_id, ticker):
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
-
-    # Check whether watchlist item exists
-    cursor.execute("SELECT 1 FROM watchlist WHERE user_id = ? AND ticker = ?", (user_id, ticker.upper()))
-    if not cursor.fetchone():
-        conn.close()
+    # Perform delete (no rows means the ticker was not on the watchlist)
+    deleted = db_write(execute_write, "DELETE FROM watchlist WHERE user_id = ? AND ticker = ?", (user_id, ticker.upper()))
+    if not deleted:
         return f"⚠️ {ticker.upper()} is not in your watchlist."
-
-    # Perform delete
-    cursor.execute("DELETE FROM watchlist WHERE user_id = ? AND ticker = ?", (user_id, ticker.upper()))
-    conn.commit()
-    conn.close()
     return f"✅ {ticker.upper()} removed from your watchlist!"
 
 def clear_watchlist(user_id):
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM watchlist WHERE user_id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    db_write(execute_write, "DELETE FROM watchlist WHERE user_id = ?", (user_id,))
     return "✅ Your watchlist has been cleared."
 
 def list_watchlist(user_id):
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
+    cursor = get_db().cursor()
 
     cursor.execute("SELECT ticker FROM watchlist WHERE user_id = ?", (user_id,))
     tickers = [row[0] for row in cursor.fetchall()]
-    conn.close()
 
     if not tickers:
         return "⚠️ Your watchlist is empty."
 
     return "📋 **Your Watchlist:**\n" + "\n".join([f"🔹 {ticker}" for ticker in tickers])
 
-def add_alert(user_id, ticker, target_price):
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
+# 🔹 In-memory alert index: ticker -> [(target_price, user_id, created_at), ...] sorted by target price
+alert_index = {}
+alert_targets = {}  # (user_id, ticker) -> (target_price, created_at)
+alert_index_lock = threading.Lock()
+
+def load_alert_index():
+    """Rebuild the alert index from the alerts table."""
+    alerts = get_all_alerts()
+    with alert_index_lock:
+        alert_index.clear()
+        alert_targets.clear()
+        for user_id, ticker, target_price, created_at in alerts:
+            alert_index.setdefault(ticker, []).append((target_price, user_id, created_at))
+            alert_targets[(user_id, ticker)] = (target_price, created_at)
+        for entries in alert_index.values():
+            entries.sort()
+    logger.info(f"Loaded {len(alerts)} alerts across {len(alert_index)} tickers.")
+
+def _unindex_alert_locked(user_id, ticker):
+    target = alert_targets.pop((user_id, ticker), None)
+    if target is None:
+        return
+    entry = (target[0], user_id, target[1])
+    entries = alert_index.get(ticker, [])
+    position = bisect.bisect_left(entries, entry)
+    if position < len(entries) and entries[position] == entry:
+        del entries[position]
+    if not entries:
+        alert_index.pop(ticker, None)
+
+def index_alert(user_id, ticker, target_price, created_at):
+    """Add or replace a user's alert in the index."""
+    with alert_index_lock:
+        _unindex_alert_locked(user_id, ticker)
+        bisect.insort(alert_index.setdefault(ticker, []), (target_price, user_id, created_at))
+        alert_targets[(user_id, ticker)] = (target_price, created_at)
+
+def unindex_alert(user_id, ticker):
+    """Drop a user's alert for one ticker from the index."""
+    with alert_index_lock:
+        _unindex_alert_locked(user_id, ticker)
+
+def unindex_user_alerts(user_id):
+    """Drop every alert of a user from the index."""
+    with alert_index_lock:
+        for alert_user_id, ticker in [key for key in alert_targets if key[0] == user_id]:
+            _unindex_alert_locked(alert_user_id, ticker)
+
+def get_alert_tickers():
+    """List tickers that currently have at least one alert."""
+    with alert_index_lock:
+        return list(alert_index)
+
+def pop_triggered_alerts(ticker, price):
+    """Remove and return [(user_id, target_price, created_at), ...] for alerts at or below price."""
+    with alert_index_lock:
+        entries = alert_index.get(ticker)
+        if not entries:
+            return []
+        cutoff = bisect.bisect_right(entries, price, key=lambda entry: entry[0])
+        triggered = entries[:cutoff]
+        del entries[:cutoff]
+        if not entries:
+            alert_index.pop(ticker, None)
+        for _, user_id, _ in triggered:
+            alert_targets.pop((user_id, ticker), None)
+    return [(user_id, target_price, created_at) for target_price, user_id, created_at in triggered]
+
+def delete_alerts(cursor, alerts):
+    """Write job: delete fired alerts [(user_id, ticker, created_at), ...] in one transaction."""
+    # match the creation time too, so an alert re-set in the meantime survives
+    cursor.executemany(DELETE_ALERT_SQL, alerts)
 
-    cursor.execute("INSERT OR REPLACE INTO alerts (user_id, ticker, target_price) VALUES (?, ?, ?)", 
-                   (user_id, ticker.upper(), target_price))
-    conn.commit()
-    conn.close()
+def add_alert(user_id, ticker, target_price):
+    created_at = time.time()
+    db_write(execute_write, "INSERT OR REPLACE INTO alerts (user_id, ticker, target_price, created_at) VALUES (?, ?, ?, ?)",
+             (user_id, ticker.upper(), target_price, created_at))
+    index_alert(user_id, ticker.upper(), target_price, created_at)
+    publish_cluster_event("alerts", op="index", user_id=user_id, ticker=ticker.upper(), target_price=target_price, created_at=created_at)
 
     return f"✅ Price alert set for {ticker.upper()} at ${target_price:.2f}."
 
 def remove_alert(user_id, ticker):
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
-
-    # Check whether alert exists
-    cursor.execute("SELECT 1 FROM alerts WHERE user_id = ? AND ticker = ?", (user_id, ticker.upper()))
-    if not cursor.fetchone():
-        conn.close()
+    # Perform delete (no rows means there was no alert)
+    deleted = db_write(execute_write, "DELETE FROM alerts WHERE user_id = ? AND ticker = ?", (user_id, ticker.upper()))
+    if not deleted:
         return f"⚠️ No alert set for {ticker.upper()}."
-
-    # Perform delete
-    cursor.execute("DELETE FROM alerts WHERE user_id = ? AND ticker = ?", (user_id, ticker.upper()))
-    conn.commit()
-    conn.close()
+    unindex_alert(user_id, ticker.upper())
+    publish_cluster_event("alerts", op="unindex", user_id=user_id, ticker=ticker.upper())
     return f"✅ Alert for {ticker.upper()} removed."
 
 def clear_alerts(user_id):
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM alerts WHERE user_id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    db_write(execute_write, "DELETE FROM alerts WHERE user_id = ?", (user_id,))
+    unindex_user_alerts(user_id)
+    publish_cluster_event("alerts", op="unindex_user", user_id=user_id)
     return "✅ All your alerts have been cleared."
 
 def list_alerts(user_id):
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
+    cursor = get_db().cursor()
 
-    cursor.execute("SELECT ticker, target_price FROM alerts WHERE user_id = ?", (user_id,))
+    cursor.execute(LIST_ALERTS_SQL, (user_id,))
     alerts = cursor.fetchall()
-    conn.close()
 
     if not alerts:
         return "⚠️ No active alerts."
 
     return "📢 **Your Active Alerts:**\n" + "\n".join([f"🔹 {ticker} at ${price:.2f}" for ticker, price in alerts])
 
-def get_portfolio_analysis(user_id):
+async def get_portfolio_analysis(user_id):
     """
     Analyze and visualize a user portfolio (returns images for Discord upload).
     """
-    holdings = get_user_holdings(user_id)
+    holdings = await run_blocking("db", get_user_holdings, user_id)
 
     if not holdings:
         return "⚠️ You do not own any stocks.", None
 
-    tickers = [row["ticker"] for row in holdings]
     quantities = {row["ticker"]: row["net_qty"] for row in holdings}
     costs = {row["ticker"]: row["cost_basis"] for row in holdings}
     
-    # Fetch current prices
-    current_prices = {ticker: get_stock_price_value(ticker) for ticker in tickers}
+    # Fetch current prices (one batched request) and skip tickers without a quote
+    current_prices = await run_blocking("market", get_stock_prices, list(quantities))
+    tickers = [ticker for ticker in quantities if isinstance(current_prices.get(ticker), (int, float))]
+    if not tickers:
+        return "⚠️ Unable to fetch stock data right now (rate limit or network issue). Please try again in a minute.", None
 
     # Compute valuation and returns
     values = {ticker: quantities[ticker] * current_prices[ticker] for ticker in tickers}
     profits = {ticker: values[ticker] - costs[ticker] for ticker in tickers}
-    total_cost = sum(costs.values())
+    total_cost = sum(costs[ticker] for ticker in tickers)
     total_value = sum(values.values())
 
+    images = await run_blocking("render", render_portfolio_charts, user_id, tickers, values, profits)
+
+    # 🏆 **Total portfolio summary**
+    summary = (
+        f"📊 **Portfolio Analysis for {user_id}**\n"
+        f"💰 **Total Investment:** ${total_cost:.2f}\n"
+        f"💹 **Current Portfolio Value:** ${total_value:.2f}\n"
+        f"📈 **Total Profit/Loss:** ${total_value - total_cost:.2f}\n"
+    )
+
+    return summary, images
+
+def figure_to_png(fig):
+    """Encode a Figure as PNG bytes in memory."""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+def render_portfolio_charts(user_id, tickers, values, profits):
+    """Render allocation and profit charts as [(filename, png_bytes)] (runs in the render process pool)."""
     # Build dataframe
     df = pd.DataFrame({
         "Ticker": tickers,
-        "Quantity": [quantities[t] for t in tickers],
-        "Cost": [costs[t] for t in tickers],
         "Current Value": [values[t] for t in tickers],
         "Profit": [profits[t] for t in tickers]
     })
 
     # 📊 **Pie chart: allocation by ticker**
-    fig, ax = plt.subplots(figsize=(6, 6))
+    fig = Figure(figsize=(6, 6))
+    ax = fig.subplots()
     ax.pie(values.values(), labels=tickers, autopct="%1.1f%%", startangle=140)
     ax.set_title(f"Portfolio Allocation for {user_id}")
-    pie_chart_path = "portfolio_pie.png"
-    plt.savefig(pie_chart_path)
-    plt.close()
+    pie_chart = figure_to_png(fig)
 
     # 📈 **Bar chart: profit/loss by ticker**
-    fig, ax = plt.subplots(figsize=(7, 5))
+    fig = Figure(figsize=(7, 5))
+    ax = fig.subplots()
     ax.bar(df["Ticker"], df["Profit"], color=['green' if p >= 0 else 'red' for p in df["Profit"]])
     ax.set_title(f"Profit/Loss per Stock for {user_id}")
     ax.set_xlabel("Stock Ticker")
     ax.set_ylabel("Profit ($)")
-    bar_chart_path = "portfolio_profit.png"
-    plt.savefig(bar_chart_path)
-    plt.close()
+    bar_chart = figure_to_png(fig)
 
-    # 🏆 **Total portfolio summary**
-    summary = (
-        f"📊 **Portfolio Analysis for {user_id}**\n"
-        f"💰 **Total Investment:** ${total_cost:.2f}\n"
-        f"💹 **Current Portfolio Value:** ${total_value:.2f}\n"
-        f"📈 **Total Profit/Loss:** ${total_value - total_cost:.2f}\n"
-    )
+    return [("portfolio_pie.png", pie_chart), ("portfolio_profit.png", bar_chart)]
 
-    return summary, [pie_chart_path, bar_chart_path]
+def get_all_alerts():
+    """Load every active alert row."""
+    cursor = get_db().cursor()
+    cursor.execute(ALL_ALERTS_SQL)
+    return cursor.fetchall()
+
+async def send_price_alert(user_id, ticker, price):
+    """DM a user that their alert fired."""
+    try:
+        user = await bot.fetch_user(int(user_id))
+        if user:
+            await user.send(f"🚨 {ticker} has reached ${price:.2f}!")
+    except discord.HTTPException as e:
+        logger.warning(f"Failed to send alert for {ticker} to {user_id}: {e}")
+
+# 🔹 Tick pipeline: a tick source publishes (ticker, price, timestamp) into a queue,
+# and check_alerts consumes it to refresh the cache, fire alerts and feed subscribers.
+tick_subscribers = []  # callbacks (ticker, price, timestamp), may be async
+
+def subscribe_ticks(callback):
+    """Register a callback that receives every price tick."""
+    tick_subscribers.append(callback)
+
+def get_watched_tickers():
+    """List distinct tickers on any user's watchlist."""
+    cursor = get_db().cursor()
+    cursor.execute(WATCHED_TICKERS_SQL)
+    return [row[0] for row in cursor.fetchall()]
+
+def get_tick_poll_interval(ticker_count):
+    """Poll as fast as the upstream budget allows for the number of tracked tickers."""
+    if not ticker_count:
+        return TICK_POLL_IDLE_INTERVAL
+    requests_per_poll = math.ceil(ticker_count / QUOTE_BATCH_SIZE)
+    return max(TICK_POLL_MIN_INTERVAL, requests_per_poll * 60 / TICK_POLL_REQUESTS_PER_MINUTE)
+
+def poll_quote_chunk(chunk):
+    """Fetch one batch of quotes for the poller and return {ticker: price}."""
+    payloads = single_flight(f"quote_batch:{' '.join(chunk)}", get_price_data_batch, chunk)
+    prices = {}
+    for ticker in chunk:
+        current_price = payloads.get(ticker, {}).get("regularMarketPrice")
+        if isinstance(current_price, (int, float)):
+            prices[ticker] = current_price
+    return prices
+
+async def poll_yahoo_ticks(publish):
+    """Tick source: poll batched Yahoo quotes for tickers that have alerts or watchers."""
+    yahoo_priority.set("alerts")  # yields to interactive commands
+    while True:
+        tickers = []
+        try:
+            watched = await run_blocking("db", get_watched_tickers)
+            tickers = sorted(set(get_alert_tickers()) | set(watched))
+            for start in range(0, len(tickers), QUOTE_BATCH_SIZE):
+                chunk = tickers[start:start + QUOTE_BATCH_SIZE]
+                prices = await run_blocking("market", poll_quote_chunk, chunk)
+                timestamp = time.time()
+                for ticker, price in prices.items():
+                    await publish((ticker, price, timestamp))
+        except Exception as e:
+            logger.warning(f"Tick poll failed: {e}")
+
+        interval = get_tick_poll_interval(len(tickers))
+        if not quotes_can_change():
+            interval = max(interval, next_regular_open() - time.time())  # nothing moves until the open
+        await asyncio.sleep(interval)
+
+def fake_tick_source(ticks, interval=0.0):
+    """Tick source that replays [(ticker, price), ...] locally (for tests and dry runs)."""
+    async def replay(publish):
+        for ticker, price in ticks:
+            await publish((ticker, price, time.time()))
+            await asyncio.sleep(interval)
+    return replay
+
+tick_source = poll_yahoo_ticks  # swap for fake_tick_source([...]) to run without Yahoo
+
+def cache_ticks(latest):
+    """Store the newest tick price per ticker in the price cache."""
+    cache_quotes({ticker: ({"regularMarketPrice": price}, timestamp) for ticker, (price, timestamp) in latest.items()})
+    for ticker, (_, timestamp) in latest.items():
+        record_fetch_time(ticker, timestamp)
+    publish_cluster_event("ticks", ticks=[[ticker, price, timestamp] for ticker, (price, timestamp) in latest.items()])
+
+async def process_ticks(ticks):
+    """Apply a batch of ticks to the price cache, the alert index and subscribers."""
+    latest = {}
+    for ticker, price, timestamp in ticks:
+        latest[ticker] = (price, timestamp)
+    await run_blocking("market", cache_ticks, latest)
+
+    fired = []
+    for ticker, (price, _) in latest.items():
+        fired.extend((user_id, ticker, created_at, price) for user_id, _, created_at in pop_triggered_alerts(ticker, price))
+
+    if fired:
+        await db_write_async(delete_alerts, [(user_id, ticker, created_at) for user_id, ticker, created_at, _ in fired])
+        # during a leader handover two processes may fire the same alert; only one of them notifies.
+        # created_at keys one alert instance, so the same target set again fires again
+        claimed = await run_blocking("cluster", claim_once_many, [f"alert_fired:{user_id}:{ticker}:{created_at!r}" for user_id, ticker, created_at, _ in fired], ALERT_FIRE_DEDUP_TTL)
+        for (user_id, ticker, _, price), notify in zip(fired, claimed):
+            if notify:
+                await send_price_alert(user_id, ticker, price)
+
+    for callback in tick_subscribers:
+        for ticker, price, timestamp in ticks:
+            try:
+                result = callback(ticker, price, timestamp)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.warning(f"Tick subscriber {callback!r} failed for {ticker}: {e}")
 
 async def check_alerts():
+    """Run the tick pipeline that drives price alerts."""
     await bot.wait_until_ready()
-    while not bot.is_closed():
-        conn = sqlite3.connect("portfolio.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id, ticker, target_price FROM alerts")
-        alerts = cursor.fetchall()
-        conn.close()
-
-        for user_id, ticker, target_price in alerts:
-            price = get_stock_price_value(ticker)
-            if price is not None and isinstance(price, (int, float)) and price >= target_price:
-                user = await bot.fetch_user(int(user_id))
-                if user:
-                    await user.send(f"🚨 {ticker} has reached ${price:.2f}!")
-                    remove_alert(user_id, ticker)  # remove alert after notification
-
-        await asyncio.sleep(600)  # check every 10 minutes (reduce API load)
+    await run_blocking("db", load_alert_index)
+
+    queue = asyncio.Queue(maxsize=TICK_QUEUE_SIZE)
+    producer = asyncio.create_task(tick_source(queue.put))
+    try:
+        while not bot.is_closed():
+            # drain everything already queued so one pass handles a whole poll
+            ticks = [await queue.get()]
+            while not queue.empty():
+                ticks.append(queue.get_nowait())
+            try:
+                await process_ticks(ticks)
+            except Exception as e:
+                logger.warning(f"Failed to process a batch of {len(ticks)} ticks: {e}")  # keep the pipeline running
+    finally:
+        producer.cancel()
     
 async def send_daily_news():
-    news = get_financial_news()
+    # a new leader runs the overdue 08:00 job again, so the day is claimed once across processes
+    if not (await run_blocking("cluster", claim_once_many, [f"daily_news:{datetime.now(NY_TZ).date()}"], DAILY_NEWS_DEDUP_TTL))[0]:
+        return
+    news = await run_blocking("news", get_financial_news)
     if isinstance(news, list) and news:
         formatted_news = "\n\n".join([f"🔹 **{article.get('title', 'No Title')}**\n{article.get('url', '#')}" for article in news])
-        for guild in bot.guilds:
-            for channel in guild.text_channels:
-                if channel.name == "news-channel":  # set your target news channel name
-                    await channel.send(f"📢 **Latest Financial News**\n\n{formatted_news}")
-                    break
+        await run_blocking("cluster", publish_cluster_event, "news", text=formatted_news)  # other shards post to their guilds
+        await deliver_news(formatted_news)
+
+async def deliver_news(formatted_news):
+    """Post the news digest to the news channel of every guild on this process's shards."""
+    for guild in bot.guilds:
+        for channel in guild.text_channels:
+            if channel.name == "news-channel":  # set your target news channel name
+                await channel.send(f"📢 **Latest Financial News**\n\n{formatted_news}")
+                break
 
 def schedule_daily_news():
     schedule.every().day.at("08:00").do(lambda: asyncio.create_task(send_daily_news()))
 
 async def schedule_runner():
-    """Runner loop for `schedule` jobs."""
+    """Runner loop for `schedule` jobs (only the leader runs them)."""
     await bot.wait_until_ready()
     while not bot.is_closed():
-        schedule.run_pending()
+        if is_leader:
+            schedule.run_pending()
         await asyncio.sleep(30)
 
+# 🔹 OHLCV history store: daily bars per symbol as memory-mapped .npy columns under HISTORY_STORE_DIR
+HISTORY_STORE_DIR = os.getenv("HISTORY_STORE_DIR", "history")
+HISTORY_COLUMNS = ("date", "open", "high", "low", "close", "volume")
+HISTORY_REFRESH_INTERVAL = 900  # seconds before a symbol is checked for new bars again while the market moves
+HISTORY_SYMBOL_PATTERN = re.compile(r"\^?[A-Z0-9][A-Z0-9.=-]{0,14}")  # symbols double as directory names
+history_checked = {}  # ticker -> unix time of the last refresh
+history_write_lock = threading.Lock()  # single and batch refreshes may write the same symbol
+
+def history_path(ticker, column):
+    return os.path.join(HISTORY_STORE_DIR, ticker, f"{column}.npy")
+
+def read_history_columns(ticker):
+    """Memory-map a symbol's stored columns (None when nothing usable is stored)."""
+    try:
+        columns = {column: np.load(history_path(ticker, column), mmap_mode="r") for column in HISTORY_COLUMNS}
+    except (OSError, ValueError):
+        return None
+    if len({len(values) for values in columns.values()}) != 1:
+        return None  # interrupted write: columns disagree, fetch again
+    return columns
+
+def write_history_columns(ticker, columns):
+    """Replace a symbol's column files (each written to a temp file, then renamed)."""
+    os.makedirs(os.path.join(HISTORY_STORE_DIR, ticker), exist_ok=True)
+    with history_write_lock:
+        for column in HISTORY_COLUMNS:
+            path = history_path(ticker, column)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # shard processes share the store
+            with open(temp_path, "wb") as f:
+                np.save(f, columns[column])
+            os.replace(temp_path, path)
+
+def history_frame_to_columns(frame):
+    """Convert a yahooquery history frame to daily OHLCV columns (None when empty)."""
+    if not isinstance(frame, pd.DataFrame) or frame.empty:
+        return None  # yahooquery returns a dict/str for unknown symbols
+
+    frame = frame.reset_index()
+    # daily bars: keep the calendar date whether yahooquery gave a date or a tz-aware timestamp
+    dates = pd.to_datetime(frame["date"].astype(str).str[:10], errors="coerce")
+    closes = frame["close"].to_numpy(dtype="float64") if "close" in frame else np.full(len(frame), np.nan)
+    valid = dates.notna().to_numpy() & np.isfinite(closes)  # a bar without a close would poison the SMA/EMA recurrences
+    if not valid.any():
+        return None
+
+    columns = {"date": dates.to_numpy()[valid].astype("datetime64[D]")}
+    for column in HISTORY_COLUMNS[1:]:
+        values = frame[column].to_numpy(dtype="float64") if column in frame else np.full(len(frame), np.nan)
+        columns[column] = values[valid]
+    return columns
+
+def download_new_bars(tickers, start):
+    """Download daily bars for one or more space-separated symbols from `start` (a datetime64 day), or the full history."""
+    stock = Ticker(tickers)
+    cost = len(tickers.split())
+    if start is None:
+        return yahoo_request(stock.history, period="max", yahoo_cost=cost)
+    return yahoo_request(stock.history, start=str(start), yahoo_cost=cost)
+
+def refresh_history(ticker):
+    """Fetch bars since the last stored date, append them and return the stored columns."""
+    stored = read_history_columns(ticker)
+    last_date = stored["date"][-1] if stored is not None else None
+    fresh = history_frame_to_columns(download_new_bars(ticker, last_date))
+    history_checked[ticker] = time.time()
+    return merge_history(ticker, stored, fresh)
+
+def merge_history(ticker, stored, fresh):
+    """Append freshly downloaded columns to the stored ones and return the result."""
+    if fresh is None:
+        return stored
+
+    if stored is not None:
+        # the last stored bar may be a partial session; the fetched copy replaces it
+        kept = (stored["date"] < fresh["date"][0]) & np.isfinite(stored["close"])  # also drops NaN closes stored by older versions
+        fresh = {column: np.concatenate([stored[column][kept], fresh[column]]) for column in HISTORY_COLUMNS}
+
+    # sort by date, keeping the most recent copy of any repeated day
+    _, first = np.unique(fresh["date"][::-1], return_index=True)
+    order = len(fresh["date"]) - 1 - first
+    write_history_columns(ticker, {column: values[order] for column, values in fresh.items()})
+    return read_history_columns(ticker)
+
+def refresh_history_batch(tickers, batch_size):
+    """Refresh many symbols with multi-symbol history calls, batching symbols that miss similar ranges."""
+    stored = {ticker: read_history_columns(ticker) for ticker in tickers}
+    new = [ticker for ticker in tickers if stored[ticker] is None]
+    known = sorted((ticker for ticker in tickers if stored[ticker] is not None), key=lambda ticker: stored[ticker]["date"][-1])
+
+    batches = [(new[i:i + batch_size], None) for i in range(0, len(new), batch_size)]
+    for i in range(0, len(known), batch_size):
+        chunk = known[i:i + batch_size]
+        batches.append((chunk, stored[chunk[0]]["date"][-1]))  # oldest last bar in the chunk
+
+    for chunk, start in batches:
+        try:
+            frame = download_new_bars(" ".join(chunk), start)
+        except YahooRateLimitError:
+            raise
+        except Exception as e:
+            logger.warning(f"Batch history refresh failed for {', '.join(chunk)}: {e}")
+            continue
+
+        checked_at = time.time()
+        symbols = frame.index.get_level_values("symbol") if isinstance(frame, pd.DataFrame) and not frame.empty else []
+        for ticker in chunk:
+            fresh = history_frame_to_columns(frame.xs(ticker, level="symbol", drop_level=False)) if ticker in symbols else None
+            merge_history(ticker, stored[ticker], fresh)
+            history_checked[ticker] = checked_at
+
+def history_needs_refresh(ticker, now=None):
+    """Recheck every HISTORY_REFRESH_INTERVAL while the market moves, otherwise once after each session settles."""
+    now = time.time() if now is None else now
+    checked = history_checked.get(ticker)
+    if checked is None:
+        return True
+    if quotes_can_change(now):
+        return now - checked >= HISTORY_REFRESH_INTERVAL
+    return checked < last_quote_settle(now)
+
+def get_history_columns(ticker):
+    """Stored daily columns for a symbol, refreshed when history_needs_refresh says a new bar may exist."""
+    ticker = ticker.upper()
+    if not HISTORY_SYMBOL_PATTERN.fullmatch(ticker):
+        return None
+
+    stored = read_history_columns(ticker)
+    if stored is not None and not history_needs_refresh(ticker):
+        return stored
+
+    try:
+        return single_flight(f"history:{ticker}", refresh_history, ticker)
+    except Exception as e:
+        if stored is None:
+            raise
+        logger.warning(f"Serving stored history for {ticker}; refresh failed: {e}")
+        return stored
+
+def history_period_start(dates, period):
+    """Index of the first bar inside `period`, counted back from the last stored bar."""
+    if period == "max" or len(dates) == 0:
+        return 0
+
+    last = dates[-1]
+    if period == "ytd":
+        start = last.astype("datetime64[Y]").astype("datetime64[D]")
+    else:
+        match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+        if not match:
+            raise ValueError(f"Unsupported period '{period}'")
+        count, unit = int(match.group(1)), match.group(2)
+        if unit == "d":
+            return max(len(dates) - count, 0)  # like Yahoo, "Nd" counts trading sessions
+        if unit == "wk":
+            start = last - np.timedelta64(7 * count, "D")
+        else:
+            months = count if unit == "mo" else 12 * count
+            day_of_month = last - last.astype("datetime64[M]").astype("datetime64[D]")
+            start = (last.astype("datetime64[M]") - np.timedelta64(months, "M")).astype("datetime64[D]") + day_of_month
+    return int(np.searchsorted(dates, start, side="left"))
+
+def load_history(ticker, period):
+    """Daily OHLCV bars for `period` from the history store (None when unavailable)."""
+    columns = get_history_columns(ticker)
+    if columns is None:
+        return None
+
+    start = history_period_start(columns["date"], period)
+    history = pd.DataFrame({column: np.asarray(columns[column][start:]) for column in HISTORY_COLUMNS[1:]})
+    history.insert(0, "date", pd.to_datetime(np.asarray(columns["date"][start:])))
+    return history
+
+# 🔹 Indicator engine: NumPy indicators over stored daily bars, extended incrementally as bars arrive
+INDICATOR_CACHE_SIZE = 128  # (symbol, interval) entries kept in memory
+EMA_BLOCK = 64  # bars per closed-form EMA block (bounds (1 - alpha) ** -k)
+indicator_cache = OrderedDict()  # (ticker, interval) -> indicator columns
+indicator_cache_lock = threading.Lock()
+
+def trailing_mean(values, window, start=0):
+    """Mean of the last `window` values for each index from `start` (partial windows at the beginning)."""
+    begin = max(start - window + 1, 0)
+    sums = np.concatenate(([0.0], np.cumsum(values[begin:], dtype="float64")))
+    ends = np.arange(start, len(values)) - begin + 1
+    lows = np.maximum(ends - window, 0)
+    return (sums[ends] - sums[lows]) / (ends - lows)
+
+def trailing_std(values, window, start=0):
+    """Sample standard deviation of the last `window` values from `start` (NaN until the window fills)."""
+    begin = max(start - window + 1, 0)
+    segment = np.asarray(values[begin:], dtype="float64")
+    segment = segment - segment[0]  # shift before squaring to limit cancellation
+    sums = np.concatenate(([0.0], np.cumsum(segment)))
+    squares = np.concatenate(([0.0], np.cumsum(segment * segment)))
+    ends = np.arange(start, len(values)) - begin + 1
+    lows = ends - window
+    full = lows >= 0
+
+    result = np.full(len(ends), np.nan)
+    totals = sums[ends[full]] - sums[lows[full]]
+    variance = (squares[ends[full]] - squares[lows[full]] - totals * totals / window) / (window - 1)
+    result[full] = np.sqrt(np.maximum(variance, 0.0))
+    return result
+
+def ema(values, alpha, previous=None):
+    """EMA matching pandas `ewm(adjust=False)`, continuing from `previous` (seeded with the first value)."""
+    values = np.asarray(values, dtype="float64")
+    result = np.empty(len(values))
+    if previous is None and len(values):
+        previous = values[0]
+
+    # within a block: e[k] = d^(k+1) * previous + alpha * d^(k+1) * sum_j x[j] / d^(j+1)
+    powers = (1.0 - alpha) ** np.arange(1, EMA_BLOCK + 1)
+    for begin in range(0, len(values), EMA_BLOCK):
+        block = values[begin:begin + EMA_BLOCK]
+        decay = powers[:len(block)]
+        result[begin:begin + len(block)] = decay * previous + alpha * decay * np.cumsum(block / decay)
+        previous = result[begin + len(block) - 1]
+    return result
+
+def rsi(closes, window, start=0):
+    """RSI from simple rolling means of gains and losses, as the chart has always drawn it."""
+    begin = max(start - window, 0)
+    delta = np.diff(np.asarray(closes[begin:], dtype="float64"), prepend=np.nan)
+    gains = np.where(delta > 0, delta, 0.0)
+    losses = np.where(delta < 0, -delta, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = trailing_mean(gains, window, start - begin) / trailing_mean(losses, window, start - begin)
+        return 100 - 100 / (1 + rs)
+
+def extend_indicators(columns, cached=None):
+    """Indicator columns for every stored bar, reusing `cached` for all but its last bar."""
+    closes = np.asarray(columns["close"], dtype="float64")
+    highs = np.asarray(columns["high"], dtype="float64")
+    lows = np.asarray(columns["low"], dtype="float64")
+    dates = np.asarray(columns["date"])
+
+    start = 0
+    if cached is not None:
+        start = cached["bars"] - 1  # its last bar may have been a partial session
+        if start < 1 or start > len(dates) or cached["date"][start - 1] != dates[start - 1]:
+            start = 0  # history was rewritten: start over
+
+    def previous(name):
+        return cached[name][start - 1] if start else None
+
+    fresh = {
+        "sma_50": trailing_mean(closes, 50, start),
+        "sma_200": trailing_mean(closes, 200, start),
+        "ema_20": ema(closes[start:], 2 / 21, previous("ema_20")),
+        "ema_12": ema(closes[start:], 2 / 13, previous("ema_12")),
+        "ema_26": ema(closes[start:], 2 / 27, previous("ema_26")),
+        "rsi_14": rsi(closes, 14, start),
+        "bb_mid": trailing_mean(closes, 20, start),
+    }
+    fresh["macd"] = fresh["ema_12"] - fresh["ema_26"]
+    fresh["macd_signal"] = ema(fresh["macd"], 2 / 10, previous("macd_signal"))
+    fresh["macd_hist"] = fresh["macd"] - fresh["macd_signal"]
+
+    band = 2 * trailing_std(closes, 20, start)
+    fresh["bb_upper"] = fresh["bb_mid"] + band
+    fresh["bb_lower"] = fresh["bb_mid"] - band
+
+    # ATR 14 with Wilder smoothing over the true range
+    previous_closes = np.concatenate(([np.nan], closes[:-1]))[start:]
+    true_range = np.fmax(highs[start:] - lows[start:], np.fmax(np.abs(highs[start:] - previous_closes), np.abs(lows[start:] - previous_closes)))
+    fresh["atr_14"] = ema(true_range, 1 / 14, previous("atr_14"))
+
+    if start:
+        fresh = {name: np.concatenate((cached[name][:start], values)) for name, values in fresh.items()}
+    fresh.update(date=dates, close=closes, bars=len(dates))
+    return fresh
+
+def get_indicators(ticker, interval="1d"):
+    """Stored bars with indicator columns for a symbol, cached per (symbol, interval); None without data."""
+    if interval != "1d":
+        raise ValueError(f"Unsupported interval '{interval}' (the history store holds daily bars)")
+
+    columns = get_history_columns(ticker)
+    if columns is None or len(columns["date"]) == 0:
+        return None
+
+    key = (ticker.upper(), interval)
+    with indicator_cache_lock:
+        cached = indicator_cache.get(key)
+
+    if cached is not None and cached["bars"] == len(columns["date"]) and cached["close"][-1] == columns["close"][-1]:
+        indicators = cached
+    else:
+        indicators = extend_indicators(columns, cached)
+
+    with indicator_cache_lock:
+        indicator_cache[key] = indicators
+        indicator_cache.move_to_end(key)
+        while len(indicator_cache) > INDICATOR_CACHE_SIZE:
+            indicator_cache.popitem(last=False)
+    return indicators
+
+# 🔹 NewsAPI client: one keep-alive session, TTL cache (memory, shared through Redis when up),
+# single-flight for identical queries and a daily request budget
+NEWS_API_BASE_URL = os.getenv("NEWS_API_BASE_URL", "https://newsapi.org/v2")  # point at a fake server for local testing
+NEWS_API_DAILY_BUDGET = int(os.getenv("NEWS_API_DAILY_BUDGET", "100"))  # requests per UTC day (developer plan: 100)
+NEWS_CACHE_TTL = {"top-headlines": 1800, "everything": 900}  # seconds per endpoint
+NEWS_API_RESERVED = int(os.getenv("NEWS_API_RESERVED", str(NEWS_API_DAILY_BUDGET // 2)))  # kept for commands and the daily digest
+NEWS_CACHE_MAX_ENTRIES = 512
+news_session = requests.Session()
+news_session.headers["X-Api-Key"] = NEWS_API_KEY or ""  # header instead of query string keeps the key out of URLs
+news_session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=EXECUTOR_LIMITS["news"]))
+news_session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=EXECUTOR_LIMITS["news"]))
+news_cache = {}  # cache key -> (expires_at, payload)
+news_stats = {"day": None, "requests": 0, "cache_hits": 0, "errors": 0, "over_budget": 0}
+news_lock = threading.Lock()
+
+def get_cached_news(cache_key):
+    """Return an unexpired cached NewsAPI payload, or None."""
+    now = time.time()
+    entry = news_cache.get(cache_key)
+    if entry is None and r:
+        try:
+            cached = r.get(cache_key)
+            if cached:
+                entry = tuple(json.loads(cached))
+                remember_news(cache_key, entry, now)
+        except redis.RedisError:
+            pass
+    if entry is not None and entry[0] > now:
+        return entry[1]
+    return None
+
+def remember_news(cache_key, entry, now):
+    """Put an (expires_at, payload) entry in the in-memory news cache, evicting expired entries (or the oldest) when full."""
+    with news_lock:
+        if len(news_cache) >= NEWS_CACHE_MAX_ENTRIES:
+            for key in [key for key, (expires_at, _) in news_cache.items() if expires_at <= now] or list(news_cache)[:1]:
+                news_cache.pop(key, None)
+        news_cache[cache_key] = entry
+
+def store_cached_news(cache_key, payload, ttl):
+    """Cache a NewsAPI payload in memory and, when available, in Redis."""
+    now = time.time()
+    remember_news(cache_key, (now + ttl, payload), now)
+    if r:
+        try:
+            r.setex(cache_key, ttl, json.dumps([now + ttl, payload]))
+        except redis.RedisError:
+            pass
+
+def news_budget_limit():
+    """Requests the current caller may use today: background jobs stop short of NEWS_API_RESERVED."""
+    if yahoo_priority.get() == "background":
+        return NEWS_API_DAILY_BUDGET - NEWS_API_RESERVED
+    return NEWS_API_DAILY_BUDGET
+
+def news_requests_used():
+    """Requests already spent today (shared through Redis when up)."""
+    day = time.strftime("%Y-%m-%d", time.gmtime())
+    if r:
+        try:
+            return int(r.get(f"news_budget:{day}") or 0)
+        except redis.RedisError:
+            pass
+    with news_lock:
+        return news_stats["requests"] if news_stats["day"] == day else 0
+
+def reserve_news_request():
+    """Count one request against today's budget (shared through Redis when up); False once the caller's share is spent."""
+    day = time.strftime("%Y-%m-%d", time.gmtime())  # NewsAPI quotas reset at midnight UTC
+    limit = news_budget_limit()
+    used = None
+    if r:
+        try:
+            budget_key = f"news_budget:{day}"
+            used = r.incr(budget_key)
+            r.expire(budget_key, 2 * 86400)
+            if used > limit:
+                r.decr(budget_key)  # refused requests do not count against the others
+        except redis.RedisError:
+            pass
+
+    with news_lock:
+        if news_stats["day"] != day:
+            news_stats.update(day=day, requests=0, over_budget=0)
+        if used is None:
+            used = news_stats["requests"] + 1
+        if used > limit:
+            news_stats["over_budget"] += 1
+            return False
+        news_stats["requests"] = max(news_stats["requests"], used)
+        return True
+
+def fetch_news_api(endpoint, params, cache_key):
+    """Call NewsAPI once and cache successful responses."""
+    if not reserve_news_request():
+        logger.warning(f"NewsAPI daily budget of {NEWS_API_DAILY_BUDGET} requests is spent; skipping {endpoint}.")
+        return {"status": "error", "code": "budgetExhausted"}
+
+    try:
+        response = news_session.get(f"{NEWS_API_BASE_URL}/{endpoint}", params=params, timeout=NEWS_API_TIMEOUT)
+        payload = response.json()
+    except (requests.RequestException, ValueError) as e:
+        with news_lock:
+            news_stats["errors"] += 1
+        logger.warning(f"NewsAPI request to {endpoint} failed: {e}")
+        return {"status": "error", "code": "requestFailed"}
+
+    if payload.get("status") == "ok":
+        store_cached_news(cache_key, payload, NEWS_CACHE_TTL.get(endpoint, 900))
+    else:
+        with news_lock:
+            news_stats["errors"] += 1
+        logger.warning(f"NewsAPI {endpoint} error: {payload.get('code')} {payload.get('message')}")
+    return payload
+
+def news_api_get(endpoint, **params):
+    """GET a NewsAPI endpoint (e.g. "top-headlines") with query params, served from cache when fresh."""
+    cache_key = f"news:{endpoint}?{urlencode(sorted(params.items()))}"
+    payload = get_cached_news(cache_key)
+    if payload is not None:
+        with news_lock:
+            news_stats["cache_hits"] += 1
+        return payload
+    return single_flight(cache_key, fetch_news_api, endpoint, params, cache_key)
+
+# 🔹 Universe screener: Nasdaq-100 history stacked into (symbols x sessions) NumPy matrices
+NASDAQ100_TICKERS = [
+    "AAPL", "ABNB", "ADBE", "ADI", "ADP", "ADSK", "AEP", "AMAT", "AMD", "AMGN", "AMZN", "APP", "ARM", "ASML",
+    "AVGO", "AXON", "AZN", "BIIB", "BKNG", "BKR", "CCEP", "CDNS", "CDW", "CEG", "CHTR", "CMCSA", "COST", "CPRT",
+    "CRWD", "CSCO", "CSGP", "CSX", "CTAS", "CTSH", "DASH", "DDOG", "DXCM", "EA", "EXC", "FANG", "FAST", "FTNT",
+    "GEHC", "GFS", "GILD", "GOOG", "GOOGL", "HON", "IDXX", "INTC", "INTU", "ISRG", "KDP", "KHC", "KLAC", "LIN",
+    "LRCX", "LULU", "MAR", "MCHP", "MDLZ", "MELI", "META", "MNST", "MRVL", "MSFT", "MSTR", "MU", "NFLX", "NVDA",
+    "NXPI", "ODFL", "ON", "ORLY", "PANW", "PAYX", "PCAR", "PDD", "PEP", "PLTR", "PYPL", "QCOM", "REGN", "ROP",
+    "ROST", "SBUX", "SHOP", "SNPS", "TEAM", "TMUS", "TRI", "TSLA", "TTD", "TTWO", "TXN", "VRSK", "VRTX", "WBD",
+    "WDAY", "XEL", "ZS",
+]  # index members; update on the annual reconstitution
+SCREEN_WINDOW = 20  # sessions for volatility and the average-volume baseline
+SCREEN_BATCH_SIZE = YAHOO_BURST  # symbols per multi-symbol history call
+SCREEN_FILTERS = {
+    "gainers": ("change_1d", True, "📈 **Top Gainers**"),
+    "losers": ("change_1d", False, "📉 **Top Losers**"),
+    "volume": ("volume_ratio", True, "🔊 **Unusual Volume**"),
+}
+
+def refresh_universe_history(tickers=NASDAQ100_TICKERS):
+    """Bring stale universe symbols up to date with batched history calls."""
+    now = time.time()
+    stale = [ticker for ticker in tickers if history_needs_refresh(ticker, now)]
+    if stale:
+        single_flight("history_batch:universe", refresh_history_batch, stale, SCREEN_BATCH_SIZE)
+
+def load_screen_matrix(tickers):
+    """Stack the last SCREEN_WINDOW + 1 sessions of every up-to-date symbol (padded with NaN at the front)."""
+    width = SCREEN_WINDOW + 1
+    stored = {ticker: read_history_columns(ticker) for ticker in tickers}
+    stored = {ticker: columns for ticker, columns in stored.items() if columns is not None and len(columns["date"]) >= 2}
+    if not stored:
+        return None
+
+    # symbols whose last bar lags the universe (halted, delisted) would misalign the columns
+    latest = max(columns["date"][-1] for columns in stored.values())
+    symbols = [ticker for ticker, columns in stored.items() if columns["date"][-1] == latest]
+
+    closes = np.full((len(symbols), width), np.nan)
+    volumes = np.full((len(symbols), width), np.nan)
+    for row, ticker in enumerate(symbols):
+        tail = min(width, len(stored[ticker]["date"]))
+        closes[row, width - tail:] = stored[ticker]["close"][-tail:]
+        volumes[row, width - tail:] = stored[ticker]["volume"][-tail:]
+    return symbols, latest, closes, volumes
+
+def screen_universe(tickers=NASDAQ100_TICKERS):
+    """Returns, volatility and volume spikes for the whole universe, computed column-wise."""
+    matrix = load_screen_matrix(tickers)
+    if matrix is None and (is_leader or not clustered()):
+        # first use: nothing stored yet. After that run_screen_refresher keeps the files warm at background
+        # priority, so commands never wait on a universe refresh; followers only read what the leader stores.
+        refresh_universe_history(tickers)
+        matrix = load_screen_matrix(tickers)
+    if matrix is None:
+        return None
+
+    symbols, latest, closes, volumes = matrix
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN rows for freshly listed symbols
+        daily_returns = np.diff(np.log(closes), axis=1)
+        return {
+            "symbols": symbols,
+            "date": latest,
+            "change_1d": (closes[:, -1] / closes[:, -2] - 1) * 100,
+            "change_5d": (closes[:, -1] / closes[:, -6] - 1) * 100,
+            "volatility": np.nanstd(daily_returns, axis=1, ddof=1) * np.sqrt(252) * 100,  # annualized
+            "volume_ratio": volumes[:, -1] / np.nanmean(volumes[:, :-1], axis=1),
+        }
+
+def get_screen(filter_name, limit=10):
+    """Format the top `limit` symbols for a `!screen` filter."""
+    screen = screen_universe()
+    if screen is None:
+        return "⚠️ Screener data is not available yet. Please try again in a minute."
+
+    metric, descending, title = SCREEN_FILTERS[filter_name]
+    values = screen[metric]
+    ranked = np.flatnonzero(np.isfinite(values))
+    ranked = ranked[np.argsort(values[ranked])]
+    if descending:
+        ranked = ranked[::-1]
+
+    lines = [f"{title} — Nasdaq-100 ({len(screen['symbols'])} symbols, {screen['date']})"]
+    for rank, row in enumerate(ranked[:limit], start=1):
+        lines.append(
+            f"{rank}. **{screen['symbols'][row]}** {screen['change_1d'][row]:+.2f}% today, "
+            f"{screen['change_5d'][row]:+.2f}% 5d, volume {screen['volume_ratio'][row]:.1f}x avg, "
+            f"volatility {screen['volatility'][row]:.0f}%"
+        )
+    return "\n".join(lines)
+
+async def run_screen_refresher():
+    """Background task that keeps universe history warm so `!screen` rarely waits on Yahoo."""
+    yahoo_priority.set("background")
+    while True:
+        try:
+            await run_blocking("background", refresh_universe_history)
+        except Exception as e:
+            logger.warning(f"Universe history refresh failed: {e}")
+        await asyncio.sleep(HISTORY_REFRESH_INTERVAL)
+
 def get_trending_stocks():
     """
     Recommend stocks with strong 5-day performance.
     """
-    trending_stocks = []
-    tickers = ["AAPL", "TSLA", "MSFT", "GOOGL", "AMZN"]  # seed ticker list (expandable)
-
-    for ticker in tickers:
-        stock = Ticker(ticker)
-        history = stock.history(period="5d")  # last 5 days of data
-        if history is not None and not history.empty:
-            close_prices = history["close"].values
-            if len(close_prices) >= 2:
-                change = (close_prices[-1] - close_prices[0]) / close_prices[0] * 100  # 5-day change rate
-                trending_stocks.append((ticker, change))
+    screen = screen_universe()
+    if screen is None:
+        return []
 
+    trending_stocks = [(ticker, change) for ticker, change in zip(screen["symbols"], screen["change_5d"]) if np.isfinite(change)]
     trending_stocks.sort(key=lambda x: x[1], reverse=True)  # sort by gain descending
     return trending_stocks[:3]  # return top 3 tickers
 
+# 🔹 Sentiment cache: polarity per article text in bot_stats.db, shared by every news command
+SENTIMENT_CACHE_TTL = 7 * 24 * 3600  # seconds before a cached score is recomputed
+sentiment_stats = {}  # command -> {"hits", "misses", "seconds"} (seconds spent scoring misses)
+sentiment_stats_lock = threading.Lock()
+
+def store_sentiments(cursor, scores, expired_before):
+    """Write job: cache fresh scores and drop expired ones."""
+    cursor.executemany("INSERT OR REPLACE INTO sentiment_cache (text_hash, polarity, scored_at) VALUES (?, ?, ?)", scores)
+    cursor.execute("DELETE FROM sentiment_cache WHERE scored_at < ?", (expired_before,))
+
+def score_sentiments(texts, command):
+    """Polarity for each text, scoring only cache misses; hits and scoring time are tracked per command."""
+    if not texts:
+        return []
+    hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+    unique_texts = dict(zip(hashes, texts))
+    now = time.time()
+
+    cursor = get_db(STATS_DB).cursor()
+    placeholders = ", ".join("?" * len(unique_texts))
+    cursor.execute(
+        f"SELECT text_hash, polarity FROM sentiment_cache WHERE text_hash IN ({placeholders}) AND scored_at >= ?",
+        (*unique_texts, now - SENTIMENT_CACHE_TTL),
+    )
+    scores = dict(cursor.fetchall())
+
+    # score every miss in one pass and persist them in one write
+    started = time.perf_counter()
+    fresh = [(text_hash, TextBlob(text).sentiment.polarity, now) for text_hash, text in unique_texts.items() if text_hash not in scores]
+    elapsed = time.perf_counter() - started
+    if fresh:
+        scores.update((text_hash, polarity) for text_hash, polarity, _ in fresh)
+        try:
+            db_write(store_sentiments, fresh, now - SENTIMENT_CACHE_TTL, path=STATS_DB)
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to cache {len(fresh)} sentiment scores: {e}")
+
+    with sentiment_stats_lock:
+        stats = sentiment_stats.setdefault(command, {"hits": 0, "misses": 0, "seconds": 0.0})
+        stats["hits"] += len(unique_texts) - len(fresh)
+        stats["misses"] += len(fresh)
+        stats["seconds"] += elapsed
+    return [scores[text_hash] for text_hash in hashes]
+
 def get_sentiment_score(news_title):
     """
     Score sentiment from news headlines (more positive headlines => higher score).
     """
-    return TextBlob(news_title).sentiment.polarity
+    return score_sentiments([news_title], "headline")[0]
 
 def get_positive_news_stocks():
     """
     Recommend stocks with mostly positive headlines.
     """
-    url = f"https://newsapi.org/v2/top-headlines?category=business&language=en&apiKey={NEWS_API_KEY}"
-    response = requests.get(url).json()
+    response = news_api_get("top-headlines", category="business", language="en")
     
     stock_sentiments = {}
 
     if "articles" in response:
-        for article in response["articles"]:
-            title = article["title"]
-            sentiment = get_sentiment_score(title)
-
+        titles = [article["title"] for article in response["articles"]]
+        for title, sentiment in zip(titles, score_sentiments(titles, "positive_news")):
             for ticker in ["AAPL", "TSLA", "MSFT", "GOOGL", "AMZN"]:  # watchlist ticker universe
                 if ticker in title.upper():
                     stock_sentiments[ticker] = stock_sentiments.get(ticker, 0) + sentiment
@@ -871,34 +2249,35 @@ def get_positive_news_stocks():
     return sorted_stocks[:3]  # return top 3 recommendations
 
 def get_trend(ticker):
-    stock = Ticker(ticker)
-    history = stock.history(period="7d")
+    indicators = get_indicators(ticker)
 
-    if history is None or history.empty:
+    if indicators is None:
         return f"⚠️ Unable to fetch trend data for {ticker}. Please check the ticker symbol."
 
-    closing_prices = history['close'].values
+    closing_prices = indicators["close"][history_period_start(indicators["date"], "7d"):]
     if len(closing_prices) < 2:
         return f"⚠️ Not enough data to calculate trend for {ticker}."
 
     trend = ((closing_prices[-1] - closing_prices[0]) / closing_prices[0]) * 100
     trend_symbol = "🔺" if trend >= 0 else "🔻"
+    position = "above" if closing_prices[-1] >= indicators["sma_50"][-1] else "below"
+
+    return (f"📈 **{ticker}**: **{trend_symbol} {trend:.2f}%** change over the last 7 days. "
+            f"RSI 14: {indicators['rsi_14'][-1]:.1f}, {position} SMA 50.")
 
-    return f"📈 **{ticker}**: **{trend_symbol} {trend:.2f}%** change over the last 7 days."
+def get_news_sentiment(ticker, command="!sentiment"):
+    data = news_api_get("everything", q=ticker)
 
-def get_news_sentiment(ticker):
-    url = f"https://newsapi.org/v2/everything?q={ticker}&apiKey={NEWS_API_KEY}"
-    response = requests.get(url)
-    data = response.json()
+    if data.get("code") == "budgetExhausted":
+        return "⚠️ News lookups are paused until tomorrow (daily NewsAPI budget reached)."
 
     if "articles" not in data or not data["articles"]:
         return f"⚠️ No news found for {ticker}. Please check if the ticker symbol is correct."
 
-    sentiment_scores = []
+    texts = []
     for article in data["articles"][:5]:  # analyze only the latest 5 articles
-        text = article["title"] + ". " + (article["description"] if article["description"] else "")
-        sentiment = TextBlob(text).sentiment.polarity
-        sentiment_scores.append(sentiment)
+        texts.append(article["title"] + ". " + (article["description"] if article["description"] else ""))
+    sentiment_scores = score_sentiments(texts, command)
 
     if not sentiment_scores:
         return f"⚠️ Not enough news data to analyze sentiment for {ticker}."
@@ -910,37 +2289,124 @@ def get_news_sentiment(ticker):
 
 def get_top_stocks(limit=10):
     """
-    Get top symbols using a market-cap benchmark.
+    Get top symbols from the Nasdaq-100 universe.
     """
-    stock_list = Ticker("^NDX").symbols  # fetch Nasdaq-100 symbols
-    return stock_list[:limit]  # recommend top 10 symbols
+    return NASDAQ100_TICKERS[:limit]
+
+# 🔹 Recommendation snapshots: the candidate universe is scored in the background and !recommend reads memory
+RECOMMEND_TICKERS = ["AAPL", "MSFT", "GOOGL", "TSLA", "AMZN", "NVDA", "META", "NFLX", "DIS", "BABA"]
+RECOMMEND_REFRESH_INTERVAL = 1800  # seconds between background snapshots (trends come from the history store)
+# one NewsAPI request per candidate per sentiment pass: spread the passes over the background share of the budget
+RECOMMEND_SENTIMENT_INTERVAL = max(
+    RECOMMEND_REFRESH_INTERVAL,
+    24 * 3600 * len(RECOMMEND_TICKERS) // max(NEWS_API_DAILY_BUDGET - NEWS_API_RESERVED, 1),
+)
+recommendation_snapshot = None  # {"entries": {ticker: (trend, sentiment)}, "computed_at", "sentiment_at", "duration"}
+recommendation_refresh = None  # running snapshot task, joined by concurrent refreshes
+RECOMMEND_SNAPSHOT_KEY = "stocksage:recommendations"  # the leader's snapshot, read by the other shard processes
+
+async def score_recommendation(ticker, previous_sentiment):
+    """Trend plus news sentiment for one candidate; pass previous_sentiment to reuse it instead of calling NewsAPI."""
+    trend = await run_blocking("background", get_trend, ticker)
+    if previous_sentiment is not None:
+        return ticker, trend, previous_sentiment
+    sentiment = await run_blocking("background", get_news_sentiment, ticker, "recommend_snapshot")
+    return ticker, trend, sentiment
+
+async def build_recommendation_snapshot():
+    """Score every candidate in parallel and publish the snapshot."""
+    global recommendation_snapshot
+    yahoo_priority.set("background")  # this task only: yields to interactive and alert calls
+    started = time.perf_counter()
+
+    # sentiment is rescored every RECOMMEND_SENTIMENT_INTERVAL, and only while the background share of the budget covers a pass
+    previous = recommendation_snapshot or await run_blocking("cluster", load_shared_recommendations)  # a new leader reuses the old one's scores
+    score_news = previous is None or time.time() - previous["sentiment_at"] >= RECOMMEND_SENTIMENT_INTERVAL
+    if score_news and news_requests_used() + len(RECOMMEND_TICKERS) > news_budget_limit():
+        logger.info("Skipping recommendation sentiment: the rest of today's NewsAPI budget is kept for commands.")
+        score_news = False
+    reused = {}
+    if not score_news:
+        paused = "📰 News sentiment is paused to save the daily NewsAPI budget."
+        previous_entries = previous["entries"] if previous else {}
+        reused = {ticker: previous_entries[ticker][1] if ticker in previous_entries else paused for ticker in RECOMMEND_TICKERS}
+
+    entries = {}
+    results = await asyncio.gather(*(score_recommendation(ticker, reused.get(ticker)) for ticker in RECOMMEND_TICKERS), return_exceptions=True)
+    for ticker, result in zip(RECOMMEND_TICKERS, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Recommendation scoring failed for {ticker}: {result}")
+            continue
+        entries[ticker] = result[1:]
+
+    if entries:
+        sentiment_at = time.time() if score_news else previous["sentiment_at"] if previous else 0.0
+        recommendation_snapshot = {"entries": entries, "computed_at": time.time(), "sentiment_at": sentiment_at, "duration": time.perf_counter() - started}
+        logger.info(f"Recommendation snapshot: {len(entries)} tickers in {recommendation_snapshot['duration']:.1f}s")
+        await run_blocking("cluster", store_shared_recommendations, recommendation_snapshot)
+        return recommendation_snapshot
+    return None  # keep serving the previous snapshot
+
+async def refresh_recommendations():
+    """Rebuild the snapshot now, or join the rebuild already running."""
+    global recommendation_refresh
+    if recommendation_refresh is None or recommendation_refresh.done():
+        recommendation_refresh = asyncio.create_task(build_recommendation_snapshot())
+    return await asyncio.shield(recommendation_refresh)
+
+def store_shared_recommendations(snapshot):
+    if not clustered():
+        return
+    try:
+        r.set(RECOMMEND_SNAPSHOT_KEY, json.dumps(snapshot), ex=24 * 3600)
+    except redis.RedisError as e:
+        logger.warning(f"Failed to share the recommendation snapshot: {e}")
+
+def load_shared_recommendations():
+    """The snapshot last stored by the leader (None without a cluster or before the first one)."""
+    if not clustered():
+        return None
+    try:
+        payload = r.get(RECOMMEND_SNAPSHOT_KEY)
+    except redis.RedisError as e:
+        logger.warning(f"Failed to read the shared recommendation snapshot: {e}")
+        return None
+    return json.loads(payload) if payload else None
+
+async def run_recommendation_refresher():
+    """Background task that keeps the recommendation snapshot fresh."""
+    while True:
+        try:
+            await refresh_recommendations()
+        except Exception as e:
+            logger.warning(f"Recommendation refresh failed: {e}")
+        await asyncio.sleep(RECOMMEND_REFRESH_INTERVAL)
 
-def recommend_stocks():
+def recommend_stocks(snapshot):
     """
-    Randomly choose candidate stocks and return trend + sentiment.
+    Randomly choose candidate stocks from the latest snapshot and return trend + sentiment.
     """
-    tickers = ["AAPL", "MSFT", "GOOGL", "TSLA", "AMZN", "NVDA", "META", "NFLX", "DIS", "BABA"]
-    selected_tickers = random.sample(tickers, 3)  # pick 3 random tickers
+    if snapshot is None:
+        return "⚠️ Recommendations are still being prepared. Please try again in a minute."
+
+    selected_tickers = random.sample(list(snapshot["entries"]), min(3, len(snapshot["entries"])))  # pick 3 random tickers
     recommendations = ["📢 **Investment Recommendations**\n"]
 
     for ticker in selected_tickers:
-        trend = get_trend(ticker)  # 5-day trend
-        sentiment = get_news_sentiment(ticker)  # news sentiment analysis
+        trend, sentiment = snapshot["entries"][ticker]
         recommendations.append(f"{trend}\n{sentiment}\n")
 
+    age_minutes = (time.time() - snapshot["computed_at"]) / 60
+    recommendations.append(f"🕒 Updated {age_minutes:.0f} min ago (scored in {snapshot['duration']:.1f}s).")
     return "\n".join(recommendations)
 
 def add_percentage_alert(user_id, ticker, percentage_change):
-    conn = sqlite3.connect("portfolio.db")
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT OR REPLACE INTO alerts (user_id, ticker, target_price)
-        VALUES (?, ?, ?)
-    """, (user_id, ticker.upper(), percentage_change))
-
-    conn.commit()
-    conn.close()
+    created_at = time.time()
+    db_write(execute_write, """
+        INSERT OR REPLACE INTO alerts (user_id, ticker, target_price, created_at)
+        VALUES (?, ?, ?, ?)
+    """, (user_id, ticker.upper(), percentage_change, created_at))
+    index_alert(user_id, ticker.upper(), percentage_change, created_at)  # shares the alerts table
 
     return f"✅ Price alert set for {ticker.upper()} at ±{percentage_change:.2f}% movement."
 
@@ -948,19 +2414,19 @@ async def check_percentage_alerts():
     """
     Periodically check user-defined % alerts and send Discord notifications.
     """
+    yahoo_priority.set("alerts")  # yields to interactive commands
     await bot.wait_until_ready()
     
     while not bot.is_closed():
-        conn = sqlite3.connect("portfolio.db")
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT user_id, ticker, target_price FROM alerts")
-        alerts = cursor.fetchall()
-        conn.close()
-
-        for user_id, ticker, target_change in alerts:
-            current_price = get_stock_price_value(ticker)
-            price_data = get_price_data(ticker)
+        if not quotes_can_change():
+            await asyncio.sleep(min(600, max(next_regular_open() - time.time(), 1)))  # changes vs previous close are frozen
+            continue
+
+        alerts = await run_blocking("db", get_all_alerts)
+
+        for user_id, ticker, target_change, _ in alerts:
+            current_price = await run_blocking("market", get_stock_price_value, ticker)
+            price_data = await run_blocking("market", get_price_data, ticker)
             previous_close = price_data.get("regularMarketPreviousClose") if price_data else None
 
             if current_price and previous_close:
@@ -970,103 +2436,205 @@ async def check_percentage_alerts():
                     user = await bot.fetch_user(int(user_id))
                     if user:
                         await user.send(f"🚨 **Price Alert!** {ticker} has changed by {percentage_change:.2f}% (Target: ±{target_change:.2f}%).")
-                        remove_alert(user_id, ticker)
+                        await run_blocking("db", remove_alert, user_id, ticker)
 
         await asyncio.sleep(600)  # check every 10 minutes (reduce API load)
 
-def get_stock_chart(ticker, period="10y"):
+def fetch_chart_history(ticker, period):
+    """Close prices and chart indicators for `period` from the indicator engine (None when empty)."""
+    indicators = get_indicators(ticker)
+    if indicators is None:
+        return None
+
+    start = history_period_start(indicators["date"], period)
+    if start >= indicators["bars"]:
+        return None
+
+    return pd.DataFrame({
+        "date": pd.to_datetime(indicators["date"][start:]),
+        "close": indicators["close"][start:],
+        "SMA_50": indicators["sma_50"][start:],
+        "SMA_200": indicators["sma_200"][start:],
+        "EMA_20": indicators["ema_20"][start:],
+        "RSI_14": indicators["rsi_14"][start:],
+    })
+
+# 🔹 Chart decimation: cap plotted points at the chart's pixel width
+CHART_WIDTH_PX = 1000  # figsize width 10in at matplotlib's default 100 dpi
+CHART_MARKER_MAX_POINTS = 60  # above this, point markers only smear the line
+
+def lttb_indices(x, y, threshold):
+    """Indices kept by largest-triangle-three-buckets; the first and last points always survive."""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    # threshold - 2 buckets between the fixed end points, plus the last point as the final "next" bucket
+    every = (n - 2) / (threshold - 2)
+    edges = np.append(np.floor(np.arange(threshold - 1) * every).astype(int) + 1, n)
+
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end, next_end = edges[bucket], edges[bucket + 1], edges[bucket + 2]
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        # area of the triangle (previous pick, candidate, next bucket average), up to a constant factor
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+def minmax_indices(y, max_points):
+    """Indices of each bucket's minimum and maximum, so indicator spikes survive decimation."""
+    n = len(y)
+    if n <= max_points or max_points < 2:
+        return np.arange(n)
+
+    size = -(-n // ((max_points - 2) // 2))
+    buckets = -(-n // size)
+    padded = np.concatenate((y, np.full(size * buckets - n, y[-1]))).reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    lows = np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1) + offsets
+    highs = np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1) + offsets
+    return np.unique(np.minimum(np.concatenate(([0, n - 1], lows, highs)), n - 1))
+
+def decimate_chart_history(history, max_points=CHART_WIDTH_PX):
+    """Split a chart frame into per-series (dates, values) with at most about max_points each."""
+    dates = history["date"].to_numpy()
+    closes = history["close"].to_numpy(dtype="float64")
+    keep = lttb_indices(dates.astype("datetime64[s]").astype("int64"), closes, max_points)
+    series = {"close": (dates[keep], closes[keep])}
+
+    for name in CHART_INDICATORS:
+        values = history[name].to_numpy(dtype="float64")
+        keep = minmax_indices(values, max_points)
+        series[name] = (dates[keep], values[keep])
+    return series
+
+def render_stock_chart(ticker, period, history):
+    """Render the indicator chart as PNG bytes (runs in the render process pool)."""
+    series = decimate_chart_history(history)
+    dates, closes = series["close"]
+
+    # 📈 Build chart (a standalone Figure: no pyplot global state)
+    fig = Figure(figsize=(10, 8), tight_layout=True)
+    ax = fig.subplots(2, gridspec_kw={'height_ratios': [3, 1]})
+
+    # 🔹 Price chart (markers only while individual points are distinguishable)
+    marker = "o" if len(closes) <= CHART_MARKER_MAX_POINTS else None
+    ax[0].plot(dates, closes, marker=marker, linestyle="-", label=f"{ticker} Price", color="blue")
+    ax[0].plot(*series["SMA_50"], linestyle="--", label="SMA 50", color="orange")
+    ax[0].plot(*series["SMA_200"], linestyle="--", label="SMA 200", color="red")
+    ax[0].plot(*series["EMA_20"], linestyle="-", label="EMA 20", color="green")
+
+    # Format x-axis
+    ax[0].xaxis.set_major_locator(MaxNLocator(10))
+    ax[0].xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
+    ax[0].set_title(f"{ticker.upper()} Stock Price with Indicators ({period})", fontsize=14)
+    ax[0].set_xlabel("Date", fontsize=12)
+    ax[0].set_ylabel("Price (USD)", fontsize=12)
+    ax[0].legend()
+    ax[0].grid(True)
+
+    # 🔹 RSI chart
+    ax[1].plot(*series["RSI_14"], color="purple", label="RSI 14")
+    ax[1].axhline(70, linestyle="--", color="red")  # overbought threshold
+    ax[1].axhline(30, linestyle="--", color="green")  # oversold threshold
+    ax[1].set_ylabel("RSI Value")
+    ax[1].set_xlabel("Date")
+    ax[1].set_title("Relative Strength Index (RSI)")
+    ax[1].legend()
+    ax[1].grid(True)
+
+    return figure_to_png(fig)
+
+# 🔹 Rendered chart cache: PNG bytes keyed by (ticker, period, indicator set, last bar), bounded by size
+CHART_CACHE_BUDGET = 64 * 1024 * 1024  # bytes of PNG data kept in memory
+CHART_INDICATORS = ("SMA_50", "SMA_200", "EMA_20", "RSI_14")  # drawn by render_stock_chart
+chart_cache = OrderedDict()  # key -> png bytes
+chart_cache_bytes = 0
+chart_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+chart_cache_lock = threading.Lock()
+chart_renders = {}  # key -> in-flight render task, shared by concurrent requests
+
+def chart_cache_key(ticker, period, indicators, history):
+    """Cache key for a chart; the last bar's close is included because an open session keeps updating it."""
+    last_bar = history.iloc[-1]
+    return (ticker.upper(), period, indicators, str(last_bar["date"]), float(last_bar["close"]))
+
+def get_cached_chart(key):
+    """Return cached PNG bytes for a chart key, or None."""
+    with chart_cache_lock:
+        png = chart_cache.get(key)
+        if png is None:
+            chart_cache_stats["misses"] += 1
+            return None
+        chart_cache.move_to_end(key)
+        chart_cache_stats["hits"] += 1
+        return png
+
+def store_cached_chart(key, png):
+    """Cache rendered PNG bytes, evicting least recently used charts over the budget."""
+    global chart_cache_bytes
+    if len(png) > CHART_CACHE_BUDGET:
+        return
+    with chart_cache_lock:
+        previous = chart_cache.pop(key, None)
+        if previous is not None:
+            chart_cache_bytes -= len(previous)
+        chart_cache[key] = png
+        chart_cache_bytes += len(png)
+        while chart_cache_bytes > CHART_CACHE_BUDGET:
+            _, evicted = chart_cache.popitem(last=False)
+            chart_cache_bytes -= len(evicted)
+            chart_cache_stats["evictions"] += 1
+
+async def get_stock_chart(ticker, period="10y"):
     try:
-        # 📊 Fetch data
-        stock = Ticker(ticker)
-        history = stock.history(period=period)
+        # 📊 Fetch data on the I/O pool, render in the process pool
+        history = await run_blocking("market", fetch_chart_history, ticker, period)
 
-        if history.empty:
+        if history is None:
             return None, f"⚠️ No data available for {ticker} over the period '{period}'."
 
-        # ✅ Flatten MultiIndex
-        history = history.reset_index()
-
-        # Normalize date column from string values
-        history["date"] = pd.to_datetime(history["date"].astype(str), errors="coerce")  # convert to datetime after string normalization
-        history = history[["date", "close"]]  # keep only required columns
-
-        # Add moving averages
-        history["SMA_50"] = history["close"].rolling(window=50, min_periods=1).mean()
-        history["SMA_200"] = history["close"].rolling(window=200, min_periods=1).mean()
-        history["EMA_20"] = history["close"].ewm(span=20, adjust=False).mean()
-
-        # Compute RSI
-        delta = history["close"].diff()
-        gain = delta.where(delta > 0, 0)
-        loss = -delta.where(delta < 0, 0)
-        avg_gain = gain.rolling(window=14, min_periods=1).mean()
-        avg_loss = loss.rolling(window=14, min_periods=1).mean()
-        rs = avg_gain / avg_loss
-        history["RSI_14"] = 100 - (100 / (1 + rs))
-
-        # 📈 Build chart
-        fig, ax = plt.subplots(2, figsize=(10, 8), gridspec_kw={'height_ratios': [3, 1]})
-
-        # 🔹 Price chart
-        ax[0].plot(history["date"], history["close"], marker="o", linestyle="-", label=f"{ticker} Price", color="blue")
-        ax[0].plot(history["date"], history["SMA_50"], linestyle="--", label="SMA 50", color="orange")
-        ax[0].plot(history["date"], history["SMA_200"], linestyle="--", label="SMA 200", color="red")
-        ax[0].plot(history["date"], history["EMA_20"], linestyle="-", label="EMA 20", color="green")
-
-        # Format x-axis
-        ax[0].xaxis.set_major_locator(MaxNLocator(10))
-        ax[0].xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
-        ax[0].set_title(f"{ticker.upper()} Stock Price with Indicators ({period})", fontsize=14)
-        ax[0].set_xlabel("Date", fontsize=12)
-        ax[0].set_ylabel("Price (USD)", fontsize=12)
-        ax[0].legend()
-        ax[0].grid(True)
-
-        # 🔹 RSI chart
-        ax[1].plot(history["date"], history["RSI_14"], color="purple", label="RSI 14")
-        ax[1].axhline(70, linestyle="--", color="red")  # overbought threshold
-        ax[1].axhline(30, linestyle="--", color="green")  # oversold threshold
-        ax[1].set_ylabel("RSI Value")
-        ax[1].set_xlabel("Date")
-        ax[1].set_title("Relative Strength Index (RSI)")
-        ax[1].legend()
-        ax[1].grid(True)
-
-        # Save chart
-        chart_path = f"{ticker}_chart.png"
-        plt.tight_layout()
-        plt.savefig(chart_path)
-        plt.close()
-
-        return chart_path, None
-
+        key = chart_cache_key(ticker, period, CHART_INDICATORS, history)
+        chart_png = get_cached_chart(key)
+        if chart_png is None:
+            render = chart_renders.get(key)
+            if render is None:
+                render = chart_renders[key] = asyncio.ensure_future(run_blocking("render", render_stock_chart, ticker, period, history))
+                render.add_done_callback(lambda _: chart_renders.pop(key, None))
+            chart_png = await asyncio.shield(render)
+            store_cached_chart(key, chart_png)
+        return chart_png, None
+
+    except YahooRateLimitError:
+        return None, "⚠️ Unable to fetch chart data right now (rate limit). Please try again in a few minutes."
     except Exception as e:
-        err_text = str(e)
-        if "429" in err_text or "ResponseError" in err_text:
-            return None, "⚠️ Unable to fetch chart data right now (rate limit). Please try again in a few minutes."
         return None, f"⚠️ Unable to generate chart right now. {e}"
 
 def create_plotly_chart(ticker, period="1y"):
-    stock = Ticker(ticker)
-    history = stock.history(period=period)
+    history = load_history(ticker, period)
 
-    if history.empty:
+    if history is None or history.empty:
         return None, f"⚠️ No data available for {ticker} over the period '{period}'."
 
-    # Normalize dataframe
-    history = history.reset_index()
-    history["date"] = pd.to_datetime(history["date"])
-    if history["date"].iloc[0].tzinfo is not None:
-        history["date"] = history["date"].dt.tz_convert(None)
-    else:
-        history["date"] = history["date"].dt.tz_localize(None)
     history = history[["date", "close"]]
-
-    # Plotly Build chart
+    key = chart_cache_key(ticker, period, ("plotly",), history)
+    chart_png = get_cached_chart(key)
+    if chart_png is not None:
+        return chart_png, None
+
+    # Plotly Build chart (close decimated to the image width)
+    dates = history["date"].to_numpy()
+    keep = lttb_indices(dates.astype("datetime64[s]").astype("int64"), history["close"].to_numpy(dtype="float64"), CHART_WIDTH_PX)
     fig = go.Figure()
     fig.add_trace(go.Scatter(
-        x=history["date"],
-        y=history["close"],
+        x=dates[keep],
+        y=history["close"].to_numpy()[keep],
         mode='lines',
         line=dict(color='gold', width=2),
         fill='tozeroy',
@@ -1084,10 +2652,10 @@ def create_plotly_chart(ticker, period="1y"):
         font=dict(size=14)
     )
 
-    # Save chart as PNG
-    chart_path = f"{ticker}_plotly_chart.png"
-    fig.write_image(chart_path)
-    return chart_path, None
+    # Encode chart as PNG bytes
+    chart_png = fig.to_image(format="png")
+    store_cached_chart(key, chart_png)
+    return chart_png, None
 
 def export_portfolio_to_csv(user_id):
     holdings = get_user_holdings(user_id)
@@ -1096,11 +2664,12 @@ def export_portfolio_to_csv(user_id):
         return None, "⚠️ You do not own any stocks."
 
     data = []
+    prices = get_stock_prices([item["ticker"] for item in holdings])
     for item in holdings:
         ticker = item["ticker"]
         quantity = item["net_qty"]
         total_cost = item["cost_basis"]
-        current_price = get_stock_price_value(ticker)
+        current_price = prices.get(ticker)
         if current_price is None:
             continue
         avg_buy_price = item["avg_buy_price"] if quantity > 0 else 0
@@ -1113,42 +2682,172 @@ def export_portfolio_to_csv(user_id):
     df.to_csv(file_path, index=False)
     return file_path, None
 
-def get_cached_stock_price(ticker):
-    if r:
-        cached_price = r.get(f"stock_price:{ticker}")
-        if cached_price:
-            return float(cached_price)
-    else:
-        cached_data = price_cache.get(ticker)
-        if cached_data and time.time() - cached_data[1] < CACHE_EXPIRY:
-            return cached_data[0]
-    return None
+# 🔹 Price cache: LRU (L1) -> Redis (L2) -> Yahoo, with stale-while-revalidate
+def remember_price(ticker, price, fetched_at, quote=None):
+    """Store a price in the in-process LRU, evicting the least recently used ticker.
 
-def update_stock_price_cache(ticker, price):
-    """Store stock price in cache."""
-    price_cache[ticker] = (price, time.time())
-    if r:
-        try:
-            r.setex(f"stock_price:{ticker}", CACHE_EXPIRY, price)
-        except redis.RedisError:
-            pass
+    The payload is merged over the cached one like the Redis hash, so a tick keeps the name and previous close.
+    """
+    with price_cache_lock:
+        previous = price_cache.get(ticker)
+        quote = {**(previous[3] if previous is not None else {}), **(quote or {}), "regularMarketPrice": price}
+        entry = (price, fetched_at, price_expires_at(fetched_at), quote)
+        price_cache[ticker] = entry
+        price_cache.move_to_end(ticker)
+        while len(price_cache) > PRICE_CACHE_SIZE:
+            price_cache.popitem(last=False)
+    return entry
+
+def record_fetch_time(ticker, fetched_at):
+    """Remember when a ticker last went to Yahoo (bounded like the price LRU)."""
+    with price_cache_lock:
+        last_fetch_time[ticker] = fetched_at
+        last_fetch_time.move_to_end(ticker)
+        while len(last_fetch_time) > PRICE_CACHE_SIZE:
+            last_fetch_time.popitem(last=False)
+
+def in_fetch_cooldown(ticker, now):
+    with price_cache_lock:
+        last_fetch = last_fetch_time.get(ticker)
+    return last_fetch is not None and now - last_fetch < MIN_FETCH_INTERVAL
+
+def get_price_entries(tickers):
+    """{ticker: (price, fetched_at, expires_at, quote)} from the LRU, then one pipelined Redis read for the rest.
+
+    Entries up to PRICE_STALE_MAX past expiry are included; tickers with nothing usable are left out.
+    """
+    now = time.time()
+    entries = {}
+    with price_cache_lock:
+        for ticker in tickers:
+            entry = price_cache.get(ticker)
+            if entry is not None:
+                price_cache.move_to_end(ticker)
+                entries[ticker] = entry
+    fresh = {ticker for ticker, entry in entries.items() if now < entry[2]}  # no Redis round trip for these
+
+    for ticker, (payload, fetched_at) in read_cached_quotes([ticker for ticker in tickers if ticker not in fresh]).items():
+        if ticker not in entries or fetched_at > entries[ticker][1]:
+            entries[ticker] = remember_price(ticker, payload["regularMarketPrice"], fetched_at, payload)  # another process refreshed it
+
+    outcomes = {"l1_hits": len(fresh), "redis_hits": 0, "stale": 0, "misses": 0}
+    for ticker in tickers:
+        entry = entries.get(ticker)
+        if ticker in fresh:
+            continue
+        if entry is not None and now < entry[2]:
+            outcomes["redis_hits"] += 1
+        elif entry is not None and now - entry[2] < PRICE_STALE_MAX:
+            outcomes["stale"] += 1
+        else:
+            outcomes["misses"] += 1
+            entries.pop(ticker, None)
+    count_price_lookups(outcomes)
+    return entries
+
+# Redis keeps one hash per ticker (QUOTE_KEY_PREFIX + ticker): every field of the Yahoo
+# price payload JSON-encoded, plus "_at" with the fetch time
+QUOTE_KEY_PREFIX = "stock_quote:"
+
+def encode_quote(payload, fetched_at):
+    """Serialize a Yahoo price payload into Redis hash fields."""
+    fields = {key: json.dumps(value, default=str) for key, value in payload.items()}
+    fields["_at"] = json.dumps(fetched_at)
+    return fields
+
+def decode_quote(fields):
+    """Inverse of encode_quote: (payload, fetched_at), or None for an empty or partial hash."""
+    if "_at" not in fields or "regularMarketPrice" not in fields:
+        return None
+    payload = {key: json.loads(value) for key, value in fields.items()}
+    return payload, payload.pop("_at")
+
+def read_cached_quotes(tickers):
+    """{ticker: (payload, fetched_at)} for the tickers cached in Redis, in one pipelined round trip."""
+    if not r or not tickers:
+        return {}
+    try:
+        with r.pipeline(transaction=False) as pipe:
+            for ticker in tickers:
+                pipe.hgetall(QUOTE_KEY_PREFIX + ticker)
+            results = pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Redis quote read failed: {e}")
+        return {}
+
+    quotes = {}
+    for ticker, fields in zip(tickers, results):
+        quote = decode_quote(fields) if fields else None
+        if quote is not None:
+            quotes[ticker] = quote
+    return quotes
+
+def cache_quotes(quotes):
+    """Store {ticker: (payload, fetched_at)} in the LRU and, in one pipelined round trip, in Redis."""
+    if not quotes:
+        return
+    now = time.time()
+    with_ttl = {}
+    for ticker, (payload, fetched_at) in quotes.items():
+        expires_at = remember_price(ticker, payload["regularMarketPrice"], fetched_at, payload)[2]
+        with_ttl[ticker] = (payload, fetched_at, max(int(expires_at - now), 0) + PRICE_STALE_MAX)
+    if not r:
+        return
+
+    try:
+        with r.pipeline(transaction=False) as pipe:
+            for ticker, (payload, fetched_at, ttl) in with_ttl.items():
+                key = QUOTE_KEY_PREFIX + ticker
+                pipe.hset(key, mapping=encode_quote(payload, fetched_at))  # merges: a tick keeps the last full payload
+                pipe.expire(key, ttl)
+            pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Redis quote write failed: {e}")
+
+def revalidate_price(ticker):
+    """Start one background refresh for an expired price (skipped during the ticker's cooldown)."""
+    with price_cache_lock:
+        if ticker in price_revalidating:
+            return
+        price_revalidating.add(ticker)
+    if in_fetch_cooldown(ticker, time.time()):
+        with price_cache_lock:
+            price_revalidating.discard(ticker)
+        return
+    revalidate_executor.submit(contextvars.copy_context().run, refresh_stale_price, ticker)
+
+def refresh_stale_price(ticker):
+    yahoo_priority.set("background")  # the caller already has a price to show
+    try:
+        single_flight(f"quote:{ticker}", fetch_stock_quote, ticker)
+    except Exception as e:
+        logger.warning(f"Background price refresh failed for {ticker}: {e}")
+    finally:
+        with price_cache_lock:
+            price_revalidating.discard(ticker)
+
+def count_price_lookups(outcomes):
+    with price_cache_lock:
+        for outcome, count in outcomes.items():
+            price_cache_stats[outcome] += count
+
+def record_price_lookup(seconds):
+    with price_cache_lock:
+        price_lookup_seconds.append(seconds)
+
+def format_price_age(age):
+    """Human-readable age of a cached price."""
+    return f"{age:.0f}s" if age < 60 else f"{age / 60:.0f}m"
 
 async def send_chart(channel, ticker, period="1mo"):
-    chart_path = f"{ticker}_chart.png"
+    # (1) Build chart example
+    fig = Figure(figsize=(6, 4))
+    ax = fig.subplots()
+    ax.plot([1, 2, 3], [4, 5, 6])  # simple line plot example
+    ax.set_title(f"Stock Chart for {ticker}")
 
-    try:
-        # (1) Build chart example
-        plt.figure(figsize=(6, 4))
-        plt.plot([1, 2, 3], [4, 5, 6])  # simple line plot example
-        plt.title(f"Stock Chart for {ticker}")
-        plt.savefig(chart_path)  # save file
-        plt.close()
-
-        # (2) send file to Discord channel
-        await channel.send(file=discord.File(chart_path))
-    finally:
-        if os.path.exists(chart_path):
-            os.remove(chart_path)
+    # (2) send PNG bytes to Discord channel
+    await channel.send(file=discord.File(io.BytesIO(figure_to_png(fig)), filename=f"{ticker}_chart.png"))
 
 async def send_portfolio_csv(channel, user_id):
     file_path = f"{user_id}_portfolio.csv"
@@ -1165,22 +2864,11 @@ async def send_portfolio_csv(channel, user_id):
     os.remove(file_path)
 
 def get_financial_news():
-    cache_key = "news_cache"
-    
-    if r:  # use cache only when Redis is available
-        cached_news = r.get(cache_key)
-        if cached_news:
-            return json.loads(cached_news)
-
-    # fetch latest business headlines from News API
-    url = f"https://newsapi.org/v2/top-headlines?category=business&language=en&apiKey={NEWS_API_KEY}"
-    response = requests.get(url).json()
+    # fetch latest business headlines from News API (cached by the client)
+    response = news_api_get("top-headlines", category="business", language="en")
 
     if "articles" in response:
-        news = response["articles"][:5]  # keep top 5 articles
-        if r:
-            r.setex(cache_key, 1800, json.dumps(news))  # cache for 30 minutes
-        return news
+        return response["articles"][:5]  # keep top 5 articles
 
     return "⚠️ Unable to fetch news."
 
@@ -1190,17 +2878,194 @@ async def send_help_message(channel):
     for chunk in chunks:
         await channel.send(chunk.strip())  # trim whitespace before sending
 
+# 🔹 Seen-user set: interactions are tracked in memory and only new IDs are flushed to bot_stats.db
+USER_FLUSH_INTERVAL = 30  # seconds between unique-user flushes
+seen_user_ids = set()
+pending_user_ids = set()  # seen but not yet written
+
+def load_seen_users():
+    """Load already-recorded user IDs from unique_users."""
+    cursor = get_db(STATS_DB).cursor()
+    cursor.execute("SELECT user_id FROM unique_users")
+    seen_user_ids.update(user_id for (user_id,) in cursor.fetchall())
+    logger.info(f"Loaded {len(seen_user_ids)} known users.")
+
+def record_unique_users(cursor, user_ids):
+    """Write job: remember users who interacted with the bot."""
+    cursor.executemany("INSERT OR IGNORE INTO unique_users (user_id) VALUES (?)", [(user_id,) for user_id in user_ids])
+
 def log_user_interaction(user_id):
-    """Record user interactions in the database."""
-    with sqlite3.connect("bot_stats.db") as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS unique_users (
-                user_id TEXT PRIMARY KEY
-            )
-        """)
-        cursor.execute("INSERT OR IGNORE INTO unique_users (user_id) VALUES (?)", (user_id,))
-        conn.commit()
+    """Record a user interaction; only first-time users are queued for the database."""
+    if user_id not in seen_user_ids:
+        seen_user_ids.add(user_id)
+        pending_user_ids.add(user_id)
+
+async def flush_seen_users():
+    """Write the user IDs seen since the last flush."""
+    if not pending_user_ids:
+        return
+    user_ids = list(pending_user_ids)
+    pending_user_ids.clear()
+    try:
+        await db_write_async(record_unique_users, user_ids, path=STATS_DB)
+    except Exception as e:
+        pending_user_ids.update(user_ids)  # retry on the next flush
+        logger.warning(f"Failed to flush {len(user_ids)} unique users: {e}")
+
+async def run_user_flush():
+    """Background task that periodically flushes new user IDs."""
+    await run_blocking("db", load_seen_users)
+    while True:
+        await asyncio.sleep(USER_FLUSH_INTERVAL)
+        await flush_seen_users()
+
+# 🔹 Cluster coordination (Redis): one leader runs check_alerts and the daily news, pub/sub carries
+# ticks, alert index changes and news to the other shard processes
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+CLUSTER_CHANNEL_PREFIX = "stocksage:cluster:"
+CLUSTER_CHANNELS = ("ticks", "alerts", "news")
+LEADER_KEY = "stocksage:leader"
+LEADER_TTL = 30  # seconds a leader lease lasts without renewal
+LEADER_RENEW_INTERVAL = 10
+SHARD_COUNTS_KEY = "stocksage:shard_counts"  # hash: instance -> {"servers", "users", "at"}
+SHARD_COUNTS_MAX_AGE = 3 * LEADER_RENEW_INTERVAL  # counts from processes silent this long are ignored
+ALERT_FIRE_DEDUP_TTL = 600  # seconds a fired alert stays claimed
+DAILY_NEWS_DEDUP_TTL = 24 * 3600
+is_leader = False
+leader_tasks = {}  # leader job -> running task
+leader_renewed_at = -math.inf  # monotonic time of the last successful lease renewal
+
+def clustered():
+    """Coordination is only needed (and only possible) with several shard processes and Redis."""
+    return SHARD_COUNT > 1 and r is not None
+
+def publish_cluster_event(channel, **event):
+    if not clustered():
+        return
+    try:
+        r.publish(CLUSTER_CHANNEL_PREFIX + channel, json.dumps({"from": INSTANCE_ID, **event}))
+    except redis.RedisError as e:
+        logger.warning(f"Cluster publish on {channel} failed: {e}")
+
+def claim_once_many(keys, ttl):
+    """SET NX each key; True where this process claimed it first (always True without a cluster)."""
+    if not clustered():
+        return [True] * len(keys)
+    try:
+        with r.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.set(f"stocksage:claim:{key}", INSTANCE_ID, nx=True, ex=ttl)
+            return [bool(claimed) for claimed in pipe.execute()]
+    except redis.RedisError as e:
+        logger.warning(f"Cluster claim failed, proceeding without deduplication: {e}")
+        return [True] * len(keys)
+
+def hold_leadership():
+    """Renew or acquire the leader lease; True while this process leads."""
+    global leader_renewed_at
+    if not clustered():
+        return SHARD_IDS is None or 0 in SHARD_IDS  # without Redis, the process owning shard 0 leads
+    try:
+        with r.pipeline() as pipe:
+            pipe.watch(LEADER_KEY)
+            if pipe.get(LEADER_KEY) == INSTANCE_ID:
+                pipe.multi()
+                pipe.expire(LEADER_KEY, LEADER_TTL)
+                pipe.execute()
+                leading = True
+            else:
+                pipe.unwatch()
+                leading = bool(r.set(LEADER_KEY, INSTANCE_ID, nx=True, ex=LEADER_TTL))
+    except redis.WatchError:
+        leading = False  # the lease changed hands while renewing
+    except redis.RedisError as e:
+        logger.warning(f"Leader lease renewal failed: {e}")
+        return is_leader and time.monotonic() - leader_renewed_at < LEADER_TTL  # keep leading until the lease would have lapsed
+    if leading:
+        leader_renewed_at = time.monotonic()
+    return leading
+
+def publish_shard_counts():
+    """Share this process's guild and member counts so bot stats cover every shard."""
+    if not clustered():
+        return
+    counts = {"servers": len(bot.guilds), "users": get_total_user_count(), "at": time.time()}
+    try:
+        r.hset(SHARD_COUNTS_KEY, INSTANCE_ID, json.dumps(counts))
+    except redis.RedisError as e:
+        logger.warning(f"Failed to publish shard counts: {e}")
+
+def get_cluster_counts():
+    """(servers, users) across every live shard process."""
+    if not clustered():
+        return len(bot.guilds), get_total_user_count()
+    publish_shard_counts()
+    try:
+        rows = r.hgetall(SHARD_COUNTS_KEY)
+    except redis.RedisError as e:
+        logger.warning(f"Failed to read shard counts: {e}")
+        return len(bot.guilds), get_total_user_count()
+    live = [counts for counts in map(json.loads, rows.values()) if time.time() - counts["at"] < SHARD_COUNTS_MAX_AGE]
+    return sum(counts["servers"] for counts in live), sum(counts["users"] for counts in live)
+
+def supervise_leader_jobs():
+    """Start the leader-only jobs, restarting any that stopped while this process still leads."""
+    # one process polls ticks and spends the background Yahoo and NewsAPI budget for the cluster
+    for job in (check_alerts, run_recommendation_refresher, run_screen_refresher):
+        task = leader_tasks.get(job)
+        if task is not None and task.done():
+            error = None if task.cancelled() else task.exception()
+            logger.warning(f"Leader job {job.__name__} stopped ({error!r}); restarting.")
+        if task is None or task.done():
+            leader_tasks[job] = asyncio.create_task(job())
+
+async def run_leader_election():
+    """Background task: keep the leader lease and start or stop the leader-only jobs with it."""
+    global is_leader
+    await bot.wait_until_ready()
+    while not bot.is_closed():
+        leading = await run_blocking("cluster", hold_leadership)
+        if leading:
+            if not is_leader:
+                logger.info(f"{INSTANCE_ID} is now the leader.")
+            supervise_leader_jobs()
+        elif is_leader:
+            logger.warning(f"{INSTANCE_ID} lost leadership; stopping leader jobs.")
+            for task in leader_tasks.values():
+                task.cancel()
+            leader_tasks.clear()
+        is_leader = leading
+        await run_blocking("cluster", publish_shard_counts)
+        await asyncio.sleep(LEADER_RENEW_INTERVAL)
+
+def handle_cluster_event(channel, event, loop):
+    """Apply an event published by another shard process."""
+    if channel == "ticks":
+        for ticker, price, timestamp in event["ticks"]:
+            remember_price(ticker, price, timestamp)  # Redis already has the quote; refresh this process's LRU
+    elif channel == "alerts":
+        if event["op"] == "index":
+            index_alert(event["user_id"], event["ticker"], event["target_price"], event["created_at"])
+        elif event["op"] == "unindex":
+            unindex_alert(event["user_id"], event["ticker"])
+        elif event["op"] == "unindex_user":
+            unindex_user_alerts(event["user_id"])
+    elif channel == "news":
+        asyncio.run_coroutine_threadsafe(deliver_news(event["text"]), loop)
+
+def run_cluster_listener(loop):
+    """Thread: receive cluster events over Redis pub/sub, reconnecting after errors."""
+    while True:
+        try:
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(*(CLUSTER_CHANNEL_PREFIX + channel for channel in CLUSTER_CHANNELS))
+            for message in pubsub.listen():
+                event = json.loads(message["data"])
+                if event.get("from") != INSTANCE_ID:
+                    handle_cluster_event(message["channel"].removeprefix(CLUSTER_CHANNEL_PREFIX), event, loop)
+        except Exception as e:
+            logger.warning(f"Cluster listener failed, reconnecting: {e}")
+            time.sleep(5)
 
 # Run when the bot is ready
 @bot.event
@@ -1211,18 +3076,17 @@ async def on_ready():
 
     if not hasattr(bot, "background_tasks_started"):
         bot.loop.create_task(schedule_runner())
-        bot.loop.create_task(check_alerts())
+        bot.loop.create_task(run_leader_election())  # starts check_alerts and the refreshers on the leader
+        if clustered():
+            threading.Thread(target=run_cluster_listener, args=(asyncio.get_running_loop(),), name="stocksage-cluster", daemon=True).start()
+        bot.loop.create_task(run_user_flush())
         bot.background_tasks_started = True
 
     print(f'✅ Logged in as {bot.user}!')
 
 def get_unique_user_count():
     """Count users who actually interacted with the bot."""
-    with sqlite3.connect("bot_stats.db") as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM unique_users")
-        result = cursor.fetchone()
-        return result[0] if result else 0
+    return len(seen_user_ids)  # includes IDs still waiting for the next flush
 
 def get_total_user_count():
     global last_user_count, last_user_count_time
@@ -1237,19 +3101,19 @@ def get_total_user_count():
     
     return last_user_count
 
+async def record_bot_stats(total_servers, total_users):
+    """Insert a server/user stats snapshot."""
+    await db_write_async(execute_write, """
+        INSERT INTO stats (servers, users, event_type)
+        VALUES (?, ?, 'update')
+    """, (total_servers, total_users), path=STATS_DB)
+
 async def update_bot_stats():
     """Update global server/user bot stats."""
-    total_servers = len(bot.guilds)
-    total_users = get_total_user_count()
+    total_servers, total_users = await run_blocking("cluster", get_cluster_counts)
     unique_users = get_unique_user_count()  # ✅ include interacted-user count
 
-    with sqlite3.connect("bot_stats.db") as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO stats (servers, users, event_type)
-            VALUES (?, ?, 'update')
-        """, (total_servers, total_users))
-        conn.commit()
+    await record_bot_stats(total_servers, total_users)
 
     # ✅ admin log output
     logger.info(f"[ADMIN] Unique Users (Actual Bot Users): {unique_users}")
@@ -1268,8 +3132,7 @@ async def on_guild_remove(guild):
 
 @bot.command()
 async def stats(ctx):
-    total_servers = len(bot.guilds)
-    total_users = sum(guild.member_count for guild in bot.guilds)
+    total_servers, total_users = await run_blocking("cluster", get_cluster_counts)  # every shard process
 
     await ctx.send(
         f"📊 **Bot Statistics:**\n"
@@ -1277,228 +3140,374 @@ async def stats(ctx):
         f"🔹 Unique Users: {total_users}"
     )
 
-# ✅ Message handler (user commands)
-@bot.event
-async def on_message(message):
-    if message.author == bot.user:
-        return
-    
-    user_id = str(message.author.id)  # store user ID
-    log_user_interaction(user_id)
-    content = message.content.lower()  # 🔹 define content variable first
-
-    # ping check
-    if message.content.lower() == "ping":
-        await message.channel.send("pong!")
-
-    # Stock price lookup (!price <ticker>)
-    # Handle !price command
-    elif message.content.startswith("!price"):
-        try:
-            # parse ticker symbol
-            parts = message.content.split()
-            if len(parts) < 2:
-                await message.channel.send("⚠️ Please provide a stock ticker symbol. Example: `!price AAPL`")
-                return
-            
-            ticker = parts[1].upper()
-
-            # validate ticker symbol
-            if not ticker.isalnum():  # ticker must contain letters/numbers only
-                await message.channel.send(f"⚠️ `{ticker}` is not a valid stock ticker symbol. Please use a valid symbol (e.g., AAPL).")
-                return
-
-            # validate availability through Yahoo Finance
-            price = get_stock_price_value(ticker)
-            if price is None:
-                await message.channel.send(f"⚠️ `{ticker}` is not a valid stock ticker symbol or is not available.")
-            else:
-                response_message = get_stock_price(ticker)
-                await message.channel.send(response_message)
-        except IndexError:
-            await message.channel.send("⚠️ Please provide a stock ticker symbol. Example: `!price AAPL`")
-
-    # ✅ Handle `!news` by fetching financial headlines
-    elif content == "!news":
-        news = get_financial_news()
-
-        if isinstance(news, list) and news:
-            formatted_news = "\n\n".join([f"🔹 **{article.get('title', 'No Title')}**\n{article.get('url', '#')}" for article in news])
-        else:
-            formatted_news = "⚠️ No recent financial news available."
-
-        await message.channel.send(f"📢 **Latest Financial News**\n\n{formatted_news}")
-    
-    elif message.content.startswith("!buy"):
-        parts = message.content.split()
-        if len(parts) < 3 or not parts[2].isdigit():
-            await message.channel.send("⚠️ Please provide a valid stock ticker and quantity. Example: `!buy AAPL 10`")
-            return
-
-        _, ticker, quantity = parts
-        response_message = buy_stock(user_id, ticker.upper(), int(quantity))
-        await message.channel.send(response_message)
-
-    elif message.content.lower() == "!sellall":
-            await message.channel.send(sell_all_stocks(user_id))
+def get_metrics_report():
+    """Admin-only runtime counters."""
+    with chart_cache_lock:
+        hits, misses, evictions = chart_cache_stats["hits"], chart_cache_stats["misses"], chart_cache_stats["evictions"]
+        entries, size = len(chart_cache), chart_cache_bytes
+    lookups = hits + misses
+    hit_ratio = hits / lookups * 100 if lookups else 0.0
+
+    lines = [
+        "📊 **Bot Metrics**",
+        f"🖼️ Chart cache: {hits} hits / {misses} misses ({hit_ratio:.1f}% hit ratio), "
+        f"{evictions} evictions, {entries} charts, {size / 1024 / 1024:.1f} of {CHART_CACHE_BUDGET / 1024 / 1024:.0f} MiB",
+    ]
+
+    with price_cache_lock:
+        price_counts = dict(price_cache_stats)
+        price_entries = len(price_cache)
+        samples = list(price_lookup_seconds)
+    lookups = sum(price_counts.values())
+    served = price_counts["l1_hits"] + price_counts["redis_hits"] + price_counts["stale"]
+    p99 = np.percentile(samples, 99) * 1000 if samples else 0.0
+    lines.append(
+        f"💰 Price cache: {served}/{lookups} served from cache ({served / lookups * 100 if lookups else 0.0:.1f}%: "
+        f"{price_counts['l1_hits']} memory, {price_counts['redis_hits']} Redis, {price_counts['stale']} stale), "
+        f"{price_entries}/{PRICE_CACHE_SIZE} tickers, lookup p99 {p99:.1f} ms over {len(samples)}"
+    )
 
-    elif message.content.startswith("!sell"):
-        parts = message.content.split()
-        if len(parts) < 3 or not parts[2].isdigit():
-            await message.channel.send("⚠️ Please provide a valid stock ticker and quantity. Example: `!sell TSLA 5`")
-            return
+    # the session calendar drives quote TTLs, the tick poller and the alert sweeps
+    now = time.time()
+    if quotes_can_change(now):
+        quote_ttl = f"quotes cached {CACHE_EXPIRY}s"
+    else:
+        quote_ttl = f"quotes held until the open in {(next_regular_open(now) - now) / 3600:.1f} h"
+    lines.append(f"🕒 NYSE session: {get_market_session(now)} ({quote_ttl})")
+
+    with yahoo_condition:
+        yahoo_rows = [(priority_class, dict(stats)) for priority_class, stats in yahoo_stats.items()]
+        throttled = yahoo_stats_throttled["count"]
+        paused = max(yahoo_bucket["backoff_until"] - time.monotonic(), 0.0)
+    lines.append(f"🚦 Yahoo limiter: {YAHOO_REQUESTS_PER_MINUTE}/min, {throttled} rate-limit pauses" + (f", paused {paused:.0f}s" if paused else ""))
+    for priority_class, stats in yahoo_rows:
+        average_wait = stats["wait_seconds"] / stats["requests"] * 1000 if stats["requests"] else 0.0
+        lines.append(
+            f"   `{priority_class}`: {stats['waiting']} queued, {stats['requests']} sent, "
+            f"wait avg {average_wait:.0f} ms / max {stats['max_wait'] * 1000:.0f} ms"
+        )
 
-        _, ticker, quantity = parts
-        response_message = sell_stock(user_id, ticker.upper(), int(quantity))
-        await message.channel.send(response_message)
+    with news_lock:
+        news = dict(news_stats)
+    lines.append(
+        f"🗞️ NewsAPI: {news['requests']}/{NEWS_API_DAILY_BUDGET} requests today, {news['cache_hits']} cache hits, "
+        f"{news['errors']} errors, {news['over_budget']} refused over budget"
+    )
 
-    elif message.content.lower() == "!balance":
-        await message.channel.send(f"💰 Current Balance: ${get_balance(user_id):.2f}")
+    for name, stats in command_stats.items():
+        if stats["calls"] or stats["running"]:
+            samples = list(stats["samples"])
+            average = stats["seconds"] / stats["calls"] * 1000 if stats["calls"] else 0.0
+            p99 = np.percentile(samples, 99) * 1000 if samples else 0.0
+            lines.append(
+                f"⌨️ `{name}`: {stats['calls']} runs, {stats['errors']} errors, {stats['running']} running, "
+                f"avg {average:.0f} ms / p99 {p99:.0f} ms"
+            )
 
-    elif message.content.lower() == "!history":
-        await message.channel.send(get_trade_history(user_id))
+    with sentiment_stats_lock:
+        sentiment_rows = [(command, dict(stats)) for command, stats in sorted(sentiment_stats.items())]
+    for command, stats in sentiment_rows:
+        scored = stats["hits"] + stats["misses"]
+        per_miss = stats["seconds"] / stats["misses"] * 1000 if stats["misses"] else 0.0
+        lines.append(
+            f"📰 Sentiment `{command}`: {stats['hits']}/{scored} cached ({stats['hits'] / scored * 100:.1f}%), "
+            f"{stats['seconds'] * 1000:.0f} ms scoring ({per_miss:.1f} ms per miss)"
+        )
+    return "\n".join(lines)
+
+# 🔹 Command router: the first token of a message selects its handler from COMMANDS in one dict lookup.
+# Arguments are converted by the command's schema (a bad or missing one replies with its usage), and
+# every handler runs under its own concurrency limit with timing and error counts for !metrics.
+COMMAND_CONCURRENCY = 8  # default in-flight runs per command; the rest wait their turn
+COMMAND_LATENCY_SAMPLES = 500  # recent runs per command kept for the p99 in !metrics
+COMMANDS = {}  # "!name" -> {"handler", "args", "optional", "usage", "admin", "semaphore"}
+command_stats = {}  # "!name" -> {"calls", "errors", "running", "seconds", "samples"}
+
+def message_command(name, args=(), optional=(), usage=None, limit=COMMAND_CONCURRENCY, admin=False):
+    """Register an on_message handler called as handler(message, user_id, *converted_args)."""
+    def register(handler):
+        COMMANDS[name] = {
+            "handler": handler,
+            "args": args,  # converters for required arguments
+            "optional": optional,  # converters for trailing optional arguments
+            "usage": usage,
+            "admin": admin,
+            "semaphore": asyncio.Semaphore(limit),
+        }
+        command_stats[name] = {"calls": 0, "errors": 0, "running": 0, "seconds": 0.0, "samples": deque(maxlen=COMMAND_LATENCY_SAMPLES)}
+        return handler
+    return register
+
+def parse_command_args(spec, tokens):
+    """Convert argument tokens with a command's schema; raises ValueError when one is missing or invalid."""
+    if len(tokens) < len(spec["args"]):
+        raise ValueError("missing argument")
+    return [convert(token) for convert, token in zip(spec["args"] + spec["optional"], tokens)]  # extra tokens are ignored
+
+def quantity_arg(text):
+    if not text.isdigit():
+        raise ValueError(text)
+    return int(text)
+
+def amount_arg(text):
+    if not text.replace('.', '', 1).isdigit() or float(text) <= 0:
+        raise ValueError(text)
+    return float(text)
+
+def mention_arg(text):
+    return text.strip("<@!>")
+
+async def dispatch_command(message, user_id, name, tokens):
+    """Run a registered command with its argument schema, concurrency limit and metrics."""
+    spec = COMMANDS[name]
+    if spec["admin"] and user_id != ADMIN_ID:
+        await message.channel.send("⚠️ This command is only available to the bot admin.")
+        return
+    try:
+        args = parse_command_args(spec, tokens)
+    except ValueError:
+        await message.channel.send(spec["usage"])
+        return
+
+    stats = command_stats[name]
+    async with spec["semaphore"]:
+        stats["running"] += 1
+        started = time.perf_counter()
+        try:
+            await spec["handler"](message, user_id, *args)
+        except Exception as e:
+            stats["errors"] += 1
+            logger.exception(f"Command {name} failed for {user_id}: {e}")
+            await message.channel.send(f"⚠️ Something went wrong while running `{name}`. Please try again later.")
+        finally:
+            elapsed = time.perf_counter() - started
+            stats["running"] -= 1
+            stats["calls"] += 1
+            stats["seconds"] += elapsed
+            stats["samples"].append(elapsed)
+
+# Stock price lookup (!price <ticker>)
+@message_command("!price", args=(str.upper,), usage="⚠️ Please provide a stock ticker symbol. Example: `!price AAPL`")
+async def handle_price(message, user_id, ticker):
+    # validate ticker symbol
+    if not ticker.isalnum():  # ticker must contain letters/numbers only
+        await message.channel.send(f"⚠️ `{ticker}` is not a valid stock ticker symbol. Please use a valid symbol (e.g., AAPL).")
+        return
+
+    # validate availability through Yahoo Finance
+    quote, age = await run_blocking("market", get_stock_quote, ticker)  # Yahoo is only called on a cache miss
+    if quote is None:
+        await message.channel.send(f"⚠️ `{ticker}` is not a valid stock ticker symbol or is not available.")
+    else:
+        await message.channel.send(get_stock_price(ticker, quote, age))
 
-    elif message.content.lower() == "!pnl":
-        await message.channel.send(get_pnl(user_id))
+# ✅ Handle `!news` by fetching financial headlines
+@message_command("!news", limit=4)
+async def handle_news(message, user_id):
+    news = await run_blocking("news", get_financial_news)
 
-    elif message.content.startswith("!deposit"):
-        parts = message.content.split()
-        if len(parts) < 2 or not parts[1].replace('.', '', 1).isdigit() or float(parts[1]) <= 0:
-            await message.channel.send("⚠️ Please enter a valid amount greater than zero. Example: `!deposit 1000`")
-            return
-        amount = float(parts[1])
-        response = deposit_funds(user_id, amount)
-        await message.channel.send(response)
-    
-    elif message.content.startswith("!withdraw"):
-        parts = message.content.split()
-        if len(parts) < 2 or not parts[1].replace('.', '', 1).isdigit() or float(parts[1]) <= 0:
-            await message.channel.send("⚠️ Please enter a valid amount greater than zero. Example: `!withdraw 500`")
-            return
-        amount = float(parts[1])
-        response = withdraw_funds(user_id, amount)
-        await message.channel.send(response)
-    
-    elif message.content.lower() == "!leaderboard":
-        await message.channel.send(get_leaderboard())
-    
-    elif message.content.startswith("!compare"):
-        parts = message.content.split()
-        if len(parts) < 3:
-            await message.channel.send("⚠️ Usage: `!compare @user1 @user2`")
-            return
-        user1 = parts[1].strip("<@!>")
-        user2 = parts[2].strip("<@!>")
-        await message.channel.send(compare_users(user1, user2))
-    
-    elif message.content.startswith("!watchlist"):
-        parts = message.content.split()
-        if len(parts) < 2:
-            await message.channel.send("⚠️ Usage:\n`!watchlist <TICKER>` → Add ticker\n`!watchlist remove <TICKER>` → Remove ticker\n`!watchlist list` → View watchlist\n`!watchlist clear` → Remove all watchlist items")
-            return
+    if isinstance(news, list) and news:
+        formatted_news = "\n\n".join([f"🔹 **{article.get('title', 'No Title')}**\n{article.get('url', '#')}" for article in news])
+    else:
+        formatted_news = "⚠️ No recent financial news available."
+
+    await message.channel.send(f"📢 **Latest Financial News**\n\n{formatted_news}")
+
+@message_command("!buy", args=(str.upper, quantity_arg), usage="⚠️ Please provide a valid stock ticker and quantity. Example: `!buy AAPL 10`")
+async def handle_buy(message, user_id, ticker, quantity):
+    await message.channel.send(await run_blocking("market", buy_stock, user_id, ticker, quantity))
+
+@message_command("!sellall")
+async def handle_sellall(message, user_id):
+    await message.channel.send(await run_blocking("market", sell_all_stocks, user_id))
+
+@message_command("!sell", args=(str.upper, quantity_arg), usage="⚠️ Please provide a valid stock ticker and quantity. Example: `!sell TSLA 5`")
+async def handle_sell(message, user_id, ticker, quantity):
+    await message.channel.send(await run_blocking("market", sell_stock, user_id, ticker, quantity))
+
+@message_command("!balance")
+async def handle_balance(message, user_id):
+    balance = await run_blocking("db", get_balance, user_id)
+    await message.channel.send(f"💰 Current Balance: ${balance:.2f}")
+
+@message_command("!history")
+async def handle_history(message, user_id):
+    await message.channel.send(await run_blocking("db", get_trade_history, user_id))
+
+@message_command("!pnl")
+async def handle_pnl(message, user_id):
+    await message.channel.send(await run_blocking("market", get_pnl, user_id))
+
+@message_command("!deposit", args=(amount_arg,), usage="⚠️ Please enter a valid amount greater than zero. Example: `!deposit 1000`")
+async def handle_deposit(message, user_id, amount):
+    await message.channel.send(await run_blocking("db", deposit_funds, user_id, amount))
+
+@message_command("!withdraw", args=(amount_arg,), usage="⚠️ Please enter a valid amount greater than zero. Example: `!withdraw 500`")
+async def handle_withdraw(message, user_id, amount):
+    await message.channel.send(await run_blocking("db", withdraw_funds, user_id, amount))
+
+@message_command("!leaderboard")
+async def handle_leaderboard(message, user_id):
+    await message.channel.send(await run_blocking("db", get_leaderboard))
+
+@message_command("!compare", args=(mention_arg, mention_arg), usage="⚠️ Usage: `!compare @user1 @user2`")
+async def handle_compare(message, user_id, user1, user2):
+    await message.channel.send(await run_blocking("db", compare_users, user1, user2))
+
+@message_command(
+    "!watchlist", args=(str,), optional=(str.upper,),
+    usage="⚠️ Usage:\n`!watchlist <TICKER>` → Add ticker\n`!watchlist remove <TICKER>` → Remove ticker\n`!watchlist list` → View watchlist\n`!watchlist clear` → Remove all watchlist items",
+)
+async def handle_watchlist(message, user_id, action, ticker=None):
+    if action.lower() == "list":
+        response = await run_blocking("db", list_watchlist, user_id)
+    elif action.lower() == "remove" and ticker is not None:
+        response = await run_blocking("db", remove_from_watchlist, user_id, ticker)
+    elif action.lower() == "clear":
+        response = await run_blocking("db", clear_watchlist, user_id)
+    else:
+        response = await run_blocking("db", add_to_watchlist, user_id, action.upper())
+
+    await message.channel.send(response)
+
+@message_command("!portfolio")
+async def handle_portfolio(message, user_id):
+    await message.channel.send(await run_blocking("market", get_portfolio, user_id))
+
+@message_command("!reset")
+async def handle_reset(message, user_id):
+    await message.channel.send(await run_blocking("db", reset_portfolio, user_id))
+
+@message_command("!alert", args=(str,), optional=(str,), usage="⚠️ Usage: `!alert <TICKER> <PRICE>` or `!alert list` or `!alert remove <TICKER>`")
+async def handle_alert(message, user_id, action, target=None):
+    if action.lower() == "list":
+        response = await run_blocking("db", list_alerts, user_id)
+    elif action.lower() == "remove" and target is not None:
+        response = await run_blocking("db", remove_alert, user_id, target.upper())
+    elif target is not None and target.replace('.', '', 1).isdigit():
+        response = await run_blocking("db", add_alert, user_id, action.upper(), float(target))
+    else:
+        response = "⚠️ Invalid command. Example: `!alert AAPL 150`"
 
-        action = parts[1].lower()
-        
-        if action == "list":
-            response = list_watchlist(user_id)
-        elif action == "remove" and len(parts) > 2:
-            response = remove_from_watchlist(user_id, parts[2].upper())
-        elif action == "clear":
-            response = clear_watchlist(user_id)
-        else:
-            response = add_to_watchlist(user_id, parts[1].upper())
+    await message.channel.send(response)
 
-        await message.channel.send(response)
-    
-    elif message.content.lower() == "!portfolio":
-        await message.channel.send(get_portfolio(user_id))
-    
-    elif message.content.lower() == "!reset":
-        await message.channel.send(reset_portfolio(user_id))
-    
-    elif message.content.startswith("!alert"):
-        parts = message.content.split()
-        
-        if len(parts) == 1:
-            await message.channel.send("⚠️ Usage: `!alert <TICKER> <PRICE>` or `!alert list` or `!alert remove <TICKER>`")
-            return
-        
-        action = parts[1].lower()
-        
-        if action == "list":
-            response = list_alerts(user_id)
-        elif action == "remove" and len(parts) > 2:
-            response = remove_alert(user_id, parts[2].upper())
-        elif len(parts) == 3 and parts[2].replace('.', '', 1).isdigit():
-            response = add_alert(user_id, parts[1].upper(), float(parts[2]))
-        else:
-            response = "⚠️ Invalid command. Example: `!alert AAPL 150`"
+@message_command("!recommend")
+async def handle_recommend(message, user_id):
+    snapshot = recommendation_snapshot
+    if clustered() and not is_leader:
+        snapshot = await run_blocking("cluster", load_shared_recommendations)  # only the leader scores candidates
+    await message.channel.send(recommend_stocks(snapshot))  # served from the background snapshot
 
-        await message.channel.send(response)
-    
-    elif content.startswith("!recommend"):
-        response = recommend_stocks()
-        await message.channel.send(response)
-
-    elif content.startswith("!trend"):
-        parts = content.split()
-        if len(parts) < 2:
-            await message.channel.send("⚠️ Please provide a stock ticker. Example: `!trend AAPL`")
-        else:
-            response = get_trend(parts[1].upper())
-            await message.channel.send(response)
-
-    elif content.startswith("!sentiment"):
-        parts = content.split()
-        if len(parts) < 2:
-            await message.channel.send("⚠️ Please provide a stock ticker. Example: `!sentiment TSLA`")
-        else:
-            response = get_news_sentiment(parts[1].upper())
-            await message.channel.send(response)
-
-    # 📊 **Portfolio analysis command**
-    elif content.startswith("!portfolio_analysis"):
-        response, image_paths = get_portfolio_analysis(user_id)
-        await message.channel.send(response)
-        
-        if image_paths:
-            for path in image_paths:
-                with open(path, "rb") as file:
-                    await message.channel.send(file=discord.File(file))
-                    os.remove(path)  # cleanup after sending
-    
-    elif content.startswith("!chart"):
-        parts = content.split()
-        if len(parts) < 2:
-            await message.channel.send("⚠️ Please provide a stock ticker. Example: `!chart AAPL`")
-            return
+@message_command("!screen", optional=(str.lower,), limit=4)
+async def handle_screen(message, user_id, filter_name="gainers"):
+    if filter_name not in SCREEN_FILTERS:
+        await message.channel.send("⚠️ Unknown screen. Use `!screen gainers`, `!screen losers` or `!screen volume`.")
+    else:
+        await message.channel.send(await run_blocking("market", get_screen, filter_name))
+
+@message_command("!trend", args=(str.upper,), usage="⚠️ Please provide a stock ticker. Example: `!trend AAPL`")
+async def handle_trend(message, user_id, ticker):
+    await message.channel.send(await run_blocking("market", get_trend, ticker))
+
+@message_command("!sentiment", args=(str.upper,), usage="⚠️ Please provide a stock ticker. Example: `!sentiment TSLA`", limit=4)
+async def handle_sentiment(message, user_id, ticker):
+    await message.channel.send(await run_blocking("news", get_news_sentiment, ticker))
+
+# 📊 **Portfolio analysis command**
+@message_command("!portfolio_analysis", limit=EXECUTOR_LIMITS["render"])
+async def handle_portfolio_analysis(message, user_id):
+    response, images = await get_portfolio_analysis(user_id)
+    await message.channel.send(response)
+
+    if images:
+        for filename, png in images:
+            await message.channel.send(file=discord.File(io.BytesIO(png), filename=filename))
+
+@message_command("!chart", args=(str.upper,), optional=(str.lower,), usage="⚠️ Please provide a stock ticker. Example: `!chart AAPL`", limit=4)
+async def handle_chart(message, user_id, ticker, period="1mo"):
+    valid_periods = ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "max"]
+    period = period if period in valid_periods else "1mo"
+
+    chart_png, error_msg = await get_stock_chart(ticker, period)
+    if error_msg:
+        await message.channel.send(error_msg)
+    else:
+        await message.channel.send(f"📊 {ticker} stock chart with indicators for {period}:")
+        await message.channel.send(file=discord.File(io.BytesIO(chart_png), filename=f"{ticker}_chart.png"))
+
+@message_command("!download_portfolio")
+async def handle_download_portfolio(message, user_id):
+    file_path, error = await run_blocking("market", export_portfolio_to_csv, user_id)
+    if error:
+        await message.channel.send(error)
+    else:
+        await message.channel.send("📄 Here is your portfolio CSV file:", file=discord.File(file_path))
+
+@message_command("!help")
+async def handle_help(message, user_id):
+    await send_help_message(message.channel)
+
+# 🔹 Admin-only runtime metrics
+@message_command("!metrics", admin=True)
+async def handle_metrics(message, user_id):
+    await message.channel.send(get_metrics_report())
+
+@message_command("!refresh_recommendations", admin=True, limit=1)
+async def handle_refresh_recommendations(message, user_id):
+    await message.channel.send("🔄 Refreshing recommendation snapshot...")
+    snapshot = await refresh_recommendations()
+    if snapshot is None:
+        await message.channel.send("⚠️ Unable to score any recommendation candidates right now.")
+    else:
+        await message.channel.send(f"✅ Recommendations refreshed: {len(snapshot['entries'])} tickers scored in {snapshot['duration']:.1f}s.")
 
-        ticker = parts[1].upper()
-        valid_periods = ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "max"]
-        period = parts[2] if len(parts) > 2 and parts[2] in valid_periods else "1mo"
+# ✅ Message handler (user commands)
+@bot.event
+async def on_message(message):
+    if message.author == bot.user:
+        return
+    
+    content = message.content.lower()  # 🔹 define content variable first
+
+    # 🔹 plain chat is dropped before any work is done
+    if not content.startswith(bot.command_prefix) and content != "ping":
+        return
+
+    user_id = str(message.author.id)  # store user ID
+    log_user_interaction(user_id)
 
-        chart_path, error_msg = get_stock_chart(ticker, period)
-        if error_msg:
-            await message.channel.send(error_msg)
-        else:
-            await message.channel.send(f"📊 {ticker} stock chart with indicators for {period}:")
-            await message.channel.send(file=discord.File(chart_path))
-    
-    elif message.content.lower() == "!download_portfolio":
-        user_id = str(message.author.id)
-        file_path, error = export_portfolio_to_csv(user_id)
-        if error:
-            await message.channel.send(error)
-        else:
-            await message.channel.send("📄 Here is your portfolio CSV file:", file=discord.File(file_path))
+    # ping check
+    if content == "ping":
+        await message.channel.send("pong!")
+        return
 
-    elif message.content.lower() == "!help":
-        await send_help_message(message.channel)
-    
-    # ✅ call `bot.process_commands()` only for non-command input
+    tokens = message.content.split()
+    name = tokens[0].lower() if tokens else ""
+    if name in COMMANDS:
+        await dispatch_command(message, user_id, name, tokens[1:])
     else:
-        await bot.process_commands(message)
-
-# Bot startup
-validate_env_variables()  # validate environment variables
-bot.run(TOKEN)
+        await bot.process_commands(message)  # ✅ `@bot.command()` commands such as !stats
+
+# Bot startup (guarded so render pool workers can import this module)
+if __name__ == "__main__":
+    migrate_databases()  # create or upgrade portfolio.db and bot_stats.db
+
+    # Maintenance: `python bot.py --rebuild-positions`, `--verify-positions` or `--check-query-plans`
+    if "--rebuild-positions" in sys.argv:
+        print(f"✅ Rebuilt {rebuild_positions()} positions from the trades ledger.")
+        sys.exit(0)
+    if "--verify-positions" in sys.argv:
+        mismatches = verify_positions()
+        for user_id, ticker, expected, actual in mismatches:
+            print(f"⚠️ {user_id} {ticker}: ledger={expected} positions={actual}")
+        print("✅ Positions match the trades ledger." if not mismatches else f"⚠️ {len(mismatches)} mismatched positions.")
+        sys.exit(1 if mismatches else 0)
+    if "--check-query-plans" in sys.argv:
+        scans = check_query_plans()
+        for name, detail in scans:
+            print(f"⚠️ {name}: {detail}")
+        print("✅ All hot queries use an index." if not scans else f"⚠️ {len(scans)} hot queries scan a full table.")
+        sys.exit(1 if scans else 0)
+
+    validate_env_variables()  # validate environment variables
+    bot.run(TOKEN)
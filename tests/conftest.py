@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# tests import bot.py from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Freshly migrated databases in a temp directory, with new connections and writer threads."""
+    import bot
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bot.db_local, "connections", {}, raising=False)
+    monkeypatch.setattr(bot.db_local, "depths", {}, raising=False)
+    monkeypatch.setattr(bot, "db_writer_queues", {})
+    bot.migrate_databases()
+    return tmp_path
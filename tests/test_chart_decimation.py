@@ -0,0 +1,76 @@
+"""Chart decimation keeps the end points, caps the point count and keeps every bucket's extremes."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import bot
+
+
+def random_walk(points, seed=7):
+    rng = np.random.default_rng(seed)
+    return 100 + np.cumsum(rng.normal(0, 1, points))
+
+
+@pytest.mark.parametrize("points", [2520, 10007])
+@pytest.mark.parametrize("threshold", [3, 100, 1000])
+def test_lttb_keeps_end_points_and_caps_length(points, threshold):
+    y = random_walk(points)
+    keep = bot.lttb_indices(np.arange(points), y, threshold)
+    assert len(keep) == threshold
+    assert keep[0] == 0 and keep[-1] == points - 1
+    assert np.all(np.diff(keep) > 0)  # one pick per bucket, in order
+
+
+def test_lttb_keeps_a_lone_spike():
+    y = np.zeros(5000)
+    y[1234] = 50.0
+    assert 1234 in bot.lttb_indices(np.arange(5000), y, 100)
+
+
+@pytest.mark.parametrize("points", [2520, 10007])
+@pytest.mark.parametrize("max_points", [10, 100, 1000])
+def test_minmax_keeps_end_points_and_caps_length(points, max_points):
+    keep = bot.minmax_indices(random_walk(points), max_points)
+    assert keep[0] == 0 and keep[-1] == points - 1
+    assert len(keep) <= max_points
+    assert np.all(np.diff(keep) > 0)
+
+
+def test_minmax_keeps_each_bucket_min_and_max():
+    y = random_walk(10007)
+    keep = set(bot.minmax_indices(y, 1000).tolist())
+    size = -(-len(y) // ((1000 - 2) // 2))  # bucket width used by minmax_indices
+    for start in range(0, len(y), size):
+        bucket = y[start:start + size]
+        assert start + int(np.argmin(bucket)) in keep
+        assert start + int(np.argmax(bucket)) in keep
+
+
+def test_minmax_skips_nan_warm_up():
+    y = random_walk(5000)
+    y[:300] = np.nan  # indicators are undefined until their window fills
+    keep = bot.minmax_indices(y, 100)
+    assert keep[-1] == 4999
+    assert np.nanmax(y[keep]) == np.nanmax(y) and np.nanmin(y[keep]) == np.nanmin(y)
+    assert all(index < 300 for index in keep if np.isnan(y[index]))  # NaN only where a bucket has nothing else
+
+
+@pytest.mark.parametrize("points", [1, 2, 50])
+def test_short_series_are_unchanged(points):
+    y = random_walk(points)
+    np.testing.assert_array_equal(bot.lttb_indices(np.arange(points), y, 100), np.arange(points))
+    np.testing.assert_array_equal(bot.minmax_indices(y, 100), np.arange(points))
+
+
+def test_decimated_series_stay_on_their_dates():
+    points = 10007
+    dates = pd.date_range("1985-01-02", periods=points, freq="D")
+    history = pd.DataFrame({"date": dates, "close": random_walk(points)})
+    for seed, name in enumerate(bot.CHART_INDICATORS):
+        history[name] = random_walk(points, seed)
+
+    series = bot.decimate_chart_history(history, max_points=500)
+    by_date = history.set_index("date")
+    for name, (kept_dates, values) in series.items():
+        assert len(values) <= 500
+        np.testing.assert_array_equal(by_date.loc[kept_dates, name].to_numpy(), values)
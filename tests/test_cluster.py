@@ -0,0 +1,141 @@
+"""Three shard processes against one fake Redis server and a fake Discord gateway."""
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+import redis
+
+SHARDS = 3
+RUN_SECONDS = 6.0
+CRASH_AFTER = 2.5  # the first leader exits here; a follower must take over within LEADER_TTL
+
+
+class NoDelayFakeServer(fakeredis.TcpFakeServer):
+    """fakeredis over TCP, without Nagle delays on pipelined replies."""
+
+    def get_request(self):
+        conn, addr = super().get_request()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn, addr
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id, self.member_count, self.text_channels = guild_id, 10, []
+
+
+class FakeGateway:
+    """Stands in for the Discord client: this shard's guilds, always ready."""
+
+    def __init__(self, shard_id):
+        self.guilds = [FakeGuild(guild_id) for guild_id in range(12) if guild_id % SHARDS == shard_id]
+
+    async def wait_until_ready(self):
+        pass
+
+    def is_closed(self):
+        return False
+
+
+def run_shard(shard_id, port, data_dir):
+    os.environ["SHARD_COUNT"], os.environ["SHARD_IDS"] = str(SHARDS), str(shard_id)
+    os.chdir(data_dir)
+    import bot
+
+    client = redis.Redis(port=port, decode_responses=True)
+    bot.r = client
+    bot.bot = FakeGateway(shard_id)
+    bot.LEADER_TTL, bot.LEADER_RENEW_INTERVAL, bot.SHARD_COUNTS_MAX_AGE = 2, 0.3, 1.0
+    bot.quotes_can_change = lambda now=None: True
+    name = f"shard{shard_id}"
+
+    async def ticks(publish):
+        while True:
+            await publish(("AAPL", 200.0, time.time()))
+            await asyncio.sleep(0.1)
+
+    async def send_price_alert(user_id, ticker, price):
+        client.rpush("sent", f"{user_id} {ticker}")
+
+    async def deliver_news(text):
+        client.rpush("news", name)
+
+    async def refresher():
+        client.sadd("refreshers", name)
+        await asyncio.sleep(3600)
+
+    bot.tick_source = ticks
+    bot.send_price_alert = send_price_alert
+    bot.deliver_news = deliver_news
+    bot.get_financial_news = lambda: [{"title": "Markets", "url": "https://example.com"}]
+    bot.run_recommendation_refresher = bot.run_screen_refresher = refresher
+
+    async def main():
+        client.incr("ready")
+        while int(client.get("ready")) < SHARDS:
+            await asyncio.sleep(0.01)
+        threading.Thread(target=bot.run_cluster_listener, args=(asyncio.get_running_loop(),), daemon=True).start()
+        asyncio.create_task(bot.run_leader_election())
+
+        started = time.monotonic()
+        alerts_added = 0
+        news_sent = 0
+        while time.monotonic() - started < RUN_SECONDS:
+            await asyncio.sleep(0.05)
+            elapsed = time.monotonic() - started
+            if bot.is_leader:
+                client.sadd("leaders", name)
+            if shard_id == SHARDS - 1 and elapsed > 0.5 and alerts_added == client.llen("sent") < 2:
+                # the second alert re-sets the same target right after the first one fired
+                await bot.run_blocking("db", bot.add_alert, "u1", "AAPL", 150.0)
+                alerts_added += 1
+            if bot.is_leader and news_sent < 2 and elapsed > 1.0:
+                await bot.send_daily_news()  # the second call must be deduplicated
+                news_sent += 1
+            if bot.is_leader and elapsed > CRASH_AFTER and client.scard("leaders") == 1:
+                os._exit(0)  # leader dies without releasing its lease
+        client.hset("counts", name, json.dumps(bot.get_cluster_counts()))
+        os._exit(0)
+
+    asyncio.run(main())
+
+
+@pytest.fixture
+def redis_port():
+    server = NoDelayFakeServer(("127.0.0.1", 0), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_shard_processes_share_one_leader(redis_port, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import bot
+    bot.migrate_databases()
+
+    context = multiprocessing.get_context("spawn")  # fresh INSTANCE_IDs and module state per shard
+    processes = [context.Process(target=run_shard, args=(shard_id, redis_port, str(tmp_path))) for shard_id in range(SHARDS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+    assert [process.exitcode for process in processes] == [0] * SHARDS
+
+    client = redis.Redis(port=redis_port, decode_responses=True)
+    leaders = client.smembers("leaders")
+    assert len(leaders) == 2  # the first leader and the one that took over after it died
+    assert client.smembers("refreshers") <= leaders  # background refreshers only ran on leaders
+    assert client.lrange("sent", 0, -1) == ["u1 AAPL"] * 2  # each alert fired once cluster-wide, the re-set one too
+    assert sorted(client.lrange("news", 0, -1)) == [f"shard{shard_id}" for shard_id in range(SHARDS)]
+
+    # the survivors see each other's guilds; the dead leader's counts have gone stale
+    counts = [json.loads(value) for value in client.hgetall("counts").values()]
+    assert counts == [[8, 80]] * (SHARDS - 1)
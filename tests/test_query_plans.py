@@ -0,0 +1,17 @@
+"""Hot queries stay index-backed on a freshly migrated schema."""
+import bot
+
+
+def test_hot_queries_use_indexes(database):
+    assert bot.check_query_plans() == []
+
+
+def test_dropped_index_is_reported(database):
+    bot.get_db().execute("DROP INDEX idx_trades_user_timestamp")
+    assert [name for name, _ in bot.check_query_plans()] == ["get_trade_history"]
+
+
+def test_only_the_expected_scan_is_allowed(database, monkeypatch):
+    # the alert sweep may scan alerts, but not another table
+    monkeypatch.setitem(bot.HOT_QUERIES, "get_all_alerts", (bot.PORTFOLIO_DB, "SELECT price FROM trades", ()))
+    assert [name for name, _ in bot.check_query_plans()] == ["get_all_alerts"]
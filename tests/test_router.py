@@ -0,0 +1,88 @@
+"""on_message routes through the COMMANDS table: exact names, argument schemas, the admin gate and fallthrough."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, text):
+        self.sent.append(text)
+
+
+def fake_message(content, author_id=1234):
+    return SimpleNamespace(content=content, author=SimpleNamespace(id=author_id), channel=FakeChannel())
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Replace every registered handler with one that records (command, user_id, args)."""
+    calls = []
+    for name, spec in bot.COMMANDS.items():
+        async def handler(message, user_id, *args, name=name):
+            calls.append((name, user_id, args))
+        monkeypatch.setitem(spec, "handler", handler)
+
+    async def process_commands(message):
+        calls.append(("process_commands", None, (message.content,)))
+    monkeypatch.setattr(bot.bot, "process_commands", process_commands)
+    return calls
+
+
+def send(content, author_id=1234):
+    message = fake_message(content, author_id)
+    asyncio.run(bot.on_message(message))
+    return message.channel.sent
+
+
+def test_sell_and_sellall_are_distinct_commands(calls):
+    send("!sellall")
+    send("!sell tsla 5")
+    send("!SELL TSLA 5 extra")  # case-insensitive name, extra tokens ignored
+    assert calls == [
+        ("!sellall", "1234", ()),
+        ("!sell", "1234", ("TSLA", 5)),
+        ("!sell", "1234", ("TSLA", 5)),
+    ]
+
+
+@pytest.mark.parametrize("content", ["!sell", "!sell TSLA", "!sell TSLA five", "!sell TSLA -5", "!buy AAPL 1.5"])
+def test_missing_or_invalid_arguments_reply_with_usage(calls, content):
+    assert send(content) == [bot.COMMANDS[content.split()[0]]["usage"]]
+    assert calls == []
+
+
+def test_admin_commands_are_gated(calls):
+    assert send("!metrics") == ["⚠️ This command is only available to the bot admin."]
+    assert calls == []
+    assert send("!metrics", author_id=int(bot.ADMIN_ID)) == []
+    assert calls == [("!metrics", bot.ADMIN_ID, ())]
+
+
+def test_unregistered_commands_fall_through_to_process_commands(calls):
+    send("!stats")
+    send("!nosuchcommand AAPL")
+    assert calls == [("process_commands", None, ("!stats",)), ("process_commands", None, ("!nosuchcommand AAPL",))]
+
+
+def test_plain_chat_and_ping_skip_the_router(calls):
+    assert send("hello there") == []
+    assert send("PING") == ["pong!"]
+    assert calls == []
+
+
+def test_handler_errors_are_counted_and_reported(monkeypatch):
+    async def broken(message, user_id):
+        raise RuntimeError("boom")
+    monkeypatch.setitem(bot.COMMANDS["!balance"], "handler", broken)
+    stats = bot.command_stats["!balance"]
+    before = (stats["calls"], stats["errors"])
+
+    assert send("!balance") == ["⚠️ Something went wrong while running `!balance`. Please try again later."]
+    assert (stats["calls"], stats["errors"]) == (before[0] + 1, before[1] + 1)
+    assert stats["running"] == 0
@@ -0,0 +1,71 @@
+"""Concurrent identical lookups share one upstream call."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import bot
+
+CALLERS = 100
+
+
+def run_concurrently(func):
+    """Call func from CALLERS threads released together; return results (or raised exceptions)."""
+    barrier = threading.Barrier(CALLERS)
+
+    def call():
+        barrier.wait()
+        try:
+            return func()
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(CALLERS) as pool:
+        return list(pool.map(lambda _: call(), range(CALLERS)))
+
+
+class SlowBackend:
+    def __init__(self, result=None, error=None, delay=0.2):
+        self.calls = 0
+        self.result, self.error, self.delay = result, error, delay
+        self.lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_single_flight_makes_one_call():
+    backend = SlowBackend(result=42)
+    results = run_concurrently(lambda: bot.single_flight("test:k", backend))
+    assert backend.calls == 1
+    assert results == [42] * CALLERS
+    assert "test:k" not in bot.inflight_calls
+
+
+def test_single_flight_shares_the_error():
+    backend = SlowBackend(error=RuntimeError("rate limited"))
+    results = run_concurrently(lambda: bot.single_flight("test:err", backend))
+    assert backend.calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    backend.error = None
+    assert bot.single_flight("test:err", backend) is None  # a failure is not cached
+    assert backend.calls == 2
+
+
+def test_price_lookups_make_one_upstream_call(monkeypatch):
+    monkeypatch.setattr(bot, "r", None)
+    monkeypatch.setattr(bot, "price_cache", bot.OrderedDict())
+    monkeypatch.setattr(bot, "last_fetch_time", bot.OrderedDict())
+    backend = SlowBackend(result={"regularMarketPrice": 101.5, "regularMarketPreviousClose": 100.0})
+    monkeypatch.setattr(bot, "get_price_data", backend)
+
+    results = run_concurrently(lambda: bot.get_stock_price_quote("AAPL"))
+    assert backend.calls == 1
+    assert results == [(101.5, None)] * CALLERS